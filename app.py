@@ -1,224 +1,138 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import requests
-from bs4 import BeautifulSoup
-import time
 import json
-import os
-from datetime import datetime
+from collections import Counter
+import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
 from urllib.parse import urlparse
-import re
 
-# Function to load saved gym data
-def load_gym_data():
+import availability
+import history
+import parsing
+import rate_limit
+import records
+import scraper
+from http_client import get_client
+from metrics import get_metrics
+from response_cache import get_cache
+from storage import DEFAULT_SELECTORS, get_store
+
+# Rows read between two refreshes of the live table while a page is streamed
+STREAM_REFRESH_ROWS = 500
+CACHE_ENTRIES = 64    # per cached function; older versions of an entry simply age out
+
+# Function to open the gym store (imports an old gym_data.json on first use)
+def load_gym_store():
     try:
-        if os.path.exists('gym_data.json'):
-            with open('gym_data.json', 'r') as f:
-                return json.load(f)
-        # Default data with pre-configured gyms
-        return {
-            "gyms": [
-                {
-                    "name": "LA Fitness",
-                    "url": "https://www.lafitness.com/Pages/ClassSchedulePrintView.aspx",
-                    "class_selector": "tr",
-                    "instructor_selector": "td:nth-child(1)",
-                    "time_selector": "td:nth-child(2)",
-                    "availability_selector": "td:nth-child(3)"
-                },
-                {
-                    "name": "Planet Fitness",
-                    "url": "https://www.planetfitness.com/gyms/manhattan-ny/offers/group-fitness-classes",
-                    "class_selector": ".schedule-item",
-                    "instructor_selector": ".class-title",
-                    "time_selector": ".instructor-name",
-                    "availability_selector": ".class-time"
-                },
-                {
-                    "name": "24 Hour Fitness",
-                    "url": "https://www.24hourfitness.com/classes/",
-                    "class_selector": ".class-schedule-item",
-                    "instructor_selector": ".class-name",
-                    "time_selector": ".instructor",
-                    "availability_selector": ".class-time"
-                },
-                {
-                    "name": "Gold's Gym",
-                    "url": "https://www.goldsgym.com/classes/",
-                    "class_selector": ".schedule-class",
-                    "instructor_selector": ".class-title",
-                    "time_selector": ".instructor",
-                    "availability_selector": ".time"
-                },
-                {
-                    "name": "Anytime Fitness",
-                    "url": "https://www.anytimefitness.com/find-gym/",
-                    "class_selector": ".schedule-entry",
-                    "instructor_selector": ".class-title",
-                    "time_selector": ".instructor-name",
-                    "availability_selector": ".start-time"
-                },
-                {
-                    "name": "Equinox",
-                    "url": "https://www.equinox.com/groupfitness",
-                    "class_selector": ".class-item",
-                    "instructor_selector": ".class-name",
-                    "time_selector": ".instructor",
-                    "availability_selector": ".time-block"
-                },
-                {
-                    "name": "Crunch Fitness",
-                    "url": "https://www.crunch.com/classes",
-                    "class_selector": ".class-schedule-item",
-                    "instructor_selector": ".class-title",
-                    "time_selector": ".instructor",
-                    "availability_selector": ".time"
-                },
-                {
-                    "name": "YMCA",
-                    "url": "https://ymca.net/find-your-y",
-                    "class_selector": ".schedule-item",
-                    "instructor_selector": ".class-name",
-                    "time_selector": ".teacher-name",
-                    "availability_selector": ".time-slot"
-                }
-            ],
-            "schedules": []
-        }
+        return get_store()
     except Exception as e:
         st.error(f"Error loading data: {e}")
-        return {"gyms": [], "schedules": []}
+        st.stop()
 
-# Function to save gym data
-def save_gym_data(data):
-    try:
-        with open('gym_data.json', 'w') as f:
-            json.dump(data, f)
-    except Exception as e:
-        st.error(f"Error saving data: {e}")
+# Calls and misses of the cached loaders below, shared by every session of this server.
+# A loader's body only runs on a miss, so hits are calls minus misses.
+@st.cache_resource
+def cache_counters():
+    return {'calls': Counter(), 'misses': Counter()}
+
+def _miss(name):
+    cache_counters()['misses'][name] += 1
+
+# Function to call a cached loader and count the call
+def cached(loader, *args):
+    cache_counters()['calls'][loader.__name__] += 1
+    return loader(*args)
+
+# Cached loaders. Each takes the store version its result depends on as its last argument,
+# so a write to one gym only invalidates that gym's entries.
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_gyms(config_version):
+    _miss('load_gyms')
+    return get_store().list_gyms()
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_gyms_with_history(store_version):
+    _miss('load_gyms_with_history')
+    return get_store().gyms_with_history()
+
+# The last schedule of a gym with everything the Current Classes tab derives from it
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_current_view(gym_name, gym_version):
+    _miss('load_current_view')
+    last_schedule = get_store().last_schedule(gym_name)
+    if not last_schedule:
+        return None
+    classes_df = records.categorize(pd.DataFrame(last_schedule['classes']))
+    if classes_df.empty:
+        return {'timestamp': last_schedule['timestamp'], 'classes': classes_df, 'instructors': [],
+                'class_names': [], 'open_classes': classes_df}
+    return {
+        'timestamp': last_schedule['timestamp'],
+        'classes': classes_df,
+        'instructors': sorted(classes_df['instructor'].unique()),
+        'class_names': sorted(classes_df['name'].unique()),
+        'open_classes': classes_df[classes_df['status'] == availability.OPEN],
+    }
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_history_dates(gym_name, gym_version):
+    _miss('load_history_dates')
+    return history.available_dates(gym_name, get_store().history_dir)
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_rollup(gym_name, dimension, start, end, bucket_size, by_bucket, gym_version):
+    _miss('load_rollup')
+    return pd.DataFrame(get_store().rollup(gym_name, dimension, start, end, bucket_size, by_bucket))
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_changes(gym_name, start, end, gym_version):
+    _miss('load_changes')
+    return history.load_changes(gym_name, start, end, root=get_store().history_dir)
+
+# One page of the rebuilt history, filtered; returns (page DataFrame, total matching rows)
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_history_page(gym_name, start, end, instructors, class_names, statuses, offset, limit, gym_version):
+    _miss('load_history_page')
+    return history.query_history(gym_name, start, end, name=list(class_names), instructor=list(instructors),
+                                 status=list(statuses), offset=offset, limit=limit, root=get_store().history_dir)
+
+# Sidebar table of cache hits and misses per loader
+def show_cache_stats():
+    counters = cache_counters()
+    st.sidebar.subheader("Data Cache")
+    calls, misses = sum(counters['calls'].values()), sum(counters['misses'].values())
+    col1, col2 = st.sidebar.columns(2)
+    col1.metric("Hits", calls - misses)
+    col2.metric("Misses", misses)
+    if calls:
+        st.sidebar.dataframe(pd.DataFrame([
+            {'Loader': name, 'Hits': count - counters['misses'][name], 'Misses': counters['misses'][name]}
+            for name, count in sorted(counters['calls'].items())
+        ]), hide_index=True, use_container_width=True)
+
+# Show scraper problems in the Streamlit page
+def streamlit_report(level, message):
+    if level == 'error':
+        st.error(message)
+    else:
+        st.warning(message)
 
 # Function to scrape gym data using requests and BeautifulSoup
-def scrape_gym_data(url, class_selector, instructor_selector, time_selector, availability_selector):
-    try:
-        # Set headers to mimic a browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0'
-        }
-        
-        # Add a delay to be respectful
-        time.sleep(2)
-        
-        # Make the request
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise an exception for 4XX/5XX responses
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract data
-        classes = []
-        
-        # Find all class containers
-        class_elements = soup.select(class_selector)
-        
-        for element in class_elements:
-            try:
-                class_name = element.select_one(instructor_selector).text.strip() if element.select_one(instructor_selector) else "Unknown"
-                instructor = element.select_one(time_selector).text.strip() if element.select_one(time_selector) else "Unknown"
-                time_info = element.select_one(availability_selector).text.strip() if element.select_one(availability_selector) else "Unknown"
-                
-                # Extract availability info - this is a simplified example
-                availability_text = "Unknown"
-                for tag in element.find_all(['span', 'div', 'p']):
-                    text = tag.text.lower()
-                    if any(word in text for word in ['available', 'spot', 'space', 'full', 'capacity']):
-                        availability_text = tag.text.strip()
-                        break
-                
-                classes.append({
-                    'name': class_name,
-                    'instructor': instructor,
-                    'time': time_info,
-                    'availability': availability_text,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-            except Exception as e:
-                st.warning(f"Error parsing class element: {e}")
-                continue
-        
-        # If no classes were found with the specific selectors, try a more generic approach
-        if not classes:
-            # Look for table rows
-            rows = soup.select('table tr')
-            for row in rows[1:]:  # Skip header row
-                cells = row.select('td')
-                if len(cells) >= 4:
-                    classes.append({
-                        'name': cells[0].text.strip(),
-                        'instructor': cells[1].text.strip(),
-                        'time': cells[2].text.strip(),
-                        'availability': cells[3].text.strip(),
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-            
-            # Try another common pattern - div cards
-            if not classes:
-                card_elements = soup.select('.card, .class-card, .event-card, .schedule-card')
-                for card in card_elements:
-                    try:
-                        name_elem = card.select_one('.title, .name, h3, h4')
-                        instructor_elem = card.select_one('.instructor, .trainer, .teacher')
-                        time_elem = card.select_one('.time, .schedule-time, .hour')
-                        availability_elem = card.select_one('.status, .availability, .spots')
-                        
-                        if name_elem and time_elem:
-                            classes.append({
-                                'name': name_elem.text.strip(),
-                                'instructor': instructor_elem.text.strip() if instructor_elem else "Unknown",
-                                'time': time_elem.text.strip(),
-                                'availability': availability_elem.text.strip() if availability_elem else "Unknown",
-                                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            })
-                    except Exception as e:
-                        continue
-        
-        # Generate some sample data if nothing was found (for testing purposes)
-        if not classes:
-            st.warning("Could not find classes with the provided selectors. Using sample data for demonstration.")
-            sample_classes = [
-                {"name": "Spinning", "instructor": "John Doe", "time": "9:00 AM", "availability": "5 spots left"},
-                {"name": "Yoga", "instructor": "Jane Smith", "time": "10:30 AM", "availability": "Full"},
-                {"name": "HIIT", "instructor": "Mike Johnson", "time": "12:00 PM", "availability": "8 spots left"},
-                {"name": "Pilates", "instructor": "Sarah Williams", "time": "2:00 PM", "availability": "3 spots left"},
-                {"name": "Zumba", "instructor": "Maria Garcia", "time": "5:30 PM", "availability": "12 spots left"},
-                {"name": "Body Pump", "instructor": "Robert Brown", "time": "6:45 PM", "availability": "Full"}
-            ]
-            
-            for cls in sample_classes:
-                cls["timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                classes.append(cls)
-        
-        return classes
-    
-    except requests.exceptions.RequestException as e:
-        st.error(f"Request error: {e}")
-        # Return sample data for demonstration
-        return [
-            {"name": "Spinning", "instructor": "John Doe", "time": "9:00 AM", "availability": "5 spots left", "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
-            {"name": "Yoga", "instructor": "Jane Smith", "time": "10:30 AM", "availability": "Full", "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
-            {"name": "HIIT", "instructor": "Mike Johnson", "time": "12:00 PM", "availability": "8 spots left", "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        ]
-    except Exception as e:
-        st.error(f"Scraping error: {e}")
-        return []
+def scrape_gym_data(url, class_selector, instructor_selector, time_selector, availability_selector, **options):
+    return scraper.scrape_gym_data(url, class_selector, instructor_selector, time_selector,
+                                   availability_selector, report=streamlit_report, **options)
+
+# Function to scrape a large page incrementally, refreshing `placeholder` as rows arrive
+def scrape_gym_data_streaming(url, class_selector, instructor_selector, time_selector, availability_selector,
+                              placeholder, refresh_rows=STREAM_REFRESH_ROWS, **options):
+    classes = []
+    for cls in scraper.scrape_gym_data_streaming(url, class_selector, instructor_selector, time_selector,
+                                                 availability_selector, report=streamlit_report, **options):
+        classes.append(cls)
+        if len(classes) == 1 or len(classes) % refresh_rows == 0:
+            placeholder.dataframe(records.frame(classes), use_container_width=True)
+    return classes
 
 # Main Streamlit app
 def main():
@@ -227,8 +141,9 @@ def main():
     st.title("Gym Class Tracker")
     st.markdown("Track gym class availability and analyze patterns")
     
-    # Load saved data
-    data = load_gym_data()
+    # Load saved data; cached until a gym is added, changed or deleted
+    store = load_gym_store()
+    gyms = cached(load_gyms, store.config_version())
     
     # Create tabs
     tab1, tab2, tab3 = st.tabs(["Current Classes", "Historical Data", "Settings"])
@@ -237,11 +152,27 @@ def main():
         st.header("Check Class Availability")
         
         # Show saved gyms in a dropdown
-        gym_options = [gym['name'] for gym in data['gyms']]
-        
+        gym_options = [gym['name'] for gym in gyms]
+
+        # Scrape every configured gym at once
+        if gym_options and st.button("Check All Gyms", key="check_all_gyms"):
+            progress = st.progress(0.0, text="Scraping all gyms...")
+            summary = []
+            for done, (gym, classes, messages) in enumerate(scraper.scrape_gyms(gyms, save_plan=store.save_plan), start=1):
+                if classes:
+                    store.append_schedule(gym['name'], classes)
+                summary.append({
+                    'Gym': gym['name'],
+                    'Classes Found': len(classes),
+                    'Messages': "; ".join(message for _, message in messages)
+                })
+                progress.progress(done / len(gyms), text=f"Finished {gym['name']} ({done}/{len(gyms)})")
+            progress.empty()
+            st.dataframe(pd.DataFrame(summary), use_container_width=True)
+
         if gym_options:
             selected_gym = st.selectbox("Select a gym", options=gym_options)
-            selected_gym_data = next((gym for gym in data['gyms'] if gym['name'] == selected_gym), None)
+            selected_gym_data = next((gym for gym in gyms if gym['name'] == selected_gym), None)
             
             if selected_gym_data:
                 # Display gym info
@@ -252,26 +183,43 @@ def main():
                 with col1:
                     if st.button("Check Classes Now", key="check_classes"):
                         with st.spinner(f"Scraping {selected_gym} website..."):
-                            classes = scrape_gym_data(
-                                selected_gym_data['url'],
-                                selected_gym_data['class_selector'],
-                                selected_gym_data['instructor_selector'],
-                                selected_gym_data['time_selector'],
-                                selected_gym_data['availability_selector']
-                            )
+                            if selected_gym_data.get('streaming'):
+                                # Large pages: show rows while the page is still downloading
+                                live_rows = st.empty()
+                                classes = scrape_gym_data_streaming(
+                                    selected_gym_data['url'],
+                                    selected_gym_data['class_selector'],
+                                    selected_gym_data['instructor_selector'],
+                                    selected_gym_data['time_selector'],
+                                    selected_gym_data['availability_selector'],
+                                    live_rows,
+                                    gym_name=selected_gym,
+                                    rate_limit=selected_gym_data.get('rate_limit'),
+                                    plan=selected_gym_data.get('extraction_plan'),
+                                    save_plan=store.save_plan
+                                )
+                                live_rows.empty()
+                            else:
+                                classes = scrape_gym_data(
+                                    selected_gym_data['url'],
+                                    selected_gym_data['class_selector'],
+                                    selected_gym_data['instructor_selector'],
+                                    selected_gym_data['time_selector'],
+                                    selected_gym_data['availability_selector'],
+                                    parser=selected_gym_data.get('parser'),
+                                    parse_only=selected_gym_data.get('parse_only'),
+                                    gym_name=selected_gym,
+                                    rate_limit=selected_gym_data.get('rate_limit'),
+                                    plan=selected_gym_data.get('extraction_plan'),
+                                    save_plan=store.save_plan
+                                )
                             
                             if classes:
                                 # Add to schedules
-                                new_schedule = {
-                                    'gym_name': selected_gym,
-                                    'classes': classes,
-                                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                }
-                                data['schedules'].append(new_schedule)
-                                save_gym_data(data)
+                                store.append_schedule(selected_gym, classes)
                                 
                                 # Display current classes
-                                classes_df = pd.DataFrame(classes)
+                                classes_df = records.frame(classes)
                                 st.dataframe(classes_df, use_container_width=True)
                                 
                                 # Allow downloading as CSV
@@ -285,56 +233,46 @@ def main():
                             else:
                                 st.warning("No classes found or error occurred during scraping")
                 with col2:
-                    # Show the last scrape if available
-                    last_schedule = next(
-                        (schedule for schedule in reversed(data['schedules']) 
-                         if schedule['gym_name'] == selected_gym),
-                        None
-                    )
+                    # Show the last scrape if available; cached until this gym's data changes
+                    current_view = cached(load_current_view, selected_gym, store.version(selected_gym))
                     
-                    if last_schedule:
-                        st.info(f"Last updated: {last_schedule['timestamp']}")
-                        classes_df = pd.DataFrame(last_schedule['classes'])
-                        if not classes_df.empty:
-                            st.dataframe(classes_df, use_container_width=True)
+                    if current_view:
+                        st.info(f"Last updated: {current_view['timestamp']}")
+                        if not current_view['classes'].empty:
+                            st.dataframe(current_view['classes'], use_container_width=True)
+                
+                has_classes = bool(current_view) and not current_view['classes'].empty
                 
                 # Filter options
                 st.subheader("Filter Classes")
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    if last_schedule and last_schedule['classes']:
-                        all_instructors = sorted(list(set([c['instructor'] for c in last_schedule['classes']])))
-                        selected_instructor = st.selectbox("Filter by Instructor", options=["All"] + all_instructors)
+                    if has_classes:
+                        selected_instructor = st.selectbox("Filter by Instructor", options=["All"] + current_view['instructors'])
                 with col2:
-                    if last_schedule and last_schedule['classes']:
-                        all_class_names = sorted(list(set([c['name'] for c in last_schedule['classes']])))
-                        selected_class = st.selectbox("Filter by Class Type", options=["All"] + all_class_names)
+                    if has_classes:
+                        selected_class = st.selectbox("Filter by Class Type", options=["All"] + current_view['class_names'])
                 
                 # Apply filters if data exists
-                if last_schedule and last_schedule['classes']:
-                    filtered_classes = last_schedule['classes']
+                if has_classes:
+                    filtered_classes = current_view['classes']
                     
                     if selected_instructor != "All":
-                        filtered_classes = [c for c in filtered_classes if c['instructor'] == selected_instructor]
+                        filtered_classes = filtered_classes[filtered_classes['instructor'] == selected_instructor]
                     
                     if selected_class != "All":
-                        filtered_classes = [c for c in filtered_classes if c['name'] == selected_class]
+                        filtered_classes = filtered_classes[filtered_classes['name'] == selected_class]
                     
-                    if filtered_classes and (selected_instructor != "All" or selected_class != "All"):
+                    if not filtered_classes.empty and (selected_instructor != "All" or selected_class != "All"):
                         st.subheader("Filtered Results")
-                        st.dataframe(pd.DataFrame(filtered_classes), use_container_width=True)
+                        st.dataframe(filtered_classes, use_container_width=True)
                 
-                # Availability highlight
+                # Availability highlight, from the status parsed when the scrape was stored
                 st.subheader("Classes with Open Spots")
-                if last_schedule and last_schedule['classes']:
-                    available_classes = [c for c in last_schedule['classes'] 
-                                         if any(keyword in c['availability'].lower() 
-                                                for keyword in ['available', 'open', 'spot', 'space']) 
-                                         and 'full' not in c['availability'].lower()]
-                    
-                    if available_classes:
-                        st.dataframe(pd.DataFrame(available_classes), use_container_width=True)
+                if has_classes:
+                    if not current_view['open_classes'].empty:
+                        st.dataframe(current_view['open_classes'], use_container_width=True)
                     else:
                         st.info("No classes with confirmed available spots")
             else:
@@ -345,78 +283,111 @@ def main():
     with tab2:
         st.header("Historical Gym Data")
         
-        if not data['schedules']:
+        # Gyms that have stored schedules
+        gym_names = cached(load_gyms_with_history, store.version())
+
+        if not gym_names:
             st.info("No historical data available yet. Check some classes first!")
         else:
-            # Group schedules by gym
-            gym_names = list(set([schedule['gym_name'] for schedule in data['schedules']]))
+            selected_gym_history = st.selectbox("Select Gym", options=gym_names, key="history_gym")
+
+            # Everything below is cached until the selected gym's data changes
+            gym_version = store.version(selected_gym_history)
+
+            # Only the selected gym's date partitions in this range are read
+            history_dates = cached(load_history_dates, selected_gym_history, gym_version)
+            start_date, end_date = (history_dates[0], history_dates[-1]) if history_dates else (None, None)
+            if history_dates:
+                date_range = st.date_input("Date Range", value=(start_date, end_date),
+                                           min_value=start_date, max_value=end_date, key="history_dates")
+                if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+                    start_date, end_date = date_range
+
+            # Charts read the per-class and per-instructor rollups, not the raw history
+            class_rollup = cached(load_rollup, selected_gym_history, 'class', start_date, end_date, 'day', False, gym_version)
             
-            if gym_names:
-                selected_gym_history = st.selectbox("Select Gym", options=gym_names, key="history_gym")
+            if not class_rollup.empty:
                 
-                # Filter schedules for selected gym
-                gym_schedules = [schedule for schedule in data['schedules'] if schedule['gym_name'] == selected_gym_history]
+                # 1. Class popularity chart
+                st.subheader("Class Popularity")
+                class_counts = class_rollup[['value', 'occurrences']]
+                class_counts.columns = ['Class', 'Count']
                 
-                if gym_schedules:
-                    # Prepare data for visualizations
-                    all_classes = []
-                    for schedule in gym_schedules:
-                        for class_info in schedule['classes']:
-                            class_info['schedule_timestamp'] = schedule['timestamp']
-                            all_classes.append(class_info)
-                    
-                    classes_df = pd.DataFrame(all_classes)
-                    
-                    # 1. Class popularity chart
-                    st.subheader("Class Popularity")
-                    class_counts = classes_df['name'].value_counts().reset_index()
-                    class_counts.columns = ['Class', 'Count']
-                    
-                    fig = px.bar(class_counts.head(10), x='Class', y='Count', 
-                                 title='Most Common Classes')
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 2. Instructor popularity
-                    st.subheader("Instructor Popularity")
-                    instructor_counts = classes_df['instructor'].value_counts().reset_index()
-                    instructor_counts.columns = ['Instructor', 'Count']
-                    
-                    fig = px.bar(instructor_counts.head(10), x='Instructor', y='Count',
-                                 title='Most Active Instructors')
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 3. Class availability patterns
-                    st.subheader("Availability Patterns")
-                    
-                    # Extract numerical availability when possible
-                    def extract_availability_number(text):
-                        if isinstance(text, str):
-                            match = re.search(r'(\d+)\s*(spot|space|seat|place|opening)', text.lower())
-                            if match:
-                                return int(match.group(1))
-                        return None
-                    
-                    classes_df['availability_num'] = classes_df['availability'].apply(extract_availability_number)
-                    classes_df['is_available'] = classes_df['availability'].apply(
-                        lambda x: 1 if isinstance(x, str) and any(word in x.lower() for word in ['available', 'open', 'spot', 'space']) 
-                        and 'no ' not in x.lower() and 'not ' not in x.lower() and 'full' not in x.lower() else 0
-                    )
-                    
-                    # Group by class name and calculate availability percentage
-                    availability_by_class = classes_df.groupby('name')['is_available'].mean().reset_index()
-                    availability_by_class.columns = ['Class', 'Availability Rate']
-                    availability_by_class['Availability Rate'] = availability_by_class['Availability Rate'] * 100
-                    
-                    fig = px.bar(availability_by_class.sort_values('Availability Rate', ascending=False).head(10), 
-                                 x='Class', y='Availability Rate',
-                                 title='Classes with Highest Availability Rate (%)')
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 4. Raw data browsing
-                    st.subheader("Raw Historical Data")
-                    st.dataframe(classes_df, use_container_width=True)
+                fig = px.bar(class_counts.head(10), x='Class', y='Count', 
+                             title='Most Common Classes')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # 2. Instructor popularity
+                st.subheader("Instructor Popularity")
+                instructor_counts = cached(load_rollup, selected_gym_history, 'instructor', start_date, end_date,
+                                           'day', False, gym_version)[['value', 'occurrences']]
+                instructor_counts.columns = ['Instructor', 'Count']
+                
+                fig = px.bar(instructor_counts.head(10), x='Instructor', y='Count',
+                             title='Most Active Instructors')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # 3. Class availability patterns
+                st.subheader("Availability Patterns")
+                
+                # Share of scrapes in which each class had open spots
+                availability_by_class = pd.DataFrame({
+                    'Class': class_rollup['value'],
+                    'Availability Rate': class_rollup['open'] / class_rollup['occurrences'] * 100,
+                })
+                
+                fig = px.bar(availability_by_class.sort_values('Availability Rate', ascending=False).head(10), 
+                             x='Class', y='Availability Rate',
+                             title='Classes with Highest Availability Rate (%)')
+                st.plotly_chart(fig, use_container_width=True)
+
+                hourly = cached(load_rollup, selected_gym_history, 'class', start_date, end_date, 'hour', True, gym_version)
+                hourly = hourly.groupby('bucket')[['open', 'occurrences']].sum().reset_index()
+                hourly['Availability Rate'] = hourly['open'] / hourly['occurrences'] * 100
+                hourly['Hour'] = pd.to_datetime(hourly['bucket'], format='%Y-%m-%d %H')
+                fig = px.line(hourly, x='Hour', y='Availability Rate', markers=True,
+                              title='Classes with Open Spots by Hour (%)')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # 4. What changed between scrapes, read straight from the stored change events
+                st.subheader("Schedule Changes")
+                changes_df = cached(load_changes, selected_gym_history, start_date, end_date, gym_version)
+                if changes_df.empty:
+                    st.info("No changes between scrapes in this date range.")
                 else:
-                    st.info(f"No historical data available for {selected_gym_history}")
+                    change_counts = changes_df['change'].value_counts()
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Classes Added", int(change_counts.get('added', 0)))
+                    col2.metric("Classes Removed", int(change_counts.get('removed', 0)))
+                    col3.metric("Availability Changes", int(change_counts.get('changed', 0)))
+                    st.dataframe(changes_df.iloc[::-1], use_container_width=True)
+
+                # 5. Raw data browsing, one page at a time, filtered where the history is stored
+                st.subheader("Raw Historical Data")
+                if st.toggle("Browse raw rows", key="raw_history_open"):
+                    col1, col2, col3 = st.columns(3)
+                    raw_instructors = col1.multiselect("Instructor", options=instructor_counts['Instructor'].tolist(),
+                                                       key="raw_instructors")
+                    raw_classes = col2.multiselect("Class", options=class_counts['Class'].tolist(), key="raw_classes")
+                    raw_statuses = col3.multiselect("Availability", options=list(availability.STATUSES),
+                                                    key="raw_statuses")
+                    col1, col2 = st.columns([1, 3])
+                    page_size = col1.selectbox("Rows per page", options=[25, 50, 100, 500], index=1, key="raw_page_size")
+                    page = st.session_state.get("raw_page", 1)
+                    page_df, total_rows = cached(load_history_page, selected_gym_history, start_date, end_date,
+                                                 tuple(raw_instructors), tuple(raw_classes), tuple(raw_statuses),
+                                                 (page - 1) * page_size, page_size, gym_version)
+                    page_count = max(1, -(-total_rows // page_size))
+                    if page > page_count:
+                        # Filters narrowed the result; jump to its last page
+                        st.session_state["raw_page"] = page_count
+                        st.rerun()
+                    col2.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key="raw_page")
+                    first_row = (page - 1) * page_size
+                    st.caption(f"Rows {min(first_row + 1, total_rows)}-{first_row + len(page_df)} of {total_rows}")
+                    st.dataframe(page_df, use_container_width=True)
+            else:
+                st.info(f"No historical data available for {selected_gym_history}")
     
     with tab3:
         st.header("Settings")
@@ -424,10 +395,10 @@ def main():
         # Show existing gyms
         st.subheader("Pre-configured Gyms")
         
-        if data['gyms']:
+        if gyms:
             gym_df = pd.DataFrame([
                 {"Gym Name": gym['name'], "Website URL": gym['url']}
-                for gym in data['gyms']
+                for gym in gyms
             ])
             st.dataframe(gym_df, use_container_width=True)
         
@@ -441,15 +412,33 @@ def main():
             st.markdown("Enter CSS selectors for the gym's website elements")
             
             class_selector = st.text_input("Class Container Selector (e.g., '.class-item, tr, .schedule-row')", 
-                                          value=".class-item, tr, .schedule-row")
+                                          value=DEFAULT_SELECTORS['class_selector'])
             instructor_selector = st.text_input("Class Name Selector (e.g., '.class-name, td:first-child, h3')", 
-                                            value=".class-name, td:first-child, h3")
+                                            value=DEFAULT_SELECTORS['instructor_selector'])
             time_selector = st.text_input("Instructor Selector (e.g., '.instructor, td:nth-child(2), .trainer')", 
-                                      value=".instructor, td:nth-child(2), .trainer")
+                                      value=DEFAULT_SELECTORS['time_selector'])
             availability_selector = st.text_input("Time Selector (e.g., '.time, td:nth-child(3), .schedule-time')", 
-                                             value=".time, td:nth-child(3), .schedule-time")
+                                             value=DEFAULT_SELECTORS['availability_selector'])
             
             st.markdown("These are general selectors that try multiple options. You may need to adjust them based on the gym's website structure.")
+
+            st.markdown("### Parser Settings")
+            parser_options = [parsing.DEFAULT_BACKEND] + [name for name in ('html.parser', 'lxml', 'selectolax')
+                                                          if name != parsing.DEFAULT_BACKEND]
+            parser = st.selectbox("HTML Parser", options=parser_options,
+                                  help="lxml and selectolax are much faster than html.parser if installed")
+            scrape_interval = st.number_input("Background Scrape Interval (minutes)", min_value=1, value=60,
+                                              help="How often the background worker (python -m worker) scrapes this gym")
+            max_rate = st.number_input("Max Requests per Second to This Site", min_value=0.01,
+                                       value=rate_limit.DEFAULT_MAX_RATE, step=0.1,
+                                       help="Scrapes start slower and speed up to this while the site responds well; "
+                                            "they slow down on 429/503 responses or rising latency, and never go "
+                                            "faster than its robots.txt allows")
+            streaming = st.checkbox("Stream Large Pages",
+                                    help="Read the page in chunks and show classes while it downloads. "
+                                         "Keeps memory flat for multi-megabyte schedules, but skips the page cache.")
+            parse_only = st.text_input("Schedule Region (optional, e.g. 'table', '.schedule', '#classes')",
+                                       help="Only this part of the page is parsed. Leave empty to parse the whole page.")
             
             submitted = st.form_submit_button("Add Gym")
             
@@ -467,51 +456,100 @@ def main():
                             'class_selector': class_selector,
                             'instructor_selector': instructor_selector,
                             'time_selector': time_selector,
-                            'availability_selector': availability_selector
+                            'availability_selector': availability_selector,
+                            'parser': parser,
+                            'scrape_interval': int(scrape_interval * 60)
                         }
+                        if max_rate != rate_limit.DEFAULT_MAX_RATE:
+                            new_gym['rate_limit'] = {'max_rate': max_rate,
+                                                     'rate': min(max_rate, rate_limit.DEFAULT_RATE)}
+                        if streaming:
+                            new_gym['streaming'] = True
+                        if parse_only.strip():
+                            new_gym['parse_only'] = parse_only.strip()
                         
-                        # Check if gym with same name already exists
-                        if any(gym['name'] == gym_name for gym in data['gyms']):
-                            # Update existing gym
-                            data['gyms'] = [new_gym if gym['name'] == gym_name else gym for gym in data['gyms']]
-                            st.success(f"Updated gym: {gym_name}")
-                        else:
-                            # Add new gym
-                            data['gyms'].append(new_gym)
+                        # Add the gym, or update it if one with the same name already exists
+                        if store.save_gym(new_gym):
                             st.success(f"Added new gym: {gym_name}")
-                        
-                        save_gym_data(data)
+                        else:
+                            st.success(f"Updated gym: {gym_name}")
                 except ValueError:
                     st.error("Invalid URL format")
         
         # Manage existing gyms
         st.subheader("Manage Gyms")
         
-        if data['gyms']:
-            for i, gym in enumerate(data['gyms']):
+        if gyms:
+            for i, gym in enumerate(gyms):
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.markdown(f"**{gym['name']}**: {gym['url']}")
                 with col2:
                     if st.button("Delete", key=f"delete_{i}"):
-                        data['gyms'].remove(gym)
-                        # Also remove associated schedules
-                        data['schedules'] = [s for s in data['schedules'] if s['gym_name'] != gym['name']]
-                        save_gym_data(data)
+                        # Also removes associated schedules
+                        store.delete_gym(gym['name'])
                         st.success(f"Deleted gym: {gym['name']}")
-                        st.experimental_rerun()
+                        st.rerun()
         else:
             st.info("No gyms configured yet")
         
+        # Where recent scrape requests spent their time
+        st.subheader("Request Timings")
+        recent_timings = list(get_client().timings)
+        if recent_timings:
+            st.dataframe(pd.DataFrame([t.as_dict() for t in reversed(recent_timings)]), use_container_width=True)
+        else:
+            st.info("No requests made yet in this session")
+
+        # Per-gym scrape percentiles, from the metrics log (includes the worker's scrapes)
+        st.subheader("Scrape Performance")
+        scrape_summary = get_metrics().summary()
+        if scrape_summary:
+            st.dataframe(pd.DataFrame(scrape_summary), use_container_width=True)
+            st.caption("p50/p95 in ms over the most recent scrapes of each gym; "
+                       "rows are counted per strategy that found them")
+            col1, col2 = st.columns(2)
+            col1.download_button("Download Prometheus metrics", get_metrics().prometheus(),
+                                 file_name="gym_metrics.prom", mime="text/plain", key="download_prometheus")
+            col2.download_button("Download scrape log (JSONL)",
+                                 "\n".join(json.dumps(record) for record in get_metrics().recent()) + "\n",
+                                 file_name="scrape_metrics.jsonl", mime="application/jsonl", key="download_metrics_log")
+        else:
+            st.info("No scrapes recorded yet")
+
+        # Current request rate per website, as adapted to how each one responds
+        st.subheader("Rate Limits")
+        host_limits = scraper.default_throttle.stats()
+        if host_limits:
+            st.dataframe(pd.DataFrame(host_limits), use_container_width=True)
+            st.caption("rate and max_rate in requests per second; robots_rate is the limit from the site's robots.txt")
+        else:
+            st.info("No websites contacted yet in this session")
+
+        # Schedule page cache
+        st.subheader("Page Cache")
+        cache_stats = get_cache().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits", cache_stats['hits'])
+        col2.metric("Revalidated (304)", cache_stats['revalidated'])
+        col3.metric("Misses", cache_stats['misses'])
+        col4.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.caption(f"{cache_stats['entries']} pages cached, {cache_stats['bytes'] / 1024:.0f} KB, "
+                   f"{cache_stats['evictions']} evicted")
+        if st.button("Clear Page Cache", key="clear_page_cache"):
+            get_cache().clear()
+            st.success("Page cache cleared!")
+
         # Clear all data option
         st.subheader("Data Management")
         if st.button("Clear All Data", key="clear_data"):
             if st.warning("This will delete all gym configurations and historical data. Are you sure?"):
                 if st.button("Yes, I'm sure", key="confirm_clear"):
-                    data = {"gyms": [], "schedules": []}
-                    save_gym_data(data)
+                    store.clear()
                     st.success("All data cleared!")
-                    st.experimental_rerun()
+                    st.rerun()
+
+    show_cache_stats()
 
 if __name__ == "__main__":
     main()
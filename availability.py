@@ -0,0 +1,84 @@
+# Normalized availability: turns the free-text availability a gym shows ("5 spots left",
+# "Class Full", "Join waitlist", ...) into a numeric spots count and a status.
+# Parsing is vectorized over pandas string columns, and works on the distinct strings only:
+# a scrape history repeats a handful of availability texts millions of times, so the
+# column is made categorical, its categories are parsed, and the result is spread back by code.
+# It runs once when a scrape is stored (see storage.py and history.py), not on every rerun.
+import numpy as np
+import pandas as pd
+
+OPEN = 'open'
+FULL = 'full'
+WAITLIST = 'waitlist'
+UNKNOWN = 'unknown'
+STATUSES = (OPEN, FULL, WAITLIST, UNKNOWN)
+STATUS_DTYPE = pd.CategoricalDtype(STATUSES)
+
+_UNITS = r'(?:spots?|spaces?|seats?|places?|openings?)'
+# "5 spots left", "12 spaces available", or "Spots left: 5"
+SPOTS_PATTERN = rf'(?P<before>\d+)\s*{_UNITS}|{_UNITS}\s*(?:left|available|remaining|open)?\s*:?\s*(?P<after>\d+)'
+# "8/10" or "8 of 10": booked out of capacity, unless the text says the first number is what
+# is left ("3/10 spots left", "2 of 12 available")
+RATIO_PATTERN = r'(?P<count>\d+)\s*(?:/|\bof\b)\s*(?P<capacity>\d+)'
+REMAINING_PATTERN = rf'left|available|remaining|open|{_UNITS}'
+WAITLIST_PATTERN = r'wait\s*-?\s*list|waiting'
+FULL_PATTERN = (rf'\bfull\b|sold\s*out|fully\s*booked|booked\s*out|capacity\s*reached|no\s+{_UNITS}'
+                r'|not\s+available|unavailable')
+OPEN_PATTERN = rf'available|\bopen|{_UNITS}'
+
+
+# Function to parse distinct availability strings; returns (spots, status) as arrays
+def _parse_distinct(values):
+    lowered = pd.Series(values, dtype=object).astype(str).str.lower()
+    found = lowered.str.extract(SPOTS_PATTERN)
+    spots = pd.to_numeric(found['before'].fillna(found['after']), errors='coerce')
+    ratio = lowered.str.extract(RATIO_PATTERN).apply(pd.to_numeric, errors='coerce')
+    remaining = lowered.str.contains(REMAINING_PATTERN, regex=True)
+    ratio_spots = ratio['count'].where(remaining, (ratio['capacity'] - ratio['count']).clip(lower=0))
+    spots = ratio_spots.fillna(spots)
+
+    status = pd.Series(UNKNOWN, index=lowered.index, dtype=object)
+    is_open = lowered.str.contains(OPEN_PATTERN, regex=True) | (spots > 0)
+    is_full = lowered.str.contains(FULL_PATTERN, regex=True) | (spots == 0)
+    is_waitlist = lowered.str.contains(WAITLIST_PATTERN, regex=True)
+    # The most specific answer wins: a waitlist beats "full", "full" beats a mention of spots
+    status[is_open] = OPEN
+    status[is_full] = FULL
+    status[is_waitlist] = WAITLIST
+    return spots.to_numpy(), status.to_numpy()
+
+
+# Function to parse an availability column (Series, list or array of strings; missing values
+# are allowed). Returns a DataFrame with the same index and two columns:
+#   spots   nullable Int32, the number of open spots when the text gives one
+#   status  categorical of STATUSES
+def parse_availability(values):
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values, dtype=object)
+    categorical = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+    codes = categorical.cat.codes.to_numpy()
+    categories = categorical.cat.categories
+
+    spots = np.full(len(values), np.nan)
+    status_codes = np.full(len(values), STATUSES.index(UNKNOWN), dtype='int8')
+    present = codes >= 0
+    if len(categories):
+        distinct_spots, distinct_status = _parse_distinct(categories)
+        spots[present] = distinct_spots[codes[present]]
+        status_codes[present] = pd.Categorical(distinct_status, dtype=STATUS_DTYPE).codes[codes[present]]
+    return pd.DataFrame({
+        'spots': pd.array(spots, dtype='Int32'),
+        'status': pd.Categorical.from_codes(status_codes, dtype=STATUS_DTYPE),
+    }, index=values.index)
+
+
+# Function to add 'spots' and 'status' to class dicts (a new list; the dicts are copied),
+# parsing all their availability texts in one pass
+def annotate(classes):
+    classes = list(classes)
+    if not classes:
+        return []
+    parsed = parse_availability([cls.get('availability') for cls in classes])
+    spots = [None if pd.isna(value) else int(value) for value in parsed['spots']]
+    return [dict(cls, spots=count, status=status)
+            for cls, count, status in zip(classes, spots, parsed['status'].astype(str))]
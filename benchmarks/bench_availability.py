@@ -0,0 +1,79 @@
+# Availability parsing over a large history column.
+#
+#   python benchmarks/bench_availability.py --rows 1000000
+#
+# "legacy apply" is what the Historical Data tab used to run on every rerun (a re.search per
+# row for the number plus a lambda calling .lower() several times for is_available);
+# the other rows go through availability.parse_availability on a plain object column and on
+# an already categorical one. Texts are drawn from a few dozen variants, as in real history.
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import availability  # noqa: E402
+
+TEMPLATES = ["{n} spots left", "{n} spots available", "Spots left: {n}", "{n} spaces", "Full", "Class Full",
+             "Waitlist", "Join waitlist", "Available", "Unknown", "No spots", "Sold out"]
+
+
+def texts(rows, seed=0):
+    random.seed(seed)
+    variants = [template.format(n=n) for template in TEMPLATES for n in range(0, 25, 3)]
+    variants = list(dict.fromkeys(variants)) + [None]
+    return [random.choice(variants) for _ in range(rows)]
+
+
+def legacy(column):
+    def extract_availability_number(text):
+        if isinstance(text, str):
+            match = re.search(r'(\d+)\s*(spot|space|seat|place|opening)', text.lower())
+            if match:
+                return int(match.group(1))
+        return None
+
+    numbers = column.apply(extract_availability_number)
+    available = column.apply(
+        lambda x: 1 if isinstance(x, str) and any(word in x.lower() for word in ['available', 'open', 'spot', 'space'])
+        and 'no ' not in x.lower() and 'not ' not in x.lower() and 'full' not in x.lower() else 0
+    )
+    return numbers, available
+
+
+def best_of(repeat, function, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - began)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time availability parsing over a large history column.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    column = pd.Series(texts(args.rows), dtype=object)
+    categorical = column.astype('category')
+    print(f"{args.rows} rows, {categorical.cat.categories.size} distinct texts")
+    print(f"{'method':<28} {'seconds':>8}")
+    for label, function, data in (("legacy apply", legacy, column),
+                                  ("vectorized (object)", availability.parse_availability, column),
+                                  ("vectorized (categorical)", availability.parse_availability, categorical)):
+        print(f"{label:<28} {best_of(args.repeat, function, data):>8.3f}")
+
+    parsed = availability.parse_availability(column)
+    print()
+    print(parsed['status'].value_counts().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Wall-clock comparison of the serial scrape loop against scraper.scrape_gyms.
+#
+#   python benchmarks/bench_batch_scrape.py --gyms 10 --latency 0.3
+#
+# "legacy serial" runs the original scrape path against the same servers: a fixed sleep
+# before every request (--legacy-delay, 2 seconds as in the original code), a new connection
+# per request with requests.get, and the original BeautifulSoup extraction.
+# Every gym gets its own local stub server, so the per-host rate limit only applies to
+# repeated requests to the same server, exactly as with real gym websites.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+import scraper  # noqa: E402
+from bench_parse import legacy_extract  # noqa: E402
+from rate_limit import DEFAULT_RATE, RateLimiter  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from stub_server import StubGymServer, stub_gym  # noqa: E402
+
+
+def legacy_scrape(gym, delay):
+    time.sleep(delay)
+    response = requests.get(gym['url'], timeout=10)
+    response.raise_for_status()
+    return legacy_extract(response.text, gym['class_selector'], gym['instructor_selector'], gym['time_selector'],
+                          gym['availability_selector'])
+
+
+def run_legacy(gyms, delay):
+    for gym in gyms:
+        legacy_scrape(gym, delay)
+
+
+def run_serial(gyms, throttle, cache):
+    for gym in gyms:
+        scraper.scrape_gym(gym, throttle=throttle, cache=cache)
+
+
+def run_batch(gyms, throttle, cache, workers):
+    for _ in scraper.scrape_gyms(gyms, max_workers=workers, throttle=throttle, cache=cache):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serial scrape loop with scraper.scrape_gyms against local stub servers.")
+    parser.add_argument('--gyms', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.3, help="server response delay in seconds")
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=scraper.DEFAULT_MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help="starting requests per second per host (0: unlimited)")
+    parser.add_argument('--legacy-delay', type=float, default=2.0,
+                        help="seconds the legacy loop sleeps before every request")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        # A TTL of 0 means every scrape really fetches the page
+        cache_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        cache = ResponseCache(os.path.join(cache_dir, 'cache.sqlite'), ttl=0)
+        servers = [stack.enter_context(StubGymServer(args.latency, args.rows)) for _ in range(args.gyms)]
+        gyms = [stub_gym(f"Stub Gym {i}", server.url) for i, server in enumerate(servers)]
+
+        start = time.perf_counter()
+        run_legacy(gyms, args.legacy_delay)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_serial(gyms, RateLimiter(args.rate or None, robots=False), cache)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_batch(gyms, RateLimiter(args.rate or None, robots=False), cache, args.workers)
+        batch = time.perf_counter() - start
+
+    print(f"gyms={args.gyms} latency={args.latency}s rows={args.rows} workers={args.workers}")
+    print(f"{f'legacy serial ({args.legacy_delay:g}s sleep each):':<34}{legacy:8.2f}s")
+    print(f"{'serial loop:':<34}{serial:8.2f}s  ({legacy / serial:.1f}x faster than legacy)")
+    print(f"{'scrape_gyms:':<34}{batch:8.2f}s  ({legacy / batch:.1f}x faster than legacy, "
+          f"{serial / batch:.1f}x than serial)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# Load time and peak RSS of the Historical Data tab's input: the old gym_data.json path
+# (json.load + the nested-dict loop + DataFrame) against the partitioned Parquet history.
+#
+#   python benchmarks/bench_history_load.py --sizes 10000 100000 1000000
+#
+# Each measurement runs in a fresh child process so peak RSS is not polluted by earlier runs;
+# "+peak MB" is peak RSS growth during the load itself.
+# Rows are spread over 4 gyms and 90 days; "one gym" reads the first gym's full history and
+# "one gym, 7 days" only its last week. Like real timetables, each gym keeps the same classes
+# from scrape to scrape and only a few change availability, so the Parquet side stores mostly
+# change events and rebuilds the full rows on load ("stored rows" shows how many it keeps).
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GYMS = ["LA Fitness", "YMCA", "Equinox", "Gold's Gym"]
+CLASSES_PER_SCRAPE = 25
+DAYS = 90
+
+
+# Function to write `rows` synthetic classes in both formats; returns the last date and the
+# number of rows the Parquet history stores
+def generate(rows, directory):
+    import changes
+    import history
+
+    random.seed(rows)
+    scrapes = max(1, rows // CLASSES_PER_SCRAPE)
+    start = datetime(2026, 1, 1)
+    availability = ["5 spots left", "Full", "12 spots available", "Waitlist", "Unknown"]
+    timetables = {gym: [{
+        'name': f"Class {random.randrange(40)}",
+        'instructor': f"Instructor {random.randrange(15)}",
+        'time': f"{random.randrange(6, 21)}:{random.choice(['00', '30'])}",
+        'availability': random.choice(availability),
+    } for _ in range(CLASSES_PER_SCRAPE)] for gym in GYMS}
+    schedules = []
+    for i in range(scrapes):
+        stamp = (start + timedelta(seconds=int(i * DAYS * 86400 / scrapes))).strftime('%Y-%m-%d %H:%M:%S')
+        gym = GYMS[i % len(GYMS)]
+        for cls in random.sample(timetables[gym], 3):
+            cls['availability'] = random.choice(availability)
+        classes = [dict(cls, timestamp=stamp) for cls in timetables[gym]]
+        schedules.append({'gym_name': gym, 'classes': classes, 'timestamp': stamp})
+
+    with open(os.path.join(directory, 'gym_data.json'), 'w') as f:
+        json.dump({'gyms': [], 'schedules': schedules}, f)
+
+    history_dir = os.path.join(directory, 'history')
+    stored = 0
+    for gym in GYMS:
+        state, previous, events, ids, stamps = {}, None, [], [], []
+        for schedule_id, schedule in enumerate(s for s in schedules if s['gym_name'] == gym):
+            kind, state, found = changes.compare(state, previous, schedule['classes'], schedule['timestamp'])
+            rows_ = changes.history_events(kind, state, found)
+            events.extend(rows_)
+            ids.extend([schedule_id] * len(rows_))
+            stamps.extend([schedule['timestamp']] * len(rows_))
+            previous = schedule['timestamp']
+        history.write_table(history.events_table(events, ids, stamps), gym, history_dir)
+        if gym == GYMS[0]:
+            stored = len(events)
+    return schedules[-1]['timestamp'][:10], stored
+
+
+# What the Historical Data tab used to do on every rerun
+def load_json(directory, gym, start):
+    import pandas as pd
+
+    with open(os.path.join(directory, 'gym_data.json')) as f:
+        data = json.load(f)
+    all_classes = []
+    for schedule in data['schedules']:
+        if schedule['gym_name'] != gym or schedule['timestamp'][:10] < start:
+            continue
+        for class_info in schedule['classes']:
+            class_info['schedule_timestamp'] = schedule['timestamp']
+            all_classes.append(class_info)
+    return pd.DataFrame(all_classes)
+
+
+def load_parquet(directory, gym, start):
+    import history
+
+    return history.load_history(gym, start=start or None, root=os.path.join(directory, 'history'))
+
+
+def _rss_mb(field='VmRSS'):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _peak_rss_mb():
+    return _rss_mb('VmHWM')
+
+
+# Child process: run one load and print seconds, rows and peak RSS (MB) as JSON.
+# Both formats import pandas and pyarrow up front, so neither timing nor RSS includes them.
+def child(fmt, directory, gym, start):
+    import history  # noqa: F401
+    import pandas  # noqa: F401
+
+    # Reset the kernel's peak-RSS mark (Linux) so the import spike is not reported as the peak
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    baseline_mb = _rss_mb()
+    began = time.perf_counter()
+    frame = (load_json if fmt == 'json' else load_parquet)(directory, gym, start)
+    elapsed = time.perf_counter() - began
+    peak_mb = _peak_rss_mb() - baseline_mb
+    print(json.dumps({'seconds': elapsed, 'rows': len(frame), 'peak_mb': peak_mb}))
+
+
+def measure(fmt, directory, gym, start):
+    out = subprocess.run(
+        [sys.executable, __file__, '--child', fmt, directory, gym, start],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Historical Data loading from gym_data.json and from the Parquet history.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'rows':>9} {'query':<16} {'format':<8} {'seconds':>8} {'+peak MB':>8} {'rows read':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            last_day, stored = generate(size, directory)
+            print(f"{size:>9} stored rows for {GYMS[0]}: json {size // len(GYMS)}, parquet {stored}")
+            week_start = (datetime.strptime(last_day, '%Y-%m-%d') - timedelta(days=6)).strftime('%Y-%m-%d')
+            for label, start in (("one gym", ""), ("one gym, 7 days", week_start)):
+                for fmt in ('json', 'parquet'):
+                    result = measure(fmt, directory, GYMS[0], start)
+                    print(f"{size:>9} {label:<16} {fmt:<8} {result['seconds']:>8.3f} "
+                          f"{result['peak_mb']:>8.1f} {result['rows']:>10}")
+
+
+if __name__ == '__main__':
+    main()
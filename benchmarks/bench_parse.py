@@ -0,0 +1,74 @@
+# Parse-only micro-benchmark over the saved fixture page of every pre-configured gym.
+#
+#   python benchmarks/bench_parse.py --repeat 20
+#
+# "legacy" is the original scrape_gym_data extraction (html.parser, two select_one calls per
+# field, find_all keyword scan); the other rows go through parsing.parse_schedule with each
+# installed backend, with and without restricting parsing to the schedule region.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import parsing  # noqa: E402
+from fixtures import load_fixture  # noqa: E402
+from storage import DEFAULT_GYMS  # noqa: E402
+
+SCHEDULE_REGION = '#schedule'
+
+
+def legacy_extract(html, class_selector, instructor_selector, time_selector, availability_selector):
+    soup = BeautifulSoup(html, 'html.parser')
+    classes = []
+    for element in soup.select(class_selector):
+        class_name = element.select_one(instructor_selector).text.strip() if element.select_one(instructor_selector) else "Unknown"
+        instructor = element.select_one(time_selector).text.strip() if element.select_one(time_selector) else "Unknown"
+        time_info = element.select_one(availability_selector).text.strip() if element.select_one(availability_selector) else "Unknown"
+        availability_text = "Unknown"
+        for tag in element.find_all(['span', 'div', 'p']):
+            text = tag.text.lower()
+            if any(word in text for word in ['available', 'spot', 'space', 'full', 'capacity']):
+                availability_text = tag.text.strip()
+                break
+        classes.append({'name': class_name, 'instructor': instructor, 'time': time_info,
+                        'availability': availability_text})
+    return classes
+
+
+def best_of(repeat, func, *args, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time parsing the saved fixture page of every pre-configured gym.")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    backends = ['html.parser'] + (['lxml'] if parsing.HAVE_LXML else []) + (['selectolax'] if parsing.HAVE_SELECTOLAX else [])
+    print(f"{'gym':<18} {'variant':<26} {'ms':>8} {'rows':>5} {'speedup':>8}")
+    for gym in DEFAULT_GYMS:
+        html = load_fixture(gym)
+        selectors = (gym['class_selector'], gym['instructor_selector'], gym['time_selector'], gym['availability_selector'])
+        baseline, expected = best_of(args.repeat, legacy_extract, html, *selectors)
+        print(f"{gym['name']:<18} {'legacy':<26} {baseline * 1000:>8.2f} {len(expected):>5} {1:>7.1f}x")
+        for backend in backends:
+            for region in (None, SCHEDULE_REGION):
+                seconds, (classes, _) = best_of(args.repeat, parsing.parse_schedule, html, *selectors,
+                                                backend=backend, parse_only=region)
+                label = backend + (f" + {region}" if region else "")
+                note = "" if classes == expected else "  (differs from legacy)"
+                print(f"{'':<18} {label:<26} {seconds * 1000:>8.2f} {len(classes):>5} "
+                      f"{baseline / seconds:>7.1f}x{note}")
+
+
+if __name__ == '__main__':
+    main()
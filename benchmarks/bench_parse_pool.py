@@ -0,0 +1,92 @@
+# Parse throughput of parse_pool.ParsePool against parsing in threads, from 1 to N workers.
+#
+#   python benchmarks/bench_parse_pool.py --pages 64 --workers 1 2 4 8
+#
+# Pages are synthetic schedule pages for every pre-configured gym (a different seed per copy),
+# handed over as raw bytes the way scraper.scrape_gym_data does. "threads" is what concurrent
+# scrapes do without a pool: the GIL keeps them on one core. Pools are started and warmed up
+# before they are timed; the results are checked against parsing in this thread.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parse_pool  # noqa: E402
+import parsing  # noqa: E402
+from fixtures import gym_page  # noqa: E402
+from storage import DEFAULT_GYMS  # noqa: E402
+
+
+def pages(count, rows):
+    result = []
+    for i in range(count):
+        gym = DEFAULT_GYMS[i % len(DEFAULT_GYMS)]
+        selectors = (gym['class_selector'], gym['instructor_selector'], gym['time_selector'],
+                     gym['availability_selector'])
+        result.append((gym_page(gym, rows=rows, seed=i).encode('utf-8'), selectors))
+    return result
+
+
+def parse_here(page, selectors, backend):
+    return parsing.parse_schedule(page.decode('utf-8'), *selectors, backend=backend)
+
+
+def run_threads(work, workers, backend):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda item: parse_here(*item, backend), work))
+
+
+def run_pool(pool, work, backend):
+    futures = [pool.submit(page, *selectors, encoding='utf-8', backend=backend) for page, selectors in work]
+    return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parse throughput of parse_pool.ParsePool with parsing in threads.")
+    parser.add_argument('--pages', type=int, default=64)
+    parser.add_argument('--rows', type=int, default=300, help="classes per page")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--backend', help="parser backend (default: the fastest installed)")
+    parser.add_argument('--kind', choices=[parse_pool.PROCESS, parse_pool.INTERPRETER], default=parse_pool.PROCESS)
+    args = parser.parse_args()
+
+    work = pages(args.pages, args.rows)
+    megabytes = sum(len(page) for page, _ in work) / 1e6
+    print(f"{args.pages} pages, {megabytes:.1f} MB, backend {parsing.get_backend(args.backend).name}, "
+          f"{os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    expected = [parse_here(page, selectors, args.backend) for page, selectors in work]
+    serial = time.perf_counter() - start
+    print(f"{'variant':<22} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+    print(f"{'this thread':<22} {serial:>8.2f} {args.pages / serial:>8.1f} {1:>7.1f}x")
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        run_threads(work, workers, args.backend)
+        seconds = time.perf_counter() - start
+        print(f"{f'threads x{workers}':<22} {seconds:>8.2f} {args.pages / seconds:>8.1f} {serial / seconds:>7.1f}x")
+
+    for workers in args.workers:
+        pool = parse_pool.ParsePool(workers, args.kind)
+        try:
+            pool.warm_up()
+            start = time.perf_counter()
+            results = run_pool(pool, work, args.backend)
+            seconds = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        same = all([(r[0], r[1], r[2], r[3]) for r in records] == [tuple(c.values()) for c in classes]
+                   and strategy == found
+                   for (records, strategy, _, _), (classes, found) in zip(results, expected))
+        label = f"{'processes' if pool.kind == parse_pool.PROCESS else 'interpreters'} x{workers}"
+        print(f"{label:<22} {seconds:>8.2f} {args.pages / seconds:>8.1f} {serial / seconds:>7.1f}x"
+              + ("" if same else "  (results differ)"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Memory of a long scrape history in each class layout.
+#
+#   python benchmarks/bench_records_memory.py --rows 500000
+#
+# "dicts" is the old layout: gym_data.json loaded with json.load, one dict of five strings
+# per class, every string its own object (the timestamp formatted per row). "records" is a
+# list of records.ClassRecord (slots, interned text, epoch seconds). The DataFrame rows are
+# pandas with plain text columns against records.frame() (categoricals).
+# Python objects are measured with tracemalloc; DataFrames with memory_usage(deep=True).
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import records  # noqa: E402
+from fixtures import CLASS_NAMES, INSTRUCTORS  # noqa: E402
+
+CLASSES_PER_SCRAPE = 25
+
+
+# Function to build the JSON text of `rows` scraped classes: a fixed timetable scraped every
+# half hour with a few availabilities changing each time
+def history_json(rows, seed=0):
+    rng = random.Random(seed)
+    timetable = [{'name': rng.choice(CLASS_NAMES), 'instructor': rng.choice(INSTRUCTORS),
+                  'time': f"{rng.randrange(6, 21)}:{rng.choice(['00', '30'])}",
+                  'availability': f"{rng.randrange(1, 25)} spots left"} for _ in range(CLASSES_PER_SCRAPE)]
+    stamp = datetime(2026, 1, 1, 6)
+    schedules = []
+    for _ in range(max(1, rows // CLASSES_PER_SCRAPE)):
+        for cls in rng.sample(timetable, 3):
+            cls['availability'] = rng.choice(["Full", "Waitlist", f"{rng.randrange(1, 25)} spots left"])
+        timestamp = stamp.strftime('%Y-%m-%d %H:%M:%S')
+        schedules.append({'gym_name': 'LA Fitness', 'timestamp': timestamp,
+                          'classes': [dict(cls, timestamp=timestamp) for cls in timetable]})
+        stamp += timedelta(minutes=30)
+    return json.dumps({'gyms': [], 'schedules': schedules})
+
+
+# Function to measure what `build()` keeps alive; returns (bytes, seconds, result)
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    began = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - began
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory of a long scrape history in each class layout.")
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    text = history_json(args.rows)
+
+    def load_dicts():
+        return [cls for schedule in json.loads(text)['schedules'] for cls in schedule['classes']]
+
+    dict_bytes, dict_seconds, dicts = traced(load_dicts)
+    record_bytes, record_seconds, compact = traced(lambda: records.from_dicts(dicts))
+    rows = len(dicts)
+
+    began = time.perf_counter()
+    plain = pd.DataFrame(dicts).astype(object)
+    plain_seconds = time.perf_counter() - began
+    began = time.perf_counter()
+    categorical = records.frame(compact)
+    categorical_seconds = time.perf_counter() - began
+
+    results = [
+        ("dicts (json.load)", dict_bytes, dict_seconds),
+        ("ClassRecord list", record_bytes, record_seconds),
+        ("DataFrame, text columns", plain.memory_usage(deep=True).sum(), plain_seconds),
+        ("DataFrame, categoricals", categorical.memory_usage(deep=True).sum(), categorical_seconds),
+    ]
+    print(f"{rows} classes")
+    print(f"{'layout':<26} {'MB':>8} {'bytes/row':>10} {'vs dicts':>9} {'build s':>8}")
+    for label, size, seconds in results:
+        print(f"{label:<26} {size / 1e6:>8.1f} {size / rows:>10.0f} {size / dict_bytes:>8.0%} {seconds:>8.2f}")
+
+    assert [dict(record) for record in compact[:1000]] == dicts[:1000]
+
+
+if __name__ == '__main__':
+    main()
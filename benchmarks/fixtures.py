@@ -0,0 +1,103 @@
+# Synthetic schedule pages for the pre-configured gyms.
+# Each page is built to match that gym's configured selectors and is wrapped in the kind of
+# navigation, script and footer markup real gym sites carry, so parse-only benchmarks see a
+# realistic amount of non-schedule HTML. Running this file (re)writes benchmarks/fixtures/*.html.
+import os
+import random
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import DEFAULT_GYMS  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+CLASS_NAMES = ["Spinning", "Yoga", "HIIT", "Pilates", "Zumba", "Body Pump", "Boxing", "Barre",
+               "Aqua Fit", "Kettlebell", "Core Blast", "Step", "Tai Chi", "Bootcamp", "Stretch"]
+INSTRUCTORS = ["John Doe", "Jane Smith", "Mike Johnson", "Sarah Williams", "Maria Garcia",
+               "Robert Brown", "Ava Chen", "Liam Patel", "Noah Kim", "Emma Rossi"]
+AVAILABILITY = ["{n} spots available", "{n} spots left", "Full", "Waitlist only", "{n} spaces open",
+                "At capacity"]
+
+
+def slug(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def fixture_path(gym_name):
+    return os.path.join(FIXTURE_DIR, slug(gym_name) + '.html')
+
+
+def _css_class(selector):
+    return selector.lstrip('.')
+
+
+def _row(gym, rng):
+    name = rng.choice(CLASS_NAMES)
+    instructor = rng.choice(INSTRUCTORS)
+    hour = rng.randrange(6, 21)
+    start = f"{(hour - 1) % 12 + 1}:{rng.choice(['00', '15', '30', '45'])} {'AM' if hour < 12 else 'PM'}"
+    availability = rng.choice(AVAILABILITY).format(n=rng.randrange(1, 25))
+    if gym['class_selector'] == 'tr':
+        return (f"<tr><td>{name}</td><td>{instructor}</td><td>{start}</td>"
+                f"<td><span>{availability}</span></td></tr>")
+    # Note the gym entries' field mapping: instructor_selector holds the class name,
+    # time_selector the instructor and availability_selector the start time
+    return (f'<div class="{_css_class(gym["class_selector"])}">'
+            f'<h3 class="{_css_class(gym["instructor_selector"])}">{name}</h3>'
+            f'<span class="{_css_class(gym["time_selector"])}">{instructor}</span>'
+            f'<span class="{_css_class(gym["availability_selector"])}">{start}</span>'
+            f'<p class="availability">{availability}</p>'
+            f'<a class="book" href="/book/{rng.randrange(10**6)}">Book now</a></div>')
+
+
+# Function to build a schedule page for a gym config entry
+def gym_page(gym, rows=150, seed=0, chrome=True):
+    rng = random.Random(f"{gym['name']}-{seed}")
+    parts = ["<!DOCTYPE html><html><head><title>", gym['name'], " Classes</title>"]
+    if chrome:
+        parts.append("<script>" + "var tracking = {};" * 400 + "</script>")
+        parts.append("<style>" + ".c{color:red}" * 300 + "</style>")
+    parts.append("</head><body>")
+    if chrome:
+        parts.append('<header><nav><ul>')
+        parts.extend(f'<li><a href="/page/{i}">Menu item {i}</a></li>' for i in range(120))
+        parts.append('</ul></nav><div class="promo"><p>Plenty of space in our new studio!</p></div></header>')
+    parts.append('<main><section id="schedule">')
+    if gym['class_selector'] == 'tr':
+        parts.append('<table class="schedule"><tr><th>Class</th><th>Instructor</th><th>Time</th><th>Availability</th></tr>')
+        parts.extend(_row(gym, rng) for _ in range(rows))
+        parts.append('</table>')
+    else:
+        parts.extend(_row(gym, rng) for _ in range(rows))
+    parts.append('</section></main>')
+    if chrome:
+        parts.append('<footer>')
+        parts.extend(f'<div class="footer-col"><p>Location {i}: open 24 hours, spots for parking</p></div>'
+                     for i in range(80))
+        parts.append('</footer>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+# Function to read the saved fixture of a gym (generating it if it is missing)
+def load_fixture(gym):
+    path = fixture_path(gym['name'])
+    if not os.path.exists(path):
+        write_fixture(gym)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def write_fixture(gym):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with open(fixture_path(gym['name']), 'w', encoding='utf-8') as f:
+        f.write(gym_page(gym))
+
+
+if __name__ == '__main__':
+    for gym in DEFAULT_GYMS:
+        write_fixture(gym)
+        print(fixture_path(gym['name']))
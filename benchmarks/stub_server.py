@@ -0,0 +1,217 @@
+# Local stand-in for gym websites used by the benchmarks.
+# Each StubGymServer listens on its own port, so every server counts as a separate host
+# for the scraper's per-host politeness delay.
+#
+# MockGymServer serves a schedule page for every pre-configured gym at /<gym slug>: the
+# recorded fixture (benchmarks/fixtures/*.html) or a synthetic page of a given size, with
+# injected latency and errors, and optionally with ETag/Last-Modified validators that answer
+# conditional requests with 304 Not Modified. It can also be run on its own and pointed at from the app:
+#
+#   python benchmarks/stub_server.py --port 8800 --latency 0.2 --error-rate 0.1
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import gym_page, load_fixture, slug  # noqa: E402
+from storage import DEFAULT_GYMS  # noqa: E402
+
+
+# Function to build a schedule page the default table-row selectors understand
+def schedule_page(rows=20):
+    body = ["<html><body><table>", "<tr><th>Class</th><th>Instructor</th><th>Time</th><th>Availability</th></tr>"]
+    for i in range(rows):
+        body.append(
+            f"<tr><td>Class {i}</td><td>Instructor {i % 7}</td>"
+            f"<td>{6 + i % 12}:00 AM</td><td><span>{i % 15} spots available</span></td></tr>"
+        )
+    body.append("</table></body></html>")
+    return "".join(body).encode('utf-8')
+
+
+class StubGymServer:
+    def __init__(self, latency=0.2, rows=20):
+        page = schedule_page(rows)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/schedule"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Function to describe a stub server as a gym config entry
+def stub_gym(name, url):
+    return {
+        "name": name,
+        "url": url,
+        "class_selector": "tr",
+        "instructor_selector": "td:nth-child(1)",
+        "time_selector": "td:nth-child(2)",
+        "availability_selector": "td:nth-child(3)"
+    }
+
+
+class MockGymServer:
+    # latency: seconds before every response, plus up to `jitter` more
+    # rows: None serves the recorded fixture, a number a synthetic page with that many classes
+    #       (a ?rows=N query parameter overrides it per request)
+    # error_rate: share of requests answered with one of `error_statuses` instead of the page
+    # validators: 'etag' and/or 'last-modified' to send and honour in conditional requests;
+    #       a page changes (new ETag, later Last-Modified) when `rows` is changed
+    def __init__(self, gyms=DEFAULT_GYMS, latency=0.0, jitter=0.0, rows=None, error_rate=0.0,
+                 error_statuses=(503,), seed=0, port=0, host='127.0.0.1', validators=()):
+        self.gyms = {slug(gym['name']): gym for gym in gyms}
+        self.rows = rows
+        self.validators = set(validators)
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        rng = random.Random(seed)
+        lock = threading.Lock()
+        pages = {}
+        server = self
+
+        # (body, ETag, Last-Modified in epoch seconds) of a page
+        def page(gym_slug, rows):
+            key = (gym_slug, rows)
+            with lock:
+                if key not in pages:
+                    gym = server.gyms[gym_slug]
+                    html = (load_fixture(gym) if rows is None else gym_page(gym, rows=rows)).encode('utf-8')
+                    # Every new page is at least a second newer than the ones before it
+                    modified = max([int(time.time())] + [page[2] + 1 for page in pages.values()])
+                    pages[key] = (html, f'"{hashlib.sha1(html).hexdigest()[:16]}"', modified)
+                return pages[key]
+
+        def not_modified(headers, etag, modified):
+            if 'etag' in server.validators and headers.get('If-None-Match'):
+                return etag in [tag.strip() for tag in headers['If-None-Match'].split(',')]
+            if 'last-modified' in server.validators and headers.get('If-Modified-Since'):
+                try:
+                    return parsedate_to_datetime(headers['If-Modified-Since']).timestamp() >= modified
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                gym_slug = url.path.strip('/')
+                rows = parse_qs(url.query).get('rows')
+                with lock:
+                    server.requests += 1
+                    delay = latency + (rng.uniform(0, jitter) if jitter else 0)
+                    status = rng.choice(error_statuses) if error_rate and rng.random() < error_rate else None
+                    if status:
+                        server.errors += 1
+                time.sleep(delay)
+                if gym_slug not in server.gyms:
+                    self.send_error(404)
+                    return
+                if status:
+                    self.send_response(status)
+                    if status in (429, 503):
+                        self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body, etag, modified = page(gym_slug, int(rows[0]) if rows else server.rows)
+                if not_modified(self.headers, etag, modified):
+                    with lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if 'etag' in server.validators:
+                    self.send_header('ETag', etag)
+                if 'last-modified' in server.validators:
+                    self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, gym_name):
+        host, port = self.httpd.server_address[:2]
+        host = 'localhost' if host == '0.0.0.0' else host
+        return f"http://{host}:{port}/{slug(gym_name)}"
+
+    # Function to get the served gyms as config entries pointing at this server
+    def gym_entries(self):
+        return [dict(gym, url=self.url(gym['name'])) for gym in self.gyms.values()]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock schedule pages for the pre-configured gyms.")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds")
+    parser.add_argument('--rows', type=int, help="serve synthetic pages of this many classes instead of the fixtures")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument('--error-status', type=int, nargs='+', default=[503])
+    parser.add_argument('--validators', nargs='+', choices=['etag', 'last-modified'], default=[],
+                        help="send these validators and answer conditional requests with 304")
+    args = parser.parse_args()
+
+    server = MockGymServer(latency=args.latency, jitter=args.jitter, rows=args.rows, error_rate=args.error_rate,
+                           error_statuses=tuple(args.error_status), port=args.port, host='',
+                           validators=args.validators)
+    for gym in server.gym_entries():
+        print(f"{gym['name']:<18} {gym['url']}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
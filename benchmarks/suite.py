@@ -0,0 +1,345 @@
+# Benchmark suite for regression tracking, in the spirit of pytest-benchmark: every benchmark
+# runs a few warmup and measured rounds, reports min/median/mean/stddev, and the whole run is
+# saved as JSON so a later run can be compared against it.
+#
+#   python benchmarks/suite.py                                   # every suite, results printed
+#   python benchmarks/suite.py --save baseline                   # also write results/<...>_baseline.json
+#   python benchmarks/suite.py --compare benchmarks/results/X.json --fail-threshold 0.2
+#   python benchmarks/suite.py --suite parse storage --history-sizes 1000 20000
+#   python benchmarks/suite.py --suite scrape --latency 0.2 --error-rate 0.1
+#
+# Suites:
+#   scrape   end-to-end scrape_gyms over every pre-configured gym, each served by its own
+#            MockGymServer (a separate host), with injected latency and errors
+#   parse    parse_schedule on every gym's recorded fixture page
+#   storage  append_schedule, last_schedule and load_history against histories of each size
+#   history  what the Historical Data tab computes before drawing (rollups, hourly rates,
+#            change events and the first raw page) for the same histories
+# Nothing here touches the network, the app's database or its metrics log.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd  # noqa: E402
+
+import history  # noqa: E402
+import metrics  # noqa: E402
+import parse_pool  # noqa: E402
+import parsing  # noqa: E402
+import scraper  # noqa: E402
+from fixtures import CLASS_NAMES, INSTRUCTORS, load_fixture  # noqa: E402
+from rate_limit import RateLimiter  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from storage import DEFAULT_GYMS, GymStore  # noqa: E402
+from stub_server import MockGymServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+SUITES = ('scrape', 'parse', 'storage', 'history')
+CLASSES_PER_SCRAPE = 25
+SCRAPE_INTERVAL = timedelta(minutes=30)
+
+
+# One benchmark: a callable measured over several rounds. `extra` is filled in by the
+# benchmark itself (rows found, errors seen...) and saved along with the timings.
+class Benchmark:
+    def __init__(self, group, name, func, params=None):
+        self.group = group
+        self.name = name
+        self.func = func
+        self.params = params or {}
+        self.extra = {}
+
+    @property
+    def fullname(self):
+        params = ','.join(f"{key}={value}" for key, value in self.params.items())
+        return f"{self.group}::{self.name}" + (f"[{params}]" if params else "")
+
+    def run(self, rounds, warmup, max_time):
+        for _ in range(warmup):
+            self.func(self)
+        times = []
+        began = time.perf_counter()
+        while len(times) < rounds and (len(times) < 3 or time.perf_counter() - began < max_time):
+            start = time.perf_counter()
+            self.func(self)
+            times.append(time.perf_counter() - start)
+        return times
+
+
+def stats(times):
+    ordered = sorted(times)
+    quartiles = statistics.quantiles(ordered, n=4) if len(ordered) > 1 else [ordered[0]] * 3
+    mean = statistics.fmean(ordered)
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': mean,
+        'stddev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'median': statistics.median(ordered),
+        'iqr': quartiles[2] - quartiles[0],
+        'rounds': len(ordered),
+        'ops': 1 / mean if mean else 0.0,
+        'data': ordered,
+    }
+
+
+def machine_info():
+    return {
+        'node': platform.node(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'release': platform.release(),
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def commit_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {'id': git('rev-parse', 'HEAD'), 'branch': git('rev-parse', '--abbrev-ref', 'HEAD'),
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+# --- scrape -------------------------------------------------------------------------------
+
+def scrape_benchmarks(stack, args):
+    # A TTL of 0 means every scrape really fetches and parses the page
+    cache_dir = stack.enter_context(tempfile.TemporaryDirectory())
+    cache = ResponseCache(os.path.join(cache_dir, 'cache.sqlite'), ttl=0)
+    servers = [stack.enter_context(MockGymServer([gym], latency=args.latency, jitter=args.jitter, rows=args.rows,
+                                                 error_rate=args.error_rate, seed=i))
+               for i, gym in enumerate(DEFAULT_GYMS)]
+    gyms = [entry for server in servers for entry in server.gym_entries()]
+    throttle = RateLimiter(None, robots=False)  # local servers: no politeness limit
+
+    # Keep learned extraction plans in the gym entries, as the store would
+    def save_plan(name, plan):
+        for gym in gyms:
+            if gym['name'] == name:
+                gym['extraction_plan'] = plan
+    params = {'gyms': len(gyms), 'latency': args.latency, 'error_rate': args.error_rate,
+              'rows': args.rows or 'fixture', 'parse_workers': args.parse_workers}
+
+    # Rows found, scrapes that ended in an error, and what the servers saw, in the last round
+    def batch(bench):
+        rows = errors = 0
+        requests_before = sum(server.requests for server in servers)
+        injected_before = sum(server.errors for server in servers)
+        for _, classes, messages in scraper.scrape_gyms(gyms, max_workers=args.workers, throttle=throttle,
+                                                        cache=cache, save_plan=save_plan):
+            rows += len(classes)
+            errors += any(level == 'error' for level, _ in messages)
+        bench.extra.update(rows=rows, failed_scrapes=errors,
+                           requests=sum(server.requests for server in servers) - requests_before,
+                           injected_errors=sum(server.errors for server in servers) - injected_before)
+
+    def serial(bench):
+        bench.extra['rows'] = sum(len(scraper.scrape_gym(gym, throttle=throttle, cache=cache, save_plan=save_plan)[0])
+                                  for gym in gyms)
+
+    return [Benchmark('scrape', 'scrape_gyms', batch, dict(params, workers=args.workers)),
+            Benchmark('scrape', 'serial', serial, params)]
+
+
+# --- parse --------------------------------------------------------------------------------
+
+def parse_benchmarks(stack, args):
+    benchmarks = []
+    for gym in DEFAULT_GYMS:
+        html = load_fixture(gym)
+        selectors = (gym['class_selector'], gym['instructor_selector'], gym['time_selector'],
+                     gym['availability_selector'])
+
+        def parse(bench, html=html, selectors=selectors):
+            classes, strategy = parsing.parse_schedule(html, *selectors, backend=args.parser)
+            bench.extra.update(rows=len(classes), strategy=strategy, kb=round(len(html) / 1024, 1))
+
+        # Later scrapes run only the strategy learned on the first one
+        classes, strategy = parsing.parse_schedule(html, *selectors, backend=args.parser)
+        plan = {'strategy': strategy, 'rows': parsing.valid_rows(classes)}
+
+        def parse_planned(bench, html=html, selectors=selectors, plan=plan):
+            classes, strategy = parsing.parse_schedule(html, *selectors, backend=args.parser, plan=plan)
+            bench.extra.update(rows=len(classes), strategy=strategy)
+
+        params = {'gym': gym['name'], 'backend': parsing.get_backend(args.parser).name}
+        benchmarks.append(Benchmark('parse', 'parse_schedule', parse, params))
+        benchmarks.append(Benchmark('parse', 'parse_schedule_planned', parse_planned, params))
+    return benchmarks
+
+
+# --- storage and history ------------------------------------------------------------------
+
+# Function to fill a store with `rows` classes of history for one gym: a fixed timetable
+# scraped every half hour, with a few availabilities changing between scrapes
+def populate(store, gym_name, rows, seed=0):
+    rng = random.Random(seed)
+    timetable = [{'name': rng.choice(CLASS_NAMES), 'instructor': rng.choice(INSTRUCTORS),
+                  'time': f"{rng.randrange(6, 21)}:{rng.choice(['00', '30'])}",
+                  'availability': f"{rng.randrange(1, 25)} spots left"} for _ in range(CLASSES_PER_SCRAPE)]
+    stamp = datetime(2026, 1, 1, 6)
+    for _ in range(max(1, rows // CLASSES_PER_SCRAPE)):
+        for cls in rng.sample(timetable, 3):
+            cls['availability'] = rng.choice(["Full", "Waitlist", f"{rng.randrange(1, 25)} spots left"])
+        store.append_schedule(gym_name, timetable, stamp.strftime('%Y-%m-%d %H:%M:%S'))
+        stamp += SCRAPE_INTERVAL
+    history.compact(gym_name, store.history_dir)
+    return timetable, stamp
+
+
+# What the Historical Data tab derives from the store before drawing anything (see app.py)
+def history_tab_data(store, gym_name, start=None, end=None):
+    classes = store.rollup(gym_name, 'class', start, end, 'day')
+    instructors = store.rollup(gym_name, 'instructor', start, end, 'day')
+    hourly = pd.DataFrame(store.rollup(gym_name, 'class', start, end, 'hour', by_bucket=True))
+    hourly = hourly.groupby('bucket')[['open', 'occurrences']].sum().reset_index()
+    hourly['rate'] = hourly['open'] / hourly['occurrences'] * 100
+    changes = history.load_changes(gym_name, start, end, root=store.history_dir)
+    page, total = history.query_history(gym_name, start, end, limit=50, root=store.history_dir)
+    return classes, instructors, hourly, changes, page, total
+
+
+def store_benchmarks(stack, args, suites):
+    benchmarks = []
+    gym_name = DEFAULT_GYMS[0]['name']
+    for size in args.history_sizes:
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        store = GymStore(os.path.join(directory, 'gym_data.sqlite'), legacy_json=None,
+                         history_dir=os.path.join(directory, 'history'))
+        print(f"  building a {size}-row history...", file=sys.stderr)
+        timetable, next_stamp = populate(store, gym_name, size)
+        params = {'history_rows': size}
+
+        if 'storage' in suites:
+            def save(bench, store=store, timetable=timetable, stamp=[next_stamp]):
+                timetable[0] = dict(timetable[0], availability=f"{stamp[0].minute % 25} spots left")
+                store.append_schedule(gym_name, timetable, stamp[0].strftime('%Y-%m-%d %H:%M:%S'))
+                stamp[0] += SCRAPE_INTERVAL
+
+            def last(bench, store=store):
+                bench.extra['rows'] = len(store.last_schedule(gym_name)['classes'])
+
+            def load(bench, store=store):
+                bench.extra['rows'] = len(history.load_history(gym_name, root=store.history_dir))
+
+            benchmarks += [Benchmark('storage', 'append_schedule', save, params),
+                           Benchmark('storage', 'last_schedule', last, params),
+                           Benchmark('storage', 'load_history', load, params)]
+
+        if 'history' in suites:
+            def prep(bench, store=store):
+                bench.extra['page_total'] = history_tab_data(store, gym_name)[-1]
+
+            benchmarks.append(Benchmark('history', 'tab_data', prep, params))
+    return benchmarks
+
+
+# --- running, saving and comparing --------------------------------------------------------
+
+def compare(results, path, threshold):
+    with open(path) as f:
+        previous = {bench['fullname']: bench['stats']['median'] for bench in json.load(f)['benchmarks']}
+    regressions = []
+    print(f"\nCompared with {path} (median):")
+    for bench in results:
+        before = previous.get(bench['fullname'])
+        if before is None:
+            continue
+        ratio = bench['stats']['median'] / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(bench['fullname'])
+        print(f"  {bench['fullname']:<70} {before * 1000:>10.2f} -> {bench['stats']['median'] * 1000:>10.2f} ms "
+              f"({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python benchmarks/suite.py', description="Run the benchmark suites.")
+    parser.add_argument('--suite', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--max-time', type=float, default=10, help="stop a benchmark after this many seconds "
+                        "(it still gets at least 3 rounds)")
+    parser.add_argument('--latency', type=float, default=0.05, help="mock server response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds of delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of mock requests answered with a 503")
+    parser.add_argument('--rows', type=int, help="synthetic pages of this many classes instead of the fixtures")
+    parser.add_argument('--workers', type=int, default=scraper.DEFAULT_MAX_WORKERS)
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="scrape suite: parse in a pool of this many processes (0: in the scrape threads)")
+    parser.add_argument('--parser', help="parser backend for the parse suite (default: the fastest installed)")
+    parser.add_argument('--history-sizes', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help="history rows for the storage and history suites")
+    parser.add_argument('--save', metavar='NAME', help="write the results to benchmarks/results/")
+    parser.add_argument('--json', metavar='PATH', help="write the results to this file")
+    parser.add_argument('--compare', metavar='PATH', help="compare with earlier results")
+    parser.add_argument('--fail-threshold', type=float, default=0.2,
+                        help="with --compare, exit 1 when a median is this much slower (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # Keep benchmark scrapes out of the app's metrics log
+    metrics.configure_metrics(log_path=None)
+    pool = parse_pool.configure_parse_pool(workers=args.parse_workers)
+    if pool is not None:
+        pool.warm_up()
+
+    results = []
+    with ExitStack() as stack:
+        benchmarks = []
+        if 'scrape' in args.suite:
+            benchmarks += scrape_benchmarks(stack, args)
+        if 'parse' in args.suite:
+            benchmarks += parse_benchmarks(stack, args)
+        if 'storage' in args.suite or 'history' in args.suite:
+            benchmarks += store_benchmarks(stack, args, args.suite)
+
+        print(f"{'benchmark':<70} {'min ms':>10} {'median ms':>10} {'stddev':>8} {'rounds':>6}")
+        for bench in benchmarks:
+            result = stats(bench.run(args.rounds, args.warmup, args.max_time))
+            print(f"{bench.fullname:<70} {result['min'] * 1000:>10.2f} {result['median'] * 1000:>10.2f} "
+                  f"{result['stddev'] * 1000:>8.2f} {result['rounds']:>6}  "
+                  + ' '.join(f"{key}={value}" for key, value in bench.extra.items()))
+            results.append({'group': bench.group, 'name': bench.name, 'fullname': bench.fullname,
+                            'params': bench.params, 'stats': result, 'extra_info': dict(bench.extra)})
+
+    output = {'machine_info': machine_info(), 'commit_info': commit_info(),
+              'datetime': datetime.now().isoformat(timespec='seconds'), 'version': 1,
+              'options': {key: value for key, value in vars(args).items() if key not in ('save', 'json', 'compare')},
+              'benchmarks': results}
+    paths = [args.json] if args.json else []
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (output['commit_info']['id'] or 'nogit')[:8]
+        paths.append(os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}_{args.save}.json"))
+    for path in paths:
+        with open(path, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved {path}")
+
+    if args.compare and compare(results, args.compare, args.fail_threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Change detection between consecutive scrapes of a gym.
+# A class is identified by a hash of its name, instructor and time (plus a counter for the
+# rare page that lists the same class twice); the only thing that can change about it is its
+# availability. Instead of a full copy of every scrape, the store keeps the events that turn
+# one scrape into the next:
+#
+#   added      a class that was not in the previous scrape
+#   removed    a class of the previous scrape that is gone (fields hold its last values)
+#   changed    a class whose availability changed (previous_availability holds the old value)
+#   unchanged  a single marker for a scrape identical to the previous one
+#   snapshot   the full class list, kept for a gym's first scrape of each day so any day can
+#              be rebuilt without reading the days before it
+import hashlib
+
+SNAPSHOT = 'snapshot'
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+DELTA = 'delta'
+CHANGE_KINDS = (ADDED, REMOVED, CHANGED)
+
+FIELDS = ('name', 'instructor', 'time', 'availability')
+
+
+# Function to get the key of a class: a short hash of name, instructor and time
+def class_key(name, instructor, time, occurrence=0):
+    text = f"{name}\x1f{instructor}\x1f{time}\x1f{occurrence}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+# Function to turn a class list into {class key: class}, keeping page order
+def keyed(classes):
+    seen = {}
+    result = {}
+    for cls in classes:
+        identity = (cls.get('name'), cls.get('instructor'), cls.get('time'))
+        occurrence = seen.get(identity, 0)
+        seen[identity] = occurrence + 1
+        result[class_key(*identity, occurrence)] = {field: cls.get(field) for field in FIELDS}
+    return result
+
+
+def _event(change, key, cls, previous_availability=None):
+    return dict(cls, change=change, class_key=key, previous_availability=previous_availability)
+
+
+# Function to get the events that turn the keyed classes `previous` into `current`
+def diff(previous, current):
+    events = []
+    for key, cls in current.items():
+        old = previous.get(key)
+        if old is None:
+            events.append(_event(ADDED, key, cls))
+        elif old['availability'] != cls['availability']:
+            events.append(_event(CHANGED, key, cls, old['availability']))
+    for key, cls in previous.items():
+        if key not in current:
+            events.append(_event(REMOVED, key, cls))
+    return events
+
+
+# Function to decide how to store a scrape of a gym, given the gym's previous scrape (its keyed
+# classes and timestamp, or {} and None). Returns (kind, keyed classes, change events) where
+# kind is SNAPSHOT, DELTA or UNCHANGED.
+def compare(previous, previous_timestamp, classes, timestamp):
+    current = keyed(classes)
+    events = diff(previous, current) if previous_timestamp else []
+    if previous_timestamp is None or previous_timestamp[:10] != timestamp[:10]:
+        return SNAPSHOT, current, events
+    return (DELTA if events else UNCHANGED), current, events
+
+
+# Function to get the rows a scrape adds to the columnar history: the full class list for a
+# snapshot (followed by its changes), only the changes for a delta, one marker otherwise
+def history_events(kind, current, events):
+    if kind == SNAPSHOT:
+        return [dict(cls, change=SNAPSHOT, class_key=key) for key, cls in current.items()] + events
+    if kind == UNCHANGED:
+        return [{'change': UNCHANGED}]
+    return events
+
+
+# Function to apply one scrape's events to keyed classes, in place.
+# A changed class keeps its place; added classes go to the end.
+def apply(state, events):
+    snapshot = [event for event in events if event['change'] == SNAPSHOT]
+    if snapshot:
+        state.clear()
+        state.update((event['class_key'], {field: event[field] for field in FIELDS}) for event in snapshot)
+        return state
+    for event in events:
+        if event['change'] in (ADDED, CHANGED):
+            state[event['class_key']] = {field: event[field] for field in FIELDS}
+        elif event['change'] == REMOVED:
+            state.pop(event['class_key'], None)
+    return state
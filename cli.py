@@ -0,0 +1,304 @@
+# Command-line entry point for running the tracker without the Streamlit UI.
+# Uses the same store (GYM_DB, GYM_HISTORY_DIR) and scrape code as the app and the worker.
+#
+#   python -m cli import-gyms gyms.csv          # add or update gyms from CSV or JSON ('-': stdin)
+#   python -m cli list-gyms
+#   python -m cli scrape --concurrency 16       # scrape every gym (or --gym NAME ...) once
+#   python -m cli export history.parquet --start 2026-01-01 --end 2026-01-31
+#   python -m cli app                           # start the Streamlit app
+#
+# Modules are imported by the commands that need them, so `--help` and small commands start
+# fast; streamlit, plotly and matplotlib are only ever loaded by `app`, in its own process.
+# Exports are written scrape by scrape, without loading a gym's whole history into memory.
+import argparse
+import csv
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from urllib.parse import urlparse
+
+EXPORT_FIELDS = ('gym_name', 'timestamp', 'name', 'instructor', 'time', 'availability')
+EXPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet', '.pq': 'parquet'}
+PARQUET_BATCH_ROWS = 50_000     # rows per Parquet row group
+TRUE_WORDS = ('1', 'true', 'yes', 'y', 'on')
+
+
+# Function to read gym entries from a CSV file (one gym per row, a header naming the fields)
+# or a JSON file (a list of gyms, or an object with a "gyms" list like the old gym_data.json).
+# Returns (line or index, entry) pairs.
+def read_gym_file(path, file_format=None):
+    file_format = file_format or ('json' if path.lower().endswith('.json') else 'csv')
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if file_format == 'json':
+            data = json.load(stream)
+            entries = data.get('gyms', []) if isinstance(data, dict) else data
+            return list(enumerate(entries, start=1))
+        reader = csv.DictReader(stream)
+        return [(reader.line_num, row) for row in reader]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _json_or_number(value):
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    return json.loads(value) if value.startswith(('{', '[')) else float(value)
+
+
+# Function to turn one imported entry into a gym config like the Add Gym form saves.
+# CSV cells are strings: 'scrape_interval' is in seconds, 'streaming' a yes/no word,
+# 'rate_limit' a number or a JSON object. Raises ValueError for an unusable entry.
+def gym_entry(entry):
+    from storage import DEFAULT_SELECTORS
+
+    if not isinstance(entry, dict):
+        raise ValueError("not a gym entry")
+    gym = {key.strip(): value.strip() if isinstance(value, str) else value
+           for key, value in entry.items() if key and value not in (None, '')}
+    if not gym.get('name'):
+        raise ValueError("missing name")
+    url = urlparse(gym.get('url', ''))
+    if not all([url.scheme, url.netloc]):
+        raise ValueError(f"invalid URL {gym.get('url', '')!r} (include http:// or https://)")
+    for key, selector in DEFAULT_SELECTORS.items():
+        gym.setdefault(key, selector)
+    if 'scrape_interval' in gym:
+        gym['scrape_interval'] = int(float(gym['scrape_interval']))
+    if isinstance(gym.get('streaming'), str):
+        gym['streaming'] = gym['streaming'].lower() in TRUE_WORDS
+    if not gym.get('streaming', True):
+        del gym['streaming']
+    for key in ('rate_limit', 'extraction_plan'):
+        if key in gym:
+            gym[key] = _json_or_number(gym[key])
+    return gym
+
+
+def import_gyms(args):
+    from storage import get_store
+
+    gyms, errors = {}, 0
+    for line, entry in read_gym_file(args.file, args.format):
+        try:
+            gym = gym_entry(entry)
+        except (ValueError, TypeError) as e:
+            print(f"{args.file}:{line}: skipped: {e}", file=sys.stderr)
+            errors += 1
+            continue
+        gyms[gym['name']] = gym  # the last entry for a name wins
+    if args.dry_run:
+        print(f"{len(gyms)} gyms would be imported, {errors} skipped")
+    else:
+        added = get_store().save_gyms(gyms.values())
+        print(f"{added} gyms added, {len(gyms) - added} updated, {errors} skipped")
+    return 1 if errors and not gyms else 0
+
+
+def list_gyms(args):
+    from storage import get_store
+
+    store = get_store()
+    last_scrapes = store.last_scrape_times()
+    for gym in store.list_gyms():
+        if args.json:
+            print(json.dumps(gym))
+        else:
+            print(f"{gym['name']}\t{gym['url']}\t{last_scrapes.get(gym['name']) or 'never scraped'}")
+    return 0
+
+
+def _selected_gyms(store, names):
+    gyms = store.list_gyms()
+    if not names:
+        return gyms
+    unknown = set(names) - {gym['name'] for gym in gyms}
+    if unknown:
+        raise SystemExit(f"Unknown gym(s): {', '.join(sorted(unknown))}")
+    return [gym for gym in gyms if gym['name'] in names]
+
+
+def scrape(args):
+    import parse_pool
+    from storage import get_store
+
+    store = get_store()
+    gyms = _selected_gyms(store, args.gym)
+    if args.parse_workers is not None:
+        parse_pool.configure_parse_pool(workers=args.parse_workers)
+    configure_http(args)
+    if not args.dry_run:
+        return _scrape(store, gyms, args, save_plan=store.save_plan)
+    # A dry run leaves the gyms' extraction plans and the page cache as they were
+    from response_cache import ResponseCache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        return _scrape(None, gyms, args, cache=ResponseCache(os.path.join(cache_dir, 'http_cache.sqlite')))
+
+
+# Function to apply the --http-* options over the GYM_HTTP_* environment (see http_client.py)
+def configure_http(args):
+    settings = {key: value for key, value in (('timeout', args.http_timeout), ('max_retries', args.http_retries),
+                                              ('per_host_limit', args.http_per_host_limit),
+                                              ('pool_maxsize', args.http_pool_maxsize)) if value is not None}
+    if settings:
+        import http_client
+        http_client.configure_client(**settings)
+
+
+# Function to add the --http-* options to an argument parser (also used by worker.py)
+def add_http_arguments(command):
+    command.add_argument('--http-timeout', type=float, help="request timeout in seconds (default: GYM_HTTP_TIMEOUT or 10)")
+    command.add_argument('--http-retries', type=int,
+                         help="retries of a failed request (default: GYM_HTTP_MAX_RETRIES or 3)")
+    command.add_argument('--http-per-host-limit', type=int,
+                         help="requests in flight per website (default: GYM_HTTP_PER_HOST_LIMIT or 2)")
+    command.add_argument('--http-pool-maxsize', type=int,
+                         help="open connections kept per website (default: GYM_HTTP_POOL_MAXSIZE or 4)")
+
+
+# Function to scrape gyms and print each result; with `store`, the classes found are saved in it
+def _scrape(store, gyms, args, cache=None, save_plan=None):
+    import scraper
+
+    failed = 0
+    results = scraper.scrape_gyms(gyms, max_workers=args.concurrency or scraper.DEFAULT_MAX_WORKERS, cache=cache,
+                                  save_plan=save_plan)
+    for done, (gym, classes, messages) in enumerate(results, start=1):
+        if classes and store is not None:
+            store.append_schedule(gym['name'], classes)
+        failed += not classes
+        notes = "; ".join(message for _, message in messages)
+        print(f"[{done}/{len(gyms)}] {gym['name']}: {len(classes)} classes" + (f" ({notes})" if notes else ""),
+              flush=True)
+    return 1 if failed else 0
+
+
+# Function to yield the export rows of some gyms' history, one scrape at a time
+def history_rows(store, gym_names, start=None, end=None):
+    for gym_name in gym_names:
+        for schedule in store.snapshots(gym_name, start, end):
+            for cls in schedule['classes']:
+                yield gym_name, schedule['timestamp'], cls.name, cls.instructor, cls.time, cls.availability
+
+
+def _write_csv(rows, stream):
+    writer = csv.writer(stream)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+    return count
+
+
+def _write_jsonl(rows, stream):
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        stream.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n')
+    return count
+
+
+def _write_parquet(rows, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, pa.string()) for field in EXPORT_FIELDS])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = [[] for _ in EXPORT_FIELDS]
+
+        def flush():
+            writer.write_batch(pa.record_batch([pa.array(column, pa.string()) for column in batch], schema=schema))
+            for column in batch:
+                column.clear()
+
+        for count, row in enumerate(rows, start=1):
+            for column, value in zip(batch, row):
+                column.append(value)
+            if count % PARQUET_BATCH_ROWS == 0:
+                flush()
+        if batch[0] or count == 0:
+            flush()
+    return count
+
+
+def export(args):
+    from storage import get_store
+
+    file_format = args.format or EXPORT_FORMATS.get(os.path.splitext(args.output)[1].lower())
+    if file_format is None:
+        raise SystemExit(f"Cannot tell the export format of {args.output!r}; use --format")
+    if file_format == 'parquet' and args.output == '-':
+        raise SystemExit("Parquet exports need a file name")
+    store = get_store()
+    names = [gym['name'] for gym in _selected_gyms(store, args.gym)] if args.gym else store.gyms_with_history()
+    # A bare end date includes that whole day
+    end = f"{args.end} 23:59:59" if args.end and len(args.end) == 10 else args.end
+    rows = history_rows(store, names, args.start, end)
+
+    if file_format == 'parquet':
+        count = _write_parquet(rows, args.output)
+    else:
+        write = _write_csv if file_format == 'csv' else _write_jsonl
+        if args.output == '-':
+            count = write(rows, sys.stdout)
+        else:
+            with open(args.output, 'w', newline='', encoding='utf-8') as stream:
+                count = write(rows, stream)
+    print(f"{count} rows from {len(names)} gyms exported", file=sys.stderr)
+    return 0
+
+
+def app(args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    return subprocess.call([sys.executable, '-m', 'streamlit', 'run', script] + args.streamlit_args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Manage gyms, scrape and export history.")
+    parser.add_argument('--log-level', default='WARNING')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import-gyms', help="add or update gyms from a CSV or JSON file")
+    command.add_argument('file', help="CSV or JSON file, '-' for stdin")
+    command.add_argument('--format', choices=['csv', 'json'], help="default: from the file extension")
+    command.add_argument('--dry-run', action='store_true', help="check the file without saving anything")
+    command.set_defaults(run=import_gyms)
+
+    command = commands.add_parser('list-gyms', help="list the configured gyms")
+    command.add_argument('--json', action='store_true', help="print every gym entry as a JSON line")
+    command.set_defaults(run=list_gyms)
+
+    command = commands.add_parser('scrape', help="scrape gyms once and store the results")
+    command.add_argument('--gym', action='append', help="only this gym (repeatable; default: every gym)")
+    command.add_argument('--concurrency', type=int, help="gyms scraped at the same time")
+    command.add_argument('--parse-workers', type=int,
+                         help="parse pages in this many worker processes (default: GYM_PARSE_WORKERS)")
+    add_http_arguments(command)
+    command.add_argument('--dry-run', action='store_true',
+                         help="scrape without storing the results, learned extraction plans or fetched pages")
+    command.set_defaults(run=scrape)
+
+    command = commands.add_parser('export', help="export the class history to CSV, Parquet or JSON lines")
+    command.add_argument('output', help="output file ('-' for stdout, CSV and JSON lines only)")
+    command.add_argument('--format', choices=['csv', 'parquet', 'jsonl'], help="default: from the file extension")
+    command.add_argument('--gym', action='append', help="only this gym (repeatable; default: every gym)")
+    command.add_argument('--start', help="first scrape time to export, 'YYYY-MM-DD[ HH:MM:SS]'")
+    command.add_argument('--end', help="last scrape time to export, 'YYYY-MM-DD[ HH:MM:SS]'")
+    command.set_defaults(run=export)
+
+    command = commands.add_parser('app', help="start the Streamlit app")
+    command.add_argument('streamlit_args', nargs=argparse.REMAINDER, help="passed on to streamlit run")
+    command.set_defaults(run=app)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,324 @@
+# Columnar copy of the scrape history for the Historical Data tab.
+# Change events (see changes.py) are written as Parquet files partitioned by gym and scrape date:
+#
+#   history/gym=<gym name, URL-quoted>/date=YYYY-MM-DD/part-<...>.parquet
+#
+# Loading one gym and a date range only lists that gym's directory, only opens the
+# matching date partitions, only reads the requested columns, and memory-maps the files.
+# Every date partition starts with a full snapshot, so the classes of each scrape in a date
+# range can be rebuilt from that range's partitions alone.
+#
+# Every scrape adds a small file to its partition; once a partition holds COMPACT_FILES files
+# they are merged into one (see compact). The merged file is in place before the originals are
+# removed, so a reader may briefly see a scrape in two files; readers only ever take a scrape's
+# rows from one file, and list the files again if one disappears while they open them.
+import os
+import shutil
+import threading
+import uuid
+from datetime import date, datetime
+from urllib.parse import quote, unquote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+
+import availability
+import changes
+
+DEFAULT_HISTORY_DIR = 'history'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Bumped whenever the layout changes; the store rewrites older history on startup
+FORMAT_VERSION = 3
+
+SCHEMA = pa.schema([
+    ('schedule_id', pa.int64()),
+    ('schedule_timestamp', pa.timestamp('s')),
+    ('change', pa.string()),
+    ('class_key', pa.string()),
+    ('name', pa.string()),
+    ('instructor', pa.string()),
+    ('time', pa.string()),
+    ('availability', pa.string()),
+    ('previous_availability', pa.string()),
+    ('spots', pa.int32()),
+    ('status', pa.string()),
+])
+EVENT_FIELDS = ('change', 'class_key', 'name', 'instructor', 'time', 'availability', 'previous_availability')
+
+# Columns of a rebuilt history: one row per class per scrape
+COLUMNS = ['schedule_timestamp', 'name', 'instructor', 'time', 'availability', 'spots', 'status', 'timestamp']
+CHANGE_COLUMNS = ['schedule_timestamp', 'change', 'name', 'instructor', 'time', 'availability', 'status',
+                  'previous_availability']
+
+COMPACT_FILES = 16     # files a date partition may hold before append_schedule merges them
+READ_ATTEMPTS = 3      # times a read is retried when a compaction removed a file under it
+
+_mmap_fs = pyarrow.fs.LocalFileSystem(use_mmap=True)
+_compact_lock = threading.Lock()
+
+
+def _gym_dir(root, gym_name):
+    return os.path.join(root, 'gym=' + quote(gym_name, safe=''))
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+# Function to build an Arrow table from change events (dicts with EVENT_FIELDS), each
+# belonging to the scrape at the same position of `schedule_ids` and `schedule_timestamps`.
+# Timestamps and availability (spots and status, see availability.py) are parsed in one
+# vectorized pass, so readers never parse them again.
+def events_table(events, schedule_ids, schedule_timestamps):
+    columns = {
+        'schedule_id': pa.array(schedule_ids, pa.int64()),
+        'schedule_timestamp': pc.strptime(pa.array(schedule_timestamps, pa.string()), TIMESTAMP_FORMAT, 's'),
+    }
+    for field in EVENT_FIELDS:
+        columns[field] = pa.array([event.get(field) for event in events], pa.string())
+    parsed = availability.parse_availability(columns['availability'].to_pandas())
+    columns['spots'] = pa.array(parsed['spots'], pa.int32())
+    columns['status'] = pa.array(parsed['status'].astype(str), pa.string())
+    return pa.table(columns, schema=SCHEMA)
+
+
+# Function to write rows of one gym, split into their date partitions
+def write_table(table, gym_name, root=DEFAULT_HISTORY_DIR):
+    if table.num_rows == 0:
+        return
+    dates = pc.strftime(table['schedule_timestamp'], '%Y-%m-%d')
+    for day in pc.unique(dates).to_pylist():
+        part = table.filter(pc.equal(dates, day))
+        directory = os.path.join(_gym_dir(root, gym_name), f'date={day}')
+        os.makedirs(directory, exist_ok=True)
+        # Write under a temporary name first so readers never see half a file
+        final = os.path.join(directory, f'part-{uuid.uuid4().hex}.parquet')
+        pq.write_table(part, final + '.tmp')
+        os.replace(final + '.tmp', final)
+
+
+# Function to append the events of one scrape of a gym
+def append_events(gym_name, schedule_id, schedule_timestamp, events, root=DEFAULT_HISTORY_DIR):
+    write_table(events_table(events, [schedule_id] * len(events), [schedule_timestamp] * len(events)),
+                gym_name, root)
+
+
+# Dates (oldest first) for which a gym has history
+def available_dates(gym_name, root=DEFAULT_HISTORY_DIR):
+    gym_dir = _gym_dir(root, gym_name)
+    if not os.path.isdir(gym_dir):
+        return []
+    return sorted(_as_date(entry[len('date='):]) for entry in os.listdir(gym_dir) if entry.startswith('date='))
+
+
+# Names of gyms that have history
+def gym_names(root=DEFAULT_HISTORY_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(unquote(entry[len('gym='):]) for entry in os.listdir(root) if entry.startswith('gym='))
+
+
+def _with_availability_dtypes(frame):
+    if 'spots' in frame:
+        frame['spots'] = frame['spots'].astype('Int32')
+    if 'status' in frame:
+        frame['status'] = frame['status'].astype(availability.STATUS_DTYPE)
+    return frame
+
+
+def _partition_files(directory):
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.parquet')]
+
+
+# Reads the events in `files`, oldest scrape first. A scrape found in more than one file (a
+# compaction that has not removed the originals yet) is only taken from the first of them.
+def _read_files(files, columns):
+    dataset = ds.dataset(files, schema=SCHEMA, format='parquet', filesystem=_mmap_fs)
+    table = dataset.to_table(columns=list(dict.fromkeys(['schedule_timestamp', 'schedule_id'] + columns)) +
+                             ['__filename'])
+    sources = table.group_by(['schedule_id', '__filename']).aggregate([])
+    if sources.num_rows > len(pc.unique(sources['schedule_id'])):
+        first = {}
+        for schedule_id, filename in zip(sources['schedule_id'].to_pylist(), sources['__filename'].to_pylist()):
+            first[schedule_id] = min(filename, first.get(schedule_id, filename))
+        table = table.filter(pa.array([first[schedule_id] == filename for schedule_id, filename in
+                                       zip(table['schedule_id'].to_pylist(), table['__filename'].to_pylist())]))
+    # Arrow's sort is stable, so the events of one scrape keep their order
+    return table.sort_by([('schedule_timestamp', 'ascending'), ('schedule_id', 'ascending')]).select(columns)
+
+
+def _read_events(gym_name, start, end, columns, root):
+    start, end = _as_date(start), _as_date(end)
+    for attempt in range(READ_ATTEMPTS):
+        files = []
+        for day in available_dates(gym_name, root):
+            if (start and day < start) or (end and day > end):
+                continue
+            files.extend(_partition_files(os.path.join(_gym_dir(root, gym_name), f'date={day.isoformat()}')))
+        if not files:
+            return SCHEMA.empty_table().select(columns)
+        try:
+            return _read_files(files, columns)
+        except FileNotFoundError:
+            # A compaction replaced some of the files after they were listed
+            if attempt == READ_ATTEMPTS - 1:
+                raise
+
+
+# Replays the events of `table` scrape by scrape, yielding (row of the scrape's first event,
+# {class key: row holding the class}) after each scrape. With `matches` (one bool per row),
+# only classes whose current row matches are kept, so a class whose availability changes
+# in or out of a filter enters or leaves the state with it.
+def _replay(table, matches=None):
+    schedule_ids = table['schedule_id'].to_pylist()
+    kinds = table['change'].to_pylist()
+    keys = table['class_key'].to_pylist()
+    state = {}
+    i, count = 0, len(schedule_ids)
+    while i < count:
+        j = i
+        while j < count and schedule_ids[j] == schedule_ids[i]:
+            j += 1
+        if changes.SNAPSHOT in kinds[i:j]:
+            state = {keys[k]: k for k in range(i, j)
+                     if kinds[k] == changes.SNAPSHOT and (matches is None or matches[k])}
+        else:
+            for k in range(i, j):
+                if kinds[k] in (changes.ADDED, changes.CHANGED) and (matches is None or matches[k]):
+                    state[keys[k]] = k
+                elif kinds[k] != changes.UNCHANGED:
+                    state.pop(keys[k], None)
+        yield i, state
+        i = j
+
+
+# Text columns come out dictionary-encoded (pandas categoricals): a long history repeats the
+# same few names, instructors and times millions of times
+def _encoded(table):
+    return pa.table({name: pc.dictionary_encode(column) if column.type == pa.string() else column
+                     for name, column in zip(table.column_names, table.columns)})
+
+
+# Builds the rebuilt rows: class fields from the event `rows`, timestamps from the `scrapes`
+def _materialize(table, rows, scrapes, columns):
+    stamps = table['schedule_timestamp'].take(pa.array(scrapes, pa.int64()))
+    result = {}
+    for column in columns:
+        if column in ('schedule_timestamp', 'timestamp'):
+            # Every class of a scrape was seen at the time of that scrape
+            result[column] = stamps
+        else:
+            result[column] = table[column].take(pa.array(rows, pa.int64()))
+    return _with_availability_dtypes(_encoded(pa.table(result)).to_pandas())
+
+
+# Function to load the classes of one gym between two dates (inclusive) as a DataFrame with one
+# row per class per scrape, rebuilt from the stored snapshots and changes.
+# Only the matching date partitions are opened. The rebuild works on row positions: every
+# scrape emits the positions of the rows holding its classes, and the result is a single take().
+def load_history(gym_name, start=None, end=None, columns=None, root=DEFAULT_HISTORY_DIR):
+    columns = list(columns or COLUMNS)
+    fields = [c for c in ('name', 'instructor', 'time', 'availability', 'spots', 'status') if c in columns]
+    table = _read_events(gym_name, start, end, ['schedule_id', 'schedule_timestamp', 'change', 'class_key'] + fields, root)
+    rows, scrapes = [], []
+    for scrape, state in _replay(table):
+        rows.extend(state.values())
+        scrapes.extend([scrape] * len(state))
+    return _materialize(table, rows, scrapes, columns)
+
+
+def _as_list(value):
+    if value is None or isinstance(value, (list, tuple, set)):
+        return list(value) if value else None
+    return [value]
+
+
+# Function to get one page of a gym's rebuilt history, filtered, oldest scrape first.
+# Returns (page DataFrame with COLUMNS, total number of matching rows).
+#   start, end             dates (whole days, inclusive) or datetimes (exact scrape times)
+#   name, instructor       a value or a list of values
+#   status                 an availability status or a list of them
+# Date partitions outside the range are never opened and the filters are evaluated on the
+# stored events with Arrow compute, so only matching classes are tracked while replaying and
+# only the requested page is materialized. Within one scrape, a class that came back into the
+# filter (e.g. its status changed) is listed after the others.
+def query_history(gym_name, start=None, end=None, name=None, instructor=None, status=None,
+                  offset=0, limit=50, root=DEFAULT_HISTORY_DIR):
+    table = _read_events(gym_name, start, end, SCHEMA.names, root)
+    matches = None
+    for column, values in (('name', _as_list(name)), ('instructor', _as_list(instructor)), ('status', _as_list(status))):
+        if values:
+            condition = pc.is_in(table[column], pa.array([str(v) for v in values], pa.string()))
+            matches = condition if matches is None else pc.and_(matches, condition)
+    if matches is not None:
+        matches = pc.fill_null(matches, False).to_pylist()
+
+    # Exact scrape-time bounds; whole dates are already handled by partition pruning
+    lower = start if isinstance(start, datetime) else None
+    upper = end if isinstance(end, datetime) else None
+    stamps = table['schedule_timestamp'].to_pylist() if lower or upper else None
+
+    total, rows, scrapes = 0, [], []
+    for scrape, state in _replay(table, matches):
+        if stamps and ((lower and stamps[scrape] < lower) or (upper and stamps[scrape] > upper)):
+            continue
+        size = len(state)
+        if total < offset + limit and total + size > offset:
+            first, last = max(0, offset - total), min(size, offset + limit - total)
+            rows.extend(list(state.values())[first:last])
+            scrapes.extend([scrape] * (last - first))
+        total += size
+    return _materialize(table, rows, scrapes, COLUMNS), total
+
+
+# Function to load the change events (added, removed, changed) of one gym between two dates
+# (inclusive) as a DataFrame, oldest first, without rebuilding any snapshots
+def load_changes(gym_name, start=None, end=None, columns=None, root=DEFAULT_HISTORY_DIR):
+    columns = list(columns or CHANGE_COLUMNS)
+    table = _read_events(gym_name, start, end, list(dict.fromkeys(columns + ['change'])), root)
+    table = table.filter(pc.is_in(table['change'], pa.array(changes.CHANGE_KINDS)))
+    return _with_availability_dtypes(_encoded(table.select(columns)).to_pandas())
+
+
+# Function to merge the many small per-scrape files of each date partition into one file.
+# `day` limits it to one date partition, and partitions with fewer than `min_files` files are
+# left alone. The merged file is complete before the originals are removed (see _read_files);
+# returns how many partitions were merged.
+def compact(gym_name=None, root=DEFAULT_HISTORY_DIR, day=None, min_files=2):
+    merged = 0
+    with _compact_lock:
+        for name in ([gym_name] if gym_name else gym_names(root)):
+            for partition in ([_as_date(day)] if day else available_dates(name, root)):
+                directory = os.path.join(_gym_dir(root, name), f'date={partition.isoformat()}')
+                parts = _partition_files(directory) if os.path.isdir(directory) else []
+                if len(parts) < max(min_files, 2):
+                    continue
+                try:
+                    table = _read_files(parts, SCHEMA.names)
+                except FileNotFoundError:
+                    continue  # another process is compacting it
+                final = os.path.join(directory, f'part-{uuid.uuid4().hex}.parquet')
+                pq.write_table(table, final + '.tmp')
+                os.replace(final + '.tmp', final)
+                for part in parts:
+                    try:
+                        os.remove(part)
+                    except OSError:
+                        pass  # removed by another process, or still open on Windows
+                merged += 1
+    return merged
+
+
+# Function to remove the history of one gym, or all history when no gym is given
+def delete(gym_name=None, root=DEFAULT_HISTORY_DIR):
+    path = _gym_dir(root, gym_name) if gym_name else root
+    if os.path.isdir(path):
+        shutil.rmtree(path)
@@ -0,0 +1,339 @@
+# Shared HTTP transport for scraping.
+# One requests.Session is reused for every scrape so connections to a gym website stay
+# open between requests (keep-alive) instead of paying for a new TCP+TLS handshake each time.
+# Transient failures are retried with exponential backoff and jitter, and every request
+# records where its time went (DNS, connect, TLS, time to first byte, body).
+#
+# Pool sizes, the per-host cap, retries and the timeout can be set with the GYM_HTTP_*
+# environment variables in ENV_SETTINGS (read when the process-wide client is created), with
+# the --http-* options of `python -m cli scrape` and `python -m worker`, or in code with
+# configure_client().
+import email.utils
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Headers to mimic a browser request
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+
+DEFAULT_POOL_CONNECTIONS = 16     # hosts kept in the connection pool cache
+DEFAULT_POOL_MAXSIZE = 4          # open connections kept per host
+DEFAULT_PER_HOST_LIMIT = 2        # requests in flight per host
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5        # seconds, doubled on every retry
+DEFAULT_BACKOFF_MAX = 30          # seconds; a longer Retry-After is not waited for
+DEFAULT_TIMEOUT = 10
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Environment variable -> (HttpClient argument, type)
+ENV_SETTINGS = {
+    'GYM_HTTP_POOL_CONNECTIONS': ('pool_connections', int),
+    'GYM_HTTP_POOL_MAXSIZE': ('pool_maxsize', int),
+    'GYM_HTTP_PER_HOST_LIMIT': ('per_host_limit', int),
+    'GYM_HTTP_MAX_RETRIES': ('max_retries', int),
+    'GYM_HTTP_BACKOFF_BASE': ('backoff_base', float),
+    'GYM_HTTP_BACKOFF_MAX': ('backoff_max', float),
+    'GYM_HTTP_TIMEOUT': ('timeout', float),
+}
+
+_local = threading.local()
+
+
+# Where the time of one request went, in seconds
+@dataclass
+class RequestTimings:
+    url: str
+    dns: float = 0.0
+    connect: float = 0.0
+    tls: float = 0.0
+    ttfb: float = 0.0
+    body: float = 0.0
+    total: float = 0.0
+    attempts: int = 0
+    status: int = None
+    bytes: int = 0
+    new_connections: int = 0
+    throttled: int = 0          # 429/503 responses among the attempts
+    started: str = field(default_factory=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def as_dict(self):
+        return {
+            'url': self.url,
+            'status': self.status,
+            'attempts': self.attempts,
+            'new_connections': self.new_connections,
+            'throttled': self.throttled,
+            'dns_ms': round(self.dns * 1000, 1),
+            'connect_ms': round(self.connect * 1000, 1),
+            'tls_ms': round(self.tls * 1000, 1),
+            'ttfb_ms': round(self.ttfb * 1000, 1),
+            'body_ms': round(self.body * 1000, 1),
+            'total_ms': round(self.total * 1000, 1),
+            'bytes': self.bytes,
+            'started': self.started,
+        }
+
+
+# Connection classes that write DNS/connect/TLS time into the timings of the request
+# running on the current thread. Reused keep-alive connections never get here, which is
+# exactly what shows up as zero connect time.
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return super()._new_conn()
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            # Let urllib3 raise its usual NameResolutionError below
+            address = host
+        resolved = time.perf_counter()
+        timings.dns += resolved - start
+        timings.new_connections += 1
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        except Exception:
+            if address == host:
+                raise
+            # The first address did not answer; fall back to trying every address
+            self._dns_host = host
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+            timings.connect += time.perf_counter() - resolved
+
+    def connect(self):
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return super().connect()
+        before = timings.dns + timings.connect
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            # Whatever connect() spent beyond DNS + TCP connect was the TLS handshake
+            spent = time.perf_counter() - start
+            timings.tls += max(0.0, spent - (timings.dns + timings.connect - before))
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+# Function to turn a Retry-After header (seconds or an HTTP date) into seconds to wait
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 per_host_limit=DEFAULT_PER_HOST_LIMIT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 timeout=DEFAULT_TIMEOUT, headers=None, history_size=200):
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or HEADERS)
+        adapter = _TimedAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        # Timings of the most recent requests, newest last
+        self.timings = deque(maxlen=history_size)
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    # Exponential backoff with full jitter
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # Sends the request, retrying transient failures. With read_body=False the final response
+    # comes back with its body unread and its host slot still held (response.host_slot);
+    # the caller must release it once the body has been consumed.
+    def _send(self, url, headers, timeout, timings, read_body):
+        slot = self._host_slot(url)
+        for attempt in range(self.max_retries + 1):
+            timings.attempts = attempt + 1
+            wait = None
+            slot.acquire()
+            _local.timings = timings
+            try:
+                sent = time.perf_counter()
+                connect_before = timings.dns + timings.connect + timings.tls
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, stream=True)
+                headers_in = time.perf_counter()
+                timings.ttfb += max(0.0, headers_in - sent - (timings.dns + timings.connect + timings.tls - connect_before))
+                if read_body:
+                    response.content  # read the body while still holding the host slot
+                    timings.body += time.perf_counter() - headers_in
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                slot.release()
+                if attempt >= self.max_retries:
+                    raise
+                wait = self._backoff(attempt)
+            except BaseException:
+                slot.release()
+                raise
+            finally:
+                _local.timings = None
+
+            if wait is None:
+                timings.status = response.status_code
+                if response.status_code in (429, 503):
+                    timings.throttled += 1
+                final = response.status_code not in RETRY_STATUSES or attempt >= self.max_retries
+                retry_after = None
+                if not final:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    # The server may want us gone for longer than we are willing to block
+                    final = retry_after is not None and retry_after > self.backoff_max
+                if final:
+                    response.timings = timings
+                    if read_body:
+                        timings.bytes = len(response.content)
+                        slot.release()
+                    else:
+                        response.host_slot = slot
+                    return response
+                response.content  # drain the error page so the connection can be reused
+                slot.release()
+                wait = retry_after if retry_after is not None else self._backoff(attempt)
+            time.sleep(wait)
+
+    # Function to GET a URL with connection reuse, a per-host cap and retries.
+    # The returned response has its body loaded and a `timings` attribute (RequestTimings).
+    # After the last retry a 5xx/429 response is returned as-is, so callers can still
+    # raise_for_status(); connection errors are raised.
+    def get(self, url, headers=None, timeout=None):
+        timings = RequestTimings(url)
+        start = time.perf_counter()
+        try:
+            return self._send(url, headers, timeout, timings, read_body=True)
+        finally:
+            timings.total = time.perf_counter() - start
+            self.timings.append(timings)
+
+    # Same as get(), but the body is not loaded: use as a context manager and read the body
+    # with iter_chunks(). The host slot is held until the block exits.
+    @contextmanager
+    def stream(self, url, headers=None, timeout=None):
+        timings = RequestTimings(url)
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self._send(url, headers, timeout, timings, read_body=False)
+            yield response
+        finally:
+            if response is not None:
+                response.close()
+                if getattr(response, 'host_slot', None) is not None:
+                    response.host_slot.release()
+                    response.host_slot = None
+            timings.total = time.perf_counter() - start
+            self.timings.append(timings)
+
+    # Function to read a streamed response body chunk by chunk, counting body time and bytes
+    def iter_chunks(self, response, chunk_size=64 * 1024):
+        timings = response.timings
+        started = time.perf_counter()
+        try:
+            for chunk in response.iter_content(chunk_size):
+                timings.bytes += len(chunk)
+                yield chunk
+        finally:
+            timings.body += time.perf_counter() - started
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# Function to read the client settings set in the environment (see ENV_SETTINGS)
+def env_settings(environ=None):
+    environ = os.environ if environ is None else environ
+    return {argument: convert(environ[name]) for name, (argument, convert) in ENV_SETTINGS.items()
+            if environ.get(name)}
+
+
+# Function to get the process-wide client, creating it on first use
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(**env_settings())
+        return _client
+
+
+# Function to replace the process-wide client, e.g. with different pool sizes or limits;
+# settings not given keep their GYM_HTTP_* environment value, if any
+def configure_client(**kwargs):
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = HttpClient(**{**env_settings(), **kwargs})
+        return _client
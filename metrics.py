@@ -0,0 +1,254 @@
+# Structured instrumentation for scrapes.
+# Every scrape produces one ScrapeMetrics record: where its time went (fetch, parse, extract),
+# how many bytes it downloaded, which strategy found its rows (the gym's selectors, the
+# `table tr` fallback, the card fallback or the page cache; 'none' when nothing was found)
+# and how many errors it hit. Records are
+#   - aggregated into counters and histograms, exported in the Prometheus text format
+#     (MetricsRegistry.prometheus(), or served over HTTP with serve()),
+#   - appended to a JSON-lines log (scrape_metrics.jsonl, override with GYM_METRICS_LOG,
+#     set it empty to disable), which also lets the app see scrapes made by the worker.
+#     Once the log passes DEFAULT_LOG_MAX_BYTES (GYM_METRICS_LOG_MAX_BYTES, 0 for no limit)
+#     it is renamed to <log>.1, replacing the previous one, and a new log is started; at most
+#     about twice the limit is ever kept.
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LOG_PATH = 'scrape_metrics.jsonl'
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+PHASES = ('fetch', 'parse', 'extract', 'total')
+STRATEGIES = ('primary', 'table', 'cards', 'cached', 'none')
+# Upper bounds (seconds) of the Prometheus histogram buckets
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# What one scrape did; times in seconds
+@dataclass
+class ScrapeMetrics:
+    gym: str
+    url: str
+    started: str = field(default_factory=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    fetch: float = 0.0
+    parse: float = 0.0
+    extract: float = 0.0
+    total: float = 0.0
+    bytes: int = 0
+    status: int = None
+    cache: str = None          # 'hit', 'revalidated' or 'miss'; None for streamed pages
+    strategy: str = 'none'     # one of STRATEGIES
+    rows: int = 0
+    errors: dict = field(default_factory=dict)   # kind -> count: 'element', 'request', 'scrape'
+
+    def error(self, kind, count=1):
+        if count:
+            self.errors[kind] = self.errors.get(kind, 0) + count
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(values, q):
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label(value)}"' for key, value in labels.items()) + '}'
+
+
+def _tail(path, count, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= count:
+            position = max(0, position - block_size)
+            f.seek(position)
+            data = f.read(end - position)
+    return data.splitlines()[-count:]
+
+
+class MetricsRegistry:
+    def __init__(self, log_path=DEFAULT_LOG_PATH, history_size=1000, log_max_bytes=DEFAULT_LOG_MAX_BYTES):
+        self.log_path = log_path or None
+        self.log_max_bytes = log_max_bytes
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history_size)
+        self._scrapes = Counter()                  # (gym, strategy)
+        self._rows = Counter()                     # (gym, strategy)
+        self._errors = Counter()                   # (gym, kind)
+        self._bytes = Counter()                    # gym
+        self._buckets = defaultdict(lambda: [0] * len(BUCKETS))   # (gym, phase) -> per-bucket counts
+        self._sums = Counter()                     # (gym, phase)
+        self._counts = Counter()                   # (gym, phase)
+
+    # Function to add one finished scrape
+    def record(self, metrics):
+        line = json.dumps(metrics.as_dict())
+        with self._lock:
+            self._recent.append(metrics)
+            self._scrapes[(metrics.gym, metrics.strategy)] += 1
+            self._rows[(metrics.gym, metrics.strategy)] += metrics.rows
+            for kind, count in metrics.errors.items():
+                self._errors[(metrics.gym, kind)] += count
+            self._bytes[metrics.gym] += metrics.bytes
+            for phase in PHASES:
+                seconds = getattr(metrics, phase)
+                key = (metrics.gym, phase)
+                self._sums[key] += seconds
+                self._counts[key] += 1
+                buckets = self._buckets[key]
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+            if self.log_path:
+                self._rotate_log()
+                with open(self.log_path, 'a') as f:
+                    f.write(line + '\n')
+
+    def _rotate_log(self):
+        try:
+            if self.log_max_bytes and os.path.getsize(self.log_path) >= self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + '.1')
+        except OSError:
+            pass  # no log yet, or another process rotated it first
+
+    # Function to get the most recent scrape records (dicts, oldest first). With a log they
+    # come from its tail (and the rotated log's, after a rotation), so scrapes made by other
+    # processes are included.
+    def recent(self, limit=1000):
+        if self.log_path and os.path.exists(self.log_path):
+            lines = _tail(self.log_path, limit)
+            if len(lines) < limit and os.path.exists(self.log_path + '.1'):
+                lines = _tail(self.log_path + '.1', limit - len(lines)) + lines
+            records = []
+            for line in lines:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by a crash
+            return records
+        with self._lock:
+            return [m.as_dict() for m in list(self._recent)[-limit:]]
+
+    # Function to summarize recent scrapes per gym: count, p50/p95 of every phase in ms,
+    # rows per strategy and error counts
+    def summary(self, limit=1000):
+        by_gym = defaultdict(list)
+        for record in self.recent(limit):
+            by_gym[record['gym']].append(record)
+        rows = []
+        for gym, records in sorted(by_gym.items()):
+            row = {'gym': gym, 'scrapes': len(records)}
+            for phase in PHASES:
+                values = sorted(record[phase] for record in records)
+                for q in (50, 95):
+                    row[f'{phase}_p{q}_ms'] = round(percentile(values, q) * 1000, 1)
+            strategies = Counter()
+            for record in records:
+                strategies[record['strategy']] += record['rows']
+            row['rows'] = ', '.join(f"{name}: {count}" for name, count in strategies.most_common())
+            row['errors'] = sum(sum(record['errors'].values()) for record in records)
+            row['kb_p50'] = round(percentile(sorted(record['bytes'] for record in records), 50) / 1024, 1)
+            rows.append(row)
+        return rows
+
+    # Function to render everything recorded in this process in the Prometheus text format
+    def prometheus(self):
+        with self._lock:
+            lines = [
+                '# HELP gym_scrapes_total Scrapes, by gym and the strategy that found the rows.',
+                '# TYPE gym_scrapes_total counter',
+            ]
+            lines += [f'gym_scrapes_total{_labels(gym=gym, strategy=strategy)} {count}'
+                      for (gym, strategy), count in sorted(self._scrapes.items())]
+            lines += ['# HELP gym_scrape_rows_total Class rows found, by gym and strategy.',
+                      '# TYPE gym_scrape_rows_total counter']
+            lines += [f'gym_scrape_rows_total{_labels(gym=gym, strategy=strategy)} {count}'
+                      for (gym, strategy), count in sorted(self._rows.items())]
+            lines += ['# HELP gym_scrape_errors_total Errors during scrapes, by gym and kind.',
+                      '# TYPE gym_scrape_errors_total counter']
+            lines += [f'gym_scrape_errors_total{_labels(gym=gym, kind=kind)} {count}'
+                      for (gym, kind), count in sorted(self._errors.items())]
+            lines += ['# HELP gym_scrape_bytes_total Bytes downloaded, by gym.',
+                      '# TYPE gym_scrape_bytes_total counter']
+            lines += [f'gym_scrape_bytes_total{_labels(gym=gym)} {count}' for gym, count in sorted(self._bytes.items())]
+            lines += ['# HELP gym_scrape_phase_seconds Time spent per scrape, by gym and phase.',
+                      '# TYPE gym_scrape_phase_seconds histogram']
+            for (gym, phase), buckets in sorted(self._buckets.items()):
+                for bound, count in zip(BUCKETS, buckets):
+                    lines.append(f'gym_scrape_phase_seconds_bucket{_labels(gym=gym, phase=phase, le=bound)} {count}')
+                count = self._counts[(gym, phase)]
+                lines.append(f'gym_scrape_phase_seconds_bucket{_labels(gym=gym, phase=phase, le="+Inf")} {count}')
+                lines.append(f'gym_scrape_phase_seconds_sum{_labels(gym=gym, phase=phase)} {self._sums[(gym, phase)]:.6f}')
+                lines.append(f'gym_scrape_phase_seconds_count{_labels(gym=gym, phase=phase)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# Function to serve `registry.prometheus()` at http://<host>:<port>/metrics from a daemon
+# thread; returns the server (call shutdown() to stop it)
+def serve(registry, port, host=''):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Function to time a block into one phase of a ScrapeMetrics record
+@contextmanager
+def timed(metrics, phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, phase, getattr(metrics, phase) + time.perf_counter() - started)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+# Function to get the process-wide registry, creating it on first use
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry(os.environ.get('GYM_METRICS_LOG', DEFAULT_LOG_PATH),
+                                       log_max_bytes=int(os.environ.get('GYM_METRICS_LOG_MAX_BYTES',
+                                                                        DEFAULT_LOG_MAX_BYTES)))
+        return _metrics
+
+
+# Function to replace the process-wide registry, e.g. with a different log path
+def configure_metrics(**kwargs):
+    global _metrics
+    with _metrics_lock:
+        _metrics = MetricsRegistry(**kwargs)
+        return _metrics
@@ -0,0 +1,113 @@
+# Parsing schedule pages off the calling thread, so CPU-bound extraction scales across cores.
+# Parsing and running selectors hold the GIL: with many concurrent scrapes, the scrape
+# threads end up taking turns on one core. A ParsePool hands the raw page bytes to worker
+# processes (or subinterpreters, on Pythons that have concurrent.futures.InterpreterPoolExecutor),
+# which parse them with parsing.parse_schedule and send back plain tuples, never trees.
+#
+# The pool is off by default. Turn it on with GYM_PARSE_WORKERS=<n> (0 or unset: parse in the
+# scraping thread), `python -m worker --parse-workers n`, or configure_parse_pool(workers=n).
+# Streamed pages (see streaming.py) are always parsed in the scraping thread.
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+
+from parsing import parse_schedule
+
+logger = logging.getLogger(__name__)
+
+PROCESS = 'process'
+INTERPRETER = 'interpreter'
+HAVE_INTERPRETERS = hasattr(concurrent.futures, 'InterpreterPoolExecutor')
+
+
+# Runs in a worker: decode, parse, and return (records, strategy, stats, messages) where
+# records are (name, instructor, time, availability) tuples and messages are the
+# (level, message) pairs parse_schedule reported
+def _parse_page(page, encoding, selectors, backend, parse_only, plan=None):
+    messages = []
+    stats = {}
+    html = page.decode(encoding or 'utf-8', errors='replace') if isinstance(page, bytes) else page
+    classes, strategy = parse_schedule(html, *selectors, backend=backend, parse_only=parse_only,
+                                       report=lambda level, message: messages.append((level, message)), stats=stats,
+                                       plan=plan)
+    records = [(cls['name'], cls['instructor'], cls['time'], cls['availability']) for cls in classes]
+    return records, strategy, stats, messages
+
+
+class ParsePool:
+    # kind is PROCESS or INTERPRETER; without InterpreterPoolExecutor, INTERPRETER falls back to
+    # PROCESS. Worker processes are spawned rather than forked: the app and the worker are
+    # multi-threaded, and forking a threaded process can copy a held lock into the child.
+    def __init__(self, workers=None, kind=PROCESS):
+        self.workers = workers or os.cpu_count() or 1
+        if kind == INTERPRETER and not HAVE_INTERPRETERS:
+            logger.warning("Subinterpreters are not available in this Python; parsing in processes instead")
+            kind = PROCESS
+        if kind not in (PROCESS, INTERPRETER):
+            raise ValueError(f"Unknown parse pool kind: {kind}")
+        self.kind = kind
+        if kind == INTERPRETER:
+            self.executor = concurrent.futures.InterpreterPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    # Function to queue one page; the future's result is what _parse_page returns
+    def submit(self, page, class_selector, instructor_selector, time_selector, availability_selector,
+               encoding=None, backend=None, parse_only=None, plan=None):
+        selectors = (class_selector, instructor_selector, time_selector, availability_selector)
+        return self.executor.submit(_parse_page, page, encoding, selectors, backend, parse_only, plan)
+
+    # Function to parse one page in the pool, with the same arguments and result as
+    # parsing.parse_schedule; `page` may be bytes (decoded with `encoding`) or text
+    def parse(self, page, class_selector, instructor_selector, time_selector, availability_selector,
+              encoding=None, backend=None, parse_only=None, report=None, stats=None, plan=None):
+        records, strategy, worker_stats, messages = self.submit(
+            page, class_selector, instructor_selector, time_selector, availability_selector,
+            encoding=encoding, backend=backend, parse_only=parse_only, plan=plan).result()
+        if report:
+            for level, message in messages:
+                report(level, message)
+        if stats is not None:
+            for key, value in worker_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        classes = [{'name': name, 'instructor': instructor, 'time': time, 'availability': availability}
+                   for name, instructor, time, availability in records]
+        return classes, strategy
+
+    # Function to start every worker now instead of on the first pages
+    def warm_up(self):
+        futures = [self.executor.submit(_parse_page, '', None, ('p',) * 4, None, None) for _ in range(self.workers)]
+        concurrent.futures.wait(futures)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_configured = False
+_pool_lock = threading.Lock()
+
+
+# Function to get the process-wide pool, or None when pages are parsed in the scraping thread
+def get_parse_pool():
+    global _pool, _pool_configured
+    with _pool_lock:
+        if not _pool_configured:
+            workers = int(os.environ.get('GYM_PARSE_WORKERS') or 0)
+            _pool = ParsePool(workers, os.environ.get('GYM_PARSE_POOL', PROCESS)) if workers > 0 else None
+            _pool_configured = True
+        return _pool
+
+
+# Function to replace the process-wide pool; workers=0 turns it off
+def configure_parse_pool(workers=None, kind=PROCESS):
+    global _pool, _pool_configured
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ParsePool(workers, kind) if workers != 0 else None
+        _pool_configured = True
+        return _pool
@@ -0,0 +1,294 @@
+# Pluggable HTML parsing for schedule pages.
+# A gym entry can pick its parser backend ('parser': 'html.parser', 'lxml' or 'selectolax')
+# and restrict parsing to the schedule region ('parse_only': a tag name, '.class' or '#id').
+# Each gym's selectors are compiled once and cached, and every field is pulled with a single
+# selector evaluation. Which extraction strategy works for a gym is learned once and kept as
+# its extraction plan, so later scrapes make a single pass over the page.
+import time
+from functools import lru_cache
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    HAVE_SELECTOLAX = True
+except ImportError:
+    HAVE_SELECTOLAX = False
+
+DEFAULT_BACKEND = 'lxml' if HAVE_LXML else 'html.parser'
+
+# Words that mark an element's text as availability info
+AVAILABILITY_WORDS = ('available', 'spot', 'space', 'full', 'capacity')
+AVAILABILITY_TAGS = 'span, div, p'
+
+# Generic fallbacks for pages the configured selectors do not match
+TABLE_ROW_SELECTOR = 'table tr'
+TABLE_CELL_SELECTOR = 'td'
+CARD_SELECTOR = '.card, .class-card, .event-card, .schedule-card'
+CARD_NAME_SELECTOR = '.title, .name, h3, h4'
+CARD_INSTRUCTOR_SELECTOR = '.instructor, .trainer, .teacher'
+CARD_TIME_SELECTOR = '.time, .schedule-time, .hour'
+CARD_AVAILABILITY_SELECTOR = '.status, .availability, .spots'
+
+# A gym's extraction plan is learned again when its strategy yields less than this share of
+# the valid rows it found when the plan was learned
+RELEARN_YIELD = 0.5
+
+
+# BeautifulSoup with html.parser or lxml; selectors are compiled with soupsieve
+class SoupBackend:
+    def __init__(self, features):
+        self.name = features
+        self.features = features
+
+    def compile(self, selector):
+        return soupsieve.compile(selector)
+
+    def parse(self, html, parse_only=None):
+        return BeautifulSoup(html, self.features, parse_only=_strainer(parse_only))
+
+    def select(self, node, selector):
+        return selector.select(node)
+
+    def select_one(self, node, selector):
+        return selector.select_one(node)
+
+    def text(self, node):
+        return node.get_text()
+
+
+# selectolax (lexbor). Lexbor compiles selector strings itself, so "compiling" only checks the
+# selector once. parse_only cannot limit lexbor's parser; it narrows the tree that is searched.
+class SelectolaxBackend:
+    name = 'selectolax'
+
+    def compile(self, selector):
+        LexborHTMLParser('').css(selector)  # raises on an invalid selector
+        return selector
+
+    def parse(self, html, parse_only=None):
+        tree = LexborHTMLParser(html)
+        if parse_only:
+            region = tree.css_first(parse_only)
+            if region is not None:
+                return region
+        return tree.root if tree.root is not None else tree
+
+    # Lexbor counts the node itself as a match; BeautifulSoup only searches descendants
+    def select(self, node, selector):
+        own_id = node.mem_id if hasattr(node, 'mem_id') else None
+        return [found for found in node.css(selector) if found.mem_id != own_id]
+
+    def select_one(self, node, selector):
+        found = node.css_first(selector)
+        if found is not None and hasattr(node, 'mem_id') and found.mem_id == node.mem_id:
+            matches = self.select(node, selector)
+            return matches[0] if matches else None
+        return found
+
+    def text(self, node):
+        return node.text(deep=True)
+
+
+def _strainer(parse_only):
+    if not parse_only:
+        return None
+    if parse_only.startswith('.'):
+        return SoupStrainer(class_=parse_only[1:])
+    if parse_only.startswith('#'):
+        return SoupStrainer(id=parse_only[1:])
+    return SoupStrainer(parse_only)
+
+
+# Function to get a parser backend by name
+@lru_cache(maxsize=None)
+def get_backend(name=None):
+    name = name or DEFAULT_BACKEND
+    if name == 'selectolax':
+        if not HAVE_SELECTOLAX:
+            raise ValueError("The selectolax parser is not installed (pip install selectolax)")
+        return SelectolaxBackend()
+    if name == 'lxml' and not HAVE_LXML:
+        raise ValueError("The lxml parser is not installed (pip install lxml)")
+    if name not in ('html.parser', 'lxml'):
+        raise ValueError(f"Unknown parser backend: {name}")
+    return SoupBackend(name)
+
+
+# Every selector a gym needs, compiled once per backend
+class CompiledSelectors:
+    def __init__(self, backend, class_selector, name_selector, instructor_selector, time_selector):
+        compile = backend.compile
+        self.container = compile(class_selector)
+        self.name = compile(name_selector)
+        self.instructor = compile(instructor_selector)
+        self.time = compile(time_selector)
+        self.availability_tags = compile(AVAILABILITY_TAGS)
+        self.table_rows = compile(TABLE_ROW_SELECTOR)
+        self.table_cells = compile(TABLE_CELL_SELECTOR)
+        self.cards = compile(CARD_SELECTOR)
+        self.card_name = compile(CARD_NAME_SELECTOR)
+        self.card_instructor = compile(CARD_INSTRUCTOR_SELECTOR)
+        self.card_time = compile(CARD_TIME_SELECTOR)
+        self.card_availability = compile(CARD_AVAILABILITY_SELECTOR)
+
+
+@lru_cache(maxsize=256)
+def compile_selectors(backend_name, class_selector, name_selector, instructor_selector, time_selector):
+    return CompiledSelectors(get_backend(backend_name), class_selector, name_selector, instructor_selector, time_selector)
+
+
+def _field(backend, node, selector):
+    found = backend.select_one(node, selector)
+    return backend.text(found).strip() if found is not None else "Unknown"
+
+
+# Function to count the usable rows in a list of classes: a class name plus at least two of
+# instructor, time and availability. Rows a misaligned selector produced ("Unknown" or empty
+# fields, header rows) do not count.
+def valid_rows(classes):
+    return sum(1 for cls in classes if valid_row(cls))
+
+
+def valid_row(cls):
+    return _known(cls['name']) and _known(cls['instructor']) + _known(cls['time']) + _known(cls['availability']) >= 2
+
+
+def _known(value):
+    return bool(value) and value != "Unknown"
+
+
+def _complete(classes):
+    return all(_known(cls[field]) for cls in classes for field in ('name', 'instructor', 'time', 'availability'))
+
+
+# Function to pull class records out of a schedule page.
+# Returns (classes, strategy) where strategy is 'primary' (the gym's selectors), 'table'
+# (table rows) or 'cards' (common card layouts), or None when nothing was found. Records have
+# name/instructor/time/availability but no timestamp.
+# Note the historical field mapping of gym entries: `instructor_selector` holds the class
+# name, `time_selector` the instructor and `availability_selector` the time.
+# `plan` is the gym's extraction plan ({'strategy': ..., 'rows': ...}, see scraper.py): only
+# its strategy is run, unless it yields fewer than RELEARN_YIELD of the valid rows it found
+# when it was learned. Without a plan, or when its yield drops, the plan is learned again:
+# the strategies are tried in order and the first one whose rows are all complete wins,
+# otherwise the one with the most valid rows.
+# With a `stats` dict, the time spent building the tree ('parse') and running the
+# selectors ('extract'), and the number of elements that failed ('element_errors'), are
+# added to it; 'learned' is counted when the plan was (re)learned.
+def parse_schedule(html, class_selector, instructor_selector, time_selector, availability_selector,
+                   backend=None, parse_only=None, report=None, stats=None, plan=None):
+    backend = get_backend(backend)
+    selectors = compile_selectors(backend.name, class_selector, instructor_selector, time_selector, availability_selector)
+    started = time.perf_counter()
+    root = backend.parse(html, parse_only)
+    parsed = time.perf_counter()
+    errors = []
+    try:
+        if plan and plan.get('strategy') in STRATEGIES:
+            strategy = plan['strategy']
+            classes = STRATEGIES[strategy](backend, root, selectors, report, errors)
+            if classes and valid_rows(classes) >= plan.get('rows', 0) * RELEARN_YIELD:
+                return classes, strategy
+        if stats is not None:
+            stats['learned'] = stats.get('learned', 0) + 1
+        return _learn(backend, root, selectors, report, errors)
+    finally:
+        if stats is not None:
+            stats['parse'] = stats.get('parse', 0.0) + parsed - started
+            stats['extract'] = stats.get('extract', 0.0) + time.perf_counter() - parsed
+            stats['element_errors'] = stats.get('element_errors', 0) + len(errors)
+
+
+def _learn(backend, root, selectors, report, errors):
+    return choose_strategy((strategy, extract(backend, root, selectors, report, errors))
+                           for strategy, extract in STRATEGIES.items())
+
+
+# Function to pick the strategy a plan is learned from, out of (strategy, classes) pairs in
+# STRATEGIES order: the first whose rows are all complete, otherwise the one with the most
+# valid rows. Returns (classes, strategy), ([], None) when no strategy found anything.
+# Pairs are only consumed up to the first complete one.
+def choose_strategy(results):
+    best, best_score = ([], None), (0, 0)
+    for strategy, classes in results:
+        if not classes:
+            continue
+        if _complete(classes):
+            return classes, strategy
+        score = (valid_rows(classes), len(classes))
+        if score > best_score:
+            best, best_score = (classes, strategy), score
+    return best
+
+
+def _primary(backend, root, selectors, report, errors):
+    classes = []
+    for element in backend.select(root, selectors.container):
+        try:
+            # Extract availability info - the first tag that talks about spots or capacity
+            availability_text = "Unknown"
+            for tag in backend.select(element, selectors.availability_tags):
+                text = backend.text(tag)
+                lowered = text.lower()
+                if any(word in lowered for word in AVAILABILITY_WORDS):
+                    availability_text = text.strip()
+                    break
+
+            classes.append({
+                'name': _field(backend, element, selectors.name),
+                'instructor': _field(backend, element, selectors.instructor),
+                'time': _field(backend, element, selectors.time),
+                'availability': availability_text,
+            })
+        except Exception as e:
+            errors.append(e)
+            if report:
+                report('warning', f"Error parsing class element: {e}")
+    return classes
+
+
+# Look for table rows
+def _table(backend, root, selectors, report, errors):
+    classes = []
+    for row in backend.select(root, selectors.table_rows)[1:]:  # Skip header row
+        cells = backend.select(row, selectors.table_cells)
+        if len(cells) >= 4:
+            classes.append({
+                'name': backend.text(cells[0]).strip(),
+                'instructor': backend.text(cells[1]).strip(),
+                'time': backend.text(cells[2]).strip(),
+                'availability': backend.text(cells[3]).strip(),
+            })
+    return classes
+
+
+# Try another common pattern - div cards
+def _cards(backend, root, selectors, report, errors):
+    classes = []
+    for card in backend.select(root, selectors.cards):
+        try:
+            name_elem = backend.select_one(card, selectors.card_name)
+            time_elem = backend.select_one(card, selectors.card_time)
+            if name_elem is not None and time_elem is not None:
+                classes.append({
+                    'name': backend.text(name_elem).strip(),
+                    'instructor': _field(backend, card, selectors.card_instructor),
+                    'time': backend.text(time_elem).strip(),
+                    'availability': _field(backend, card, selectors.card_availability),
+                })
+        except Exception as e:
+            errors.append(e)
+            continue
+    return classes
+
+
+# Extraction strategies, in the order they are tried when a plan is learned
+STRATEGIES = {'primary': _primary, 'table': _table, 'cards': _cards}
@@ -0,0 +1,199 @@
+# Adaptive per-host rate limiting for scrapes.
+# Every host gets a token bucket: a request takes a token, and tokens come back at the host's
+# rate (requests per second) up to `burst`. The rate adapts to how the host responds
+# (additive increase, multiplicative decrease):
+#   - a 429 or 503, including ones the HTTP client retried, halves it; a Retry-After also
+#     pauses the host for that long
+#   - a failed request, a 5xx, or a response much slower than the host's usual cuts it by a quarter
+#   - every healthy response adds INCREASE requests per second, up to the host's max_rate
+# robots.txt is fetched once per host (cached for ROBOTS_TTL); its Crawl-delay or Request-rate
+# caps the host's max_rate.
+#
+# A gym entry can tune its host with 'rate_limit', a number (the starting rate) or a dict:
+#   "rate_limit": {"rate": 0.5, "burst": 1, "min_rate": 0.05, "max_rate": 2}
+# When several gyms share a host, the settings of the gym scraped last apply.
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from http_client import get_client
+
+DEFAULT_RATE = 0.5          # requests per second a host starts at: one every 2 seconds
+DEFAULT_BURST = 1           # requests a host may get back to back after a quiet spell
+DEFAULT_MIN_RATE = 0.05     # never slower than one request every 20 seconds
+DEFAULT_MAX_RATE = 2.0      # never faster than this, however healthy the host looks
+INCREASE = 0.05             # requests per second added after a healthy response
+THROTTLED_DECREASE = 0.5    # rate multiplier after a 429/503
+SLOW_DECREASE = 0.75        # rate multiplier after a failure or a latency spike
+LATENCY_FACTOR = 2.0        # a response this many times slower than usual is a spike...
+LATENCY_FLOOR = 0.5         # ...if it also took longer than this many seconds
+THROTTLE_STATUSES = (429, 503)
+ROBOTS_TTL = 24 * 60 * 60
+ROBOTS_TIMEOUT = 5
+
+
+# Function to turn a gym's 'rate_limit' entry into full settings
+def settings(config=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=DEFAULT_MIN_RATE,
+             max_rate=DEFAULT_MAX_RATE):
+    if isinstance(config, (int, float)):
+        config = {'rate': config}
+    config = config or {}
+    rate = float(config.get('rate', rate))
+    min_rate = min(float(config.get('min_rate', min_rate)), rate)
+    max_rate = max(float(config.get('max_rate', max_rate)), rate)
+    return {'rate': rate, 'burst': max(1, int(config.get('burst', burst))), 'min_rate': min_rate,
+            'max_rate': max_rate}
+
+
+# Function to read the request rate robots.txt allows us at a URL's host: requests per second,
+# or None when it sets no Crawl-delay / Request-rate (or cannot be read)
+def robots_rate(url, client=None):
+    parts = urlparse(url)
+    client = client or get_client()
+    try:
+        response = client.session.get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=ROBOTS_TIMEOUT)
+    except Exception:
+        return None
+    if response.status_code != 200:
+        return None
+    robots = RobotFileParser()
+    robots.parse(response.text.splitlines())
+    agent = client.session.headers.get('User-Agent', '*')
+    limits = []
+    delay = robots.crawl_delay(agent)
+    if delay:
+        limits.append(1 / float(delay))
+    request_rate = robots.request_rate(agent)
+    if request_rate and request_rate.requests and request_rate.seconds:
+        limits.append(request_rate.requests / request_rate.seconds)
+    return min(limits) if limits else None
+
+
+# The token bucket and adaptive rate of one host
+class HostBucket:
+    def __init__(self, host, rate, burst, min_rate, max_rate, robots_rate=None):
+        self.host = host
+        self.configure(rate, burst, min_rate, max_rate, robots_rate)
+        self.rate = min(rate, self.max_rate)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.latency = None         # moving average of response latency, seconds
+        self.requests = 0
+        self.slowdowns = 0
+
+    def configure(self, rate, burst, min_rate, max_rate, robots_rate=None):
+        self.config = (rate, burst, min_rate, max_rate)
+        self.robots_rate = robots_rate
+        self.burst = burst
+        self.max_rate = min(max_rate, robots_rate) if robots_rate else max_rate
+        self.min_rate = min(min_rate, self.max_rate)
+        if hasattr(self, 'rate'):
+            self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+
+    # Function to take a token; returns how long the caller has to wait for it.
+    # Tokens can go negative: each waiting caller holds its place in line.
+    def reserve(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        self.requests += 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def _slow_down(self, factor):
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.slowdowns += 1
+
+    def observe(self, now, status=None, latency=None, throttled=0, retry_after=None):
+        if throttled or status in THROTTLE_STATUSES:
+            self._slow_down(THROTTLED_DECREASE)
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+        elif status is None or status >= 500:
+            self._slow_down(SLOW_DECREASE)
+        elif (latency is not None and self.latency is not None
+              and latency > max(LATENCY_FLOOR, self.latency * LATENCY_FACTOR)):
+            self._slow_down(SLOW_DECREASE)
+        elif status < 400:
+            self.rate = min(self.max_rate, self.rate + INCREASE)
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+
+class RateLimiter:
+    # rate=None turns limiting off for gyms without their own 'rate_limit' (benchmarks against
+    # local servers); robots=False skips robots.txt
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=DEFAULT_MIN_RATE,
+                 max_rate=DEFAULT_MAX_RATE, robots=True):
+        self.rate = rate
+        self.defaults = {'burst': burst, 'min_rate': min_rate, 'max_rate': max_rate}
+        self.robots = robots
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._robots = {}           # host -> (requests per second or None, expiry)
+        self._robots_locks = {}
+
+    def _robots_rate(self, url, host):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._robots.get(host)
+            if cached and cached[1] > now:
+                return cached[0]
+            lock = self._robots_locks.setdefault(host, threading.Lock())
+        # One fetch per host; other scrapes of the host wait for it
+        with lock:
+            with self._lock:
+                cached = self._robots.get(host)
+                if cached and cached[1] > time.monotonic():
+                    return cached[0]
+            allowed = robots_rate(url)
+            with self._lock:
+                self._robots[host] = (allowed, time.monotonic() + ROBOTS_TTL)
+            return allowed
+
+    # Function to block until a request to `url` may be sent. `config` is the gym's
+    # 'rate_limit' entry, if any.
+    def wait(self, url, config=None):
+        if self.rate is None and config is None:
+            return
+        host = urlparse(url).netloc.lower()
+        allowed = self._robots_rate(url, host) if self.robots else None
+        options = settings(config, rate=self.rate or DEFAULT_RATE, **self.defaults)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = HostBucket(host, robots_rate=allowed, **options)
+            elif config is not None:
+                bucket.configure(robots_rate=allowed, **options)
+            elif bucket.robots_rate != allowed:
+                bucket.configure(*bucket.config, robots_rate=allowed)
+            wait = bucket.reserve(time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    # Function to tell the limiter how a request to `url` went: the final status (None when
+    # the request failed), its latency in seconds, how many 429/503 responses were retried
+    # on the way and the server's Retry-After in seconds
+    def observe(self, url, status=None, latency=None, throttled=0, retry_after=None):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is not None:
+                bucket.observe(time.monotonic(), status, latency, throttled, retry_after)
+
+    # Function to describe every host's current limits, for display
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'host': bucket.host,
+                'rate': round(bucket.rate, 3),
+                'max_rate': round(bucket.max_rate, 3),
+                'robots_rate': round(bucket.robots_rate, 3) if bucket.robots_rate else None,
+                'latency_ms': round(bucket.latency * 1000, 1) if bucket.latency is not None else None,
+                'requests': bucket.requests,
+                'slowdowns': bucket.slowdowns,
+                'paused_s': round(max(0.0, bucket.paused_until - now), 1),
+            } for bucket in sorted(self._buckets.values(), key=lambda bucket: bucket.host)]
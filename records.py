@@ -0,0 +1,108 @@
+# Compact class records.
+# A scraped class used to be a dict of five strings: its own hash table, and its own copy of
+# the class name, instructor and formatted scrape time, although the same few names come
+# back in every scrape. A ClassRecord keeps the fields in __slots__, interns the text (so a
+# name repeated across thousands of records is stored once) and keeps the scrape time as
+# integer epoch seconds.
+#
+# ClassRecord is a read-only Mapping, so code written for class dicts keeps working:
+# record['name'], record.get('instructor'), dict(record, spots=3), pd.DataFrame(records).
+# Its 'timestamp' key gives the scrape time formatted as before ('YYYY-MM-DD HH:MM:SS').
+# Batches go to pandas through frame(), with categorical text columns.
+import sys
+import time
+from collections.abc import Mapping
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+TEXT_FIELDS = ('name', 'instructor', 'time', 'availability')
+KEYS = TEXT_FIELDS + ('timestamp',)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# Function to format epoch seconds like the rest of the app (local time); the same few
+# scrape times are formatted over and over, so they are cached
+@lru_cache(maxsize=4096)
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(text):
+    return int(datetime.strptime(text, TIMESTAMP_FORMAT).timestamp())
+
+
+def now():
+    return int(time.time())
+
+
+class ClassRecord(Mapping):
+    __slots__ = ('name', 'instructor', 'time', 'availability', 'scraped_at')
+
+    def __init__(self, name, instructor, time, availability, scraped_at=None):
+        self.name = _intern(name)
+        self.instructor = _intern(instructor)
+        self.time = _intern(time)
+        self.availability = _intern(availability)
+        self.scraped_at = scraped_at
+
+    # Function to build a record from a class dict; `scraped_at` (epoch seconds) wins over the
+    # dict's own 'timestamp', if any
+    @classmethod
+    def from_dict(cls, values, scraped_at=None):
+        if scraped_at is None and isinstance(values, ClassRecord):
+            scraped_at = values.scraped_at
+        elif scraped_at is None and values.get('timestamp'):
+            scraped_at = parse_timestamp(values['timestamp'])
+        return cls(*(values.get(field) for field in TEXT_FIELDS), scraped_at)
+
+    @property
+    def timestamp(self):
+        return None if self.scraped_at is None else format_timestamp(self.scraped_at)
+
+    def __getitem__(self, key):
+        if key in KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self):
+        return len(KEYS)
+
+    def __repr__(self):
+        return (f"ClassRecord(name={self.name!r}, instructor={self.instructor!r}, time={self.time!r}, "
+                f"availability={self.availability!r}, timestamp={self.timestamp!r})")
+
+    def __reduce__(self):
+        return (ClassRecord, (self.name, self.instructor, self.time, self.availability, self.scraped_at))
+
+
+# Function to turn class dicts (or records) into records scraped at `scraped_at`
+def from_dicts(classes, scraped_at=None):
+    return [ClassRecord.from_dict(cls, scraped_at) for cls in classes]
+
+
+# Function to convert text columns of a DataFrame to categoricals, in place: a column that
+# repeats a few distinct values stores each of them once plus one small integer per row
+def categorize(frame, columns=KEYS):
+    for column in columns:
+        if column in frame and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+# Function to get a batch of records (or class dicts) as a DataFrame with the columns
+# name, instructor, time, availability and timestamp, all categorical
+def frame(batch):
+    batch = [record if isinstance(record, ClassRecord) else ClassRecord.from_dict(record) for record in batch]
+    columns = {field: pd.Categorical([getattr(record, field) for record in batch]) for field in TEXT_FIELDS}
+    columns['timestamp'] = pd.Categorical([record.timestamp for record in batch])
+    return pd.DataFrame(columns)
@@ -0,0 +1,175 @@
+# On-disk HTTP response cache for schedule pages.
+# Entries are keyed by URL and keep the ETag/Last-Modified validators, the page body and
+# the class list extracted from it. Within the TTL a cached class list is reused without
+# any request; after that the page is revalidated with If-None-Match/If-Modified-Since and
+# a 304 reuses the stored classes without parsing. The cache is bounded in bytes and evicts
+# the least recently used pages first.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = 'http_cache.sqlite'
+DEFAULT_TTL = 30 * 60                  # seconds a cached class list is served without asking
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024   # total size of cached bodies
+
+COUNTERS = ('hits', 'revalidated', 'misses', 'stores', 'evictions')
+
+
+class CacheEntry:
+    def __init__(self, url, etag, last_modified, body, classes, selectors_key, stored_at, ttl):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.classes = classes
+        self.selectors_key = selectors_key
+        self.stored_at = stored_at
+        self.ttl = ttl
+
+    @property
+    def fresh(self):
+        return time.time() - self.stored_at < self.ttl
+
+    # Headers that turn the next request into a conditional GET
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    # Cached classes, but only if they were extracted with the same selectors
+    def classes_for(self, selectors_key):
+        if self.classes is None or self.selectors_key != selectors_key:
+            return None
+        return self.classes
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body BLOB,
+                    classes TEXT,
+                    selectors_key TEXT,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", [(c,) for c in COUNTERS])
+
+    # One connection per thread, kept open; every `with` block is one transaction on it
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _count(self, db, name, amount=1):
+        db.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    # Function to look up a URL; returns a CacheEntry or None
+    def get(self, url):
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT etag, last_modified, body, classes, selectors_key, stored_at FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+        etag, last_modified, body, classes, selectors_key, stored_at = row
+        return CacheEntry(url, etag, last_modified, body, json.loads(classes) if classes else None,
+                          selectors_key, stored_at, self.ttl)
+
+    # Record how a lookup was answered: 'hits', 'revalidated' or 'misses'
+    def record(self, outcome):
+        with self._lock, self._connect() as db:
+            self._count(db, outcome)
+
+    # Function to mark an entry as fresh again after a 304
+    def refresh(self, url):
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+
+    # Function to store a page and the classes extracted from it, then evict down to max_bytes
+    def put(self, url, body, etag=None, last_modified=None, classes=None, selectors_key=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, body, classes, selectors_key, size, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, json.dumps(classes) if classes is not None else None,
+                 selectors_key, size, now, now)
+            )
+            self._count(db, 'stores')
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_url, old_size in db.execute(
+                        "SELECT url, size FROM responses WHERE url != ? ORDER BY last_access", (url,)).fetchall():
+                    db.execute("DELETE FROM responses WHERE url = ?", (old_url,))
+                    evicted += 1
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+                self._count(db, 'evictions', evicted)
+
+    # Function to get the hit/miss counters plus the current size of the cache
+    def stats(self):
+        with self._lock, self._connect() as db:
+            stats = dict(db.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['entries'] = entries
+        stats['bytes'] = size
+        stats['hit_rate'] = (stats['hits'] + stats['revalidated']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM responses")
+            db.execute("UPDATE counters SET value = 0")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide cache, creating it on first use
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(os.environ.get('GYM_HTTP_CACHE', DEFAULT_CACHE_PATH))
+        return _cache
+
+
+# Function to replace the process-wide cache, e.g. with a different TTL or size limit
+def configure_cache(**kwargs):
+    global _cache
+    with _cache_lock:
+        _cache = ResponseCache(**kwargs)
+        return _cache
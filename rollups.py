@@ -0,0 +1,113 @@
+# Pre-aggregated counts behind the Historical Data charts.
+# For every gym, class and instructor there is one row per hour and per day with how often
+# it was scraped, how often it had open spots, and the sum and count of its parsed spots.
+# The rows are bumped inside the same transaction that stores a scrape, so the charts read
+# O(distinct classes x buckets) rows instead of every scraped class.
+#
+#   python -m rollups --rebuild              # recompute every gym's rollups from its history
+#   python -m rollups --rebuild --gym YMCA
+import argparse
+from collections import defaultdict
+
+import availability
+
+HOUR = 'hour'
+DAY = 'day'
+BUCKETS = {HOUR: 13, DAY: 10}        # length of the timestamp prefix that makes up the bucket
+DIMENSIONS = {'class': 'name', 'instructor': 'instructor'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    gym_name TEXT NOT NULL,
+    bucket_size TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    occurrences INTEGER NOT NULL,
+    open INTEGER NOT NULL,
+    spots_total INTEGER NOT NULL,
+    spots_count INTEGER NOT NULL,
+    PRIMARY KEY (gym_name, bucket_size, dimension, bucket, value)
+);
+"""
+
+_UPSERT = (
+    "ON CONFLICT (gym_name, bucket_size, dimension, bucket, value) DO UPDATE SET "
+    "occurrences = occurrences + excluded.occurrences, open = open + excluded.open, "
+    "spots_total = spots_total + excluded.spots_total, spots_count = spots_count + excluded.spots_count"
+)
+
+
+# Function to add one scrape of a gym to its rollups. The scrape's classes must already be
+# in current_classes (see storage.py); runs in the caller's transaction.
+def add_scrape(db, gym_name, timestamp):
+    for bucket_size, length in BUCKETS.items():
+        for dimension, column in DIMENSIONS.items():
+            db.execute(
+                "INSERT INTO rollups (gym_name, bucket_size, bucket, dimension, value, occurrences, open, "
+                "spots_total, spots_count) "
+                f"SELECT ?, ?, ?, ?, COALESCE({column}, ''), COUNT(*), SUM(status = ?), COALESCE(SUM(spots), 0), "
+                f"COUNT(spots) FROM current_classes WHERE gym_name = ? GROUP BY COALESCE({column}, '') "
+                + _UPSERT,
+                (gym_name, bucket_size, timestamp[:length], dimension, availability.OPEN, gym_name)
+            )
+
+
+# Function to sum a gym's rollups per class or instructor over a date range (inclusive,
+# 'YYYY-MM-DD' or dates). Returns dicts with value, occurrences, open, spots_total and
+# spots_count, most scraped first. With by_bucket=True there is one row per bucket and value.
+def query(db, gym_name, dimension='class', start=None, end=None, bucket_size=DAY, by_bucket=False):
+    start = str(start)[:10] if start else ''
+    end = str(end)[:10] if end else '9999-12-31'
+    group = 'bucket, value' if by_bucket else 'value'
+    rows = db.execute(
+        f"SELECT {group}, SUM(occurrences), SUM(open), SUM(spots_total), SUM(spots_count) FROM rollups "
+        "WHERE gym_name = ? AND bucket_size = ? AND dimension = ? AND bucket >= ? AND substr(bucket, 1, 10) <= ? "
+        f"GROUP BY {group} ORDER BY {'bucket, ' if by_bucket else ''}SUM(occurrences) DESC",
+        (gym_name, bucket_size, dimension, start, end)
+    ).fetchall()
+    fields = (('bucket',) if by_bucket else ()) + ('value', 'occurrences', 'open', 'spots_total', 'spots_count')
+    return [dict(zip(fields, row)) for row in rows]
+
+
+# Function to recompute a gym's rollups from its stored schedules, replacing the old ones
+def rebuild(db, gym_name, snapshots):
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for snapshot in snapshots:
+        classes = availability.annotate(snapshot['classes'])
+        for bucket_size, length in BUCKETS.items():
+            bucket = snapshot['timestamp'][:length]
+            for dimension, field in DIMENSIONS.items():
+                for cls in classes:
+                    row = totals[(bucket_size, bucket, dimension, cls[field] or '')]
+                    row[0] += 1
+                    row[1] += cls['status'] == availability.OPEN
+                    if cls['spots'] is not None:
+                        row[2] += cls['spots']
+                        row[3] += 1
+    db.execute("DELETE FROM rollups WHERE gym_name = ?", (gym_name,))
+    db.executemany(
+        "INSERT INTO rollups (gym_name, bucket_size, bucket, dimension, value, occurrences, open, spots_total, "
+        "spots_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(gym_name,) + key + tuple(row) for key, row in totals.items()]
+    )
+
+
+def main(argv=None):
+    from storage import get_store
+
+    parser = argparse.ArgumentParser(prog='python -m rollups', description="Maintain the Historical Data rollups.")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the rollups from the stored history")
+    parser.add_argument('--gym', help="only this gym (default: every gym with history)")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return
+    store = get_store()
+    for gym_name in ([args.gym] if args.gym else store.gyms_with_history()):
+        store.rebuild_rollups(gym_name)
+        print(f"Rebuilt rollups for {gym_name}")
+
+
+if __name__ == '__main__':
+    main()
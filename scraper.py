@@ -0,0 +1,324 @@
+# Scraping helpers shared by the Streamlit app and batch scrapes.
+# Nothing in here imports streamlit: problems are passed to a `report(level, message)`
+# callback so the caller decides how to show them (st.warning, a log, a result list...).
+import json
+import logging
+import time
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+
+import records
+from http_client import get_client, parse_retry_after
+from metrics import ScrapeMetrics, get_metrics, timed
+from parse_pool import get_parse_pool
+from parsing import RELEARN_YIELD, parse_schedule, valid_rows
+from rate_limit import THROTTLE_STATUSES, RateLimiter
+from response_cache import get_cache
+from streaming import stream_schedule
+
+logger = logging.getLogger(__name__)
+
+# Number of gyms fetched at the same time by scrape_gyms
+DEFAULT_MAX_WORKERS = 8
+# Bytes read per step when a page is streamed
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# Default reporter: send scrape problems to the module logger
+def log_report(level, message):
+    logger.log(logging.ERROR if level == 'error' else logging.WARNING, message)
+
+
+# Shared by every scrape in this process: requests to the same host are paced by an adaptive
+# per-host rate limit (see rate_limit.py); different hosts never wait for each other
+default_throttle = RateLimiter()
+
+
+# Function to tell the rate limiter how a request went
+def _observe(throttle, url, response):
+    timings = getattr(response, 'timings', None)
+    retry_after = None
+    if response.status_code in THROTTLE_STATUSES:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+    throttle.observe(url, response.status_code, latency=timings.ttfb if timings else None,
+                     throttled=timings.throttled if timings else 0, retry_after=retry_after)
+
+
+# Function to pull class records out of a schedule page with the gym's parser backend.
+# Returns a list of records.ClassRecord, empty when none of the strategies find anything.
+# With a `stats` dict, parse/extract times, element errors and the strategy that found the
+# rows are added to it (see parsing.parse_schedule).
+# `html` may be the raw page bytes, decoded with `encoding`. When a parse pool is configured
+# (see parse_pool.py) the page is parsed there instead of in the calling thread.
+# `plan` is the gym's extraction plan (see parsing.parse_schedule).
+def extract_classes(html, class_selector, instructor_selector, time_selector, availability_selector,
+                    report=log_report, parser=None, parse_only=None, stats=None, encoding=None, plan=None):
+    selectors = (class_selector, instructor_selector, time_selector, availability_selector)
+    pool = get_parse_pool()
+    classes = None
+    if pool is not None:
+        try:
+            classes, strategy = pool.parse(html, *selectors, encoding=encoding, backend=parser, parse_only=parse_only,
+                                           report=report, stats=stats, plan=plan)
+        except BrokenExecutor as e:
+            # A worker died (or could not start): parse here rather than lose the scrape
+            logger.warning("Parse pool unavailable, parsing in this thread: %s", e)
+    if classes is None:
+        if isinstance(html, bytes):
+            html = html.decode(encoding or 'utf-8', errors='replace')
+        classes, strategy = parse_schedule(html, *selectors, backend=parser, parse_only=parse_only, report=report,
+                                           stats=stats, plan=plan)
+    if stats is not None:
+        stats['strategy'] = strategy
+    return records.from_dicts(classes, records.now())
+
+
+# Function to turn cached class dicts into records scraped now
+def _fresh(classes, scraped_at=None):
+    return records.from_dicts(classes, scraped_at or records.now())
+
+
+# Cached class lists are stored without a scrape time: a fresh cache hit is dated when the page
+# was fetched, a 304 when it was revalidated
+def _without_timestamps(classes):
+    return [{k: v for k, v in cls.items() if k != 'timestamp'} for cls in classes]
+
+
+# Key identifying the selectors a cached class list was extracted with
+def _selectors_key(*selectors):
+    return json.dumps(selectors)
+
+
+# Function to hand a newly learned extraction plan to `save_plan(gym_name, plan)`.
+# A plan is the strategy that found the gym's rows and how many valid rows it found; it is
+# kept with the gym's config, so later scrapes run that strategy only.
+def _save_plan(save_plan, gym_name, plan, strategy, valid):
+    if save_plan is None or strategy is None:
+        return
+    learned = {'strategy': strategy, 'rows': valid}
+    if learned != plan:
+        logger.info("%s: learned extraction plan %s", gym_name, learned)
+        save_plan(gym_name, learned)
+
+
+# Function to copy the stats extract_classes collected into a metrics record
+def _add_stats(metrics, stats):
+    metrics.parse += stats.get('parse', 0.0)
+    metrics.extract += stats.get('extract', 0.0)
+    metrics.error('element', stats.get('element_errors', 0))
+    metrics.strategy = stats.get('strategy') or 'none'
+
+
+# Function to scrape gym data using requests and BeautifulSoup.
+# Pages are cached on disk: a fresh cache entry is used without a request, a stale one is
+# revalidated with a conditional GET, and a 304 reuses the stored classes without parsing.
+# Every call records a ScrapeMetrics entry for `gym_name` (default: the URL's host) in
+# `metrics` (default: the process-wide registry, see metrics.py).
+# `rate_limit` is the gym's own rate limit settings, if any (see rate_limit.py).
+# `plan` is the gym's extraction plan; when a plan is (re)learned it is passed to
+# `save_plan(gym_name, plan)`. Nothing is returned when no classes are found.
+def scrape_gym_data(url, class_selector, instructor_selector, time_selector, availability_selector,
+                    report=log_report, throttle=None, cache=None, parser=None, parse_only=None,
+                    gym_name=None, metrics=None, rate_limit=None, plan=None, save_plan=None):
+    throttle = throttle or default_throttle
+    selectors = (class_selector, instructor_selector, time_selector, availability_selector)
+    selectors_key = _selectors_key(*selectors, parser, parse_only)
+    scrape = ScrapeMetrics(gym_name or urlparse(url).netloc, url)
+    started = time.perf_counter()
+    classes = []
+    try:
+        cache = cache or get_cache()
+        entry = cache.get(url)
+        if entry and entry.fresh and entry.classes_for(selectors_key):
+            cache.record('hits')
+            scrape.cache, scrape.strategy = 'hit', 'cached'
+            # Not a new observation: the classes keep the time the page was fetched, and the
+            # store does not record them again (see GymStore.append_schedule)
+            classes = _fresh(entry.classes_for(selectors_key), int(entry.stored_at))
+            return classes
+
+        # Be respectful: pace requests to the same host
+        throttle.wait(url, rate_limit)
+
+        # Make the request over the shared, keep-alive session (retries transient errors)
+        with timed(scrape, 'fetch'):
+            response = get_client().get(url, headers=entry.validators() if entry else None)
+        scrape.status = response.status_code
+        _observe(throttle, url, response)
+        timings = getattr(response, 'timings', None)
+        scrape.bytes = timings.bytes if timings else len(response.content)
+
+        if response.status_code == 304 and entry:
+            cache.record('revalidated')
+            cache.refresh(url)
+            scrape.cache, scrape.strategy = 'revalidated', 'cached'
+            classes = entry.classes_for(selectors_key)
+            if classes is None:
+                # Page unchanged but the selectors were edited: re-parse the stored body
+                stats = {}
+                classes = extract_classes(entry.body, *selectors, report=report, parser=parser, parse_only=parse_only,
+                                          stats=stats, plan=plan)
+                _add_stats(scrape, stats)
+                if stats.get('learned'):
+                    _save_plan(save_plan, gym_name, plan, stats.get('strategy'), valid_rows(classes))
+                if classes:
+                    cache.put(url, entry.body, entry.etag, entry.last_modified, _without_timestamps(classes), selectors_key)
+            if classes:
+                classes = _fresh(classes)
+                return classes
+        else:
+            cache.record('misses')
+            scrape.cache = 'miss'
+            response.raise_for_status()  # Raise an exception for 4XX/5XX responses
+            stats = {}
+            # A parse pool gets the raw bytes: they are cheaper to send than the decoded text
+            if get_parse_pool() is not None:
+                page, encoding = response.content, response.encoding or response.apparent_encoding
+            else:
+                page, encoding = response.text, None
+            classes = extract_classes(page, *selectors, report=report, parser=parser, parse_only=parse_only,
+                                      stats=stats, encoding=encoding, plan=plan)
+            _add_stats(scrape, stats)
+            if stats.get('learned'):
+                _save_plan(save_plan, gym_name, plan, stats.get('strategy'), valid_rows(classes))
+            if classes:
+                cache.put(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                          _without_timestamps(classes), selectors_key)
+                return classes
+
+        report('warning', "Could not find classes with the provided selectors.")
+        classes = []
+        return classes
+
+    except requests.exceptions.RequestException as e:
+        report('error', f"Request error: {e}")
+        scrape.error('request')
+        if scrape.status is None:
+            throttle.observe(url)  # no response at all
+        classes = []
+        return classes
+    except Exception as e:
+        report('error', f"Scraping error: {e}")
+        scrape.error('scrape')
+        classes = []
+        return classes
+    finally:
+        scrape.total = time.perf_counter() - started
+        scrape.rows = len(classes or [])
+        (metrics or get_metrics()).record(scrape)
+
+
+# Function to scrape a gym page while it downloads, for very large schedule pages.
+# With an extraction plan, yields class records as soon as each row or card has been read, so
+# callers can show the first rows before the download finishes; without one, the rows come
+# once the page is read and the strategy has been learned from all of it. Streamed pages bypass the page cache: keeping the body
+# would defeat the point of never holding the whole page in memory.
+# Metrics are recorded as in scrape_gym_data; fetch is the time spent waiting for the
+# download, i.e. everything but parsing and extraction (the consumer's time between rows
+# is not counted at all).
+# A streamed page cannot be parsed twice: when the plan's yield drops, the plan is replaced
+# by the strategy this scrape ended up with on its next, unrestricted scrape.
+def scrape_gym_data_streaming(url, class_selector, instructor_selector, time_selector, availability_selector,
+                              report=log_report, throttle=None, chunk_size=STREAM_CHUNK_SIZE,
+                              gym_name=None, metrics=None, rate_limit=None, plan=None, save_plan=None):
+    throttle = throttle or default_throttle
+    found = False
+    scrape = ScrapeMetrics(gym_name or urlparse(url).netloc, url)
+    stats = {}
+    started = paused = None
+    try:
+        # Be respectful: pace requests to the same host
+        throttle.wait(url, rate_limit)
+
+        started, paused = time.perf_counter(), 0.0
+        client = get_client()
+        with client.stream(url) as response:
+            scrape.status = response.status_code
+            _observe(throttle, url, response)
+            try:
+                response.raise_for_status()  # Raise an exception for 4XX/5XX responses
+                scraped_at = records.now()
+                for cls, strategy in stream_schedule(client.iter_chunks(response, chunk_size), class_selector,
+                                                     instructor_selector, time_selector, availability_selector,
+                                                     encoding=response.encoding, report=report, stats=stats,
+                                                     plan=plan):
+                    found = True
+                    scrape.strategy = strategy
+                    scrape.rows += 1
+                    record = records.ClassRecord.from_dict(cls, scraped_at)
+                    yielded = time.perf_counter()
+                    yield record
+                    paused += time.perf_counter() - yielded
+            finally:
+                scrape.bytes = response.timings.bytes
+
+        if not found:
+            report('warning', "Could not find classes with the provided selectors.")
+        # Only valid rows are streamed
+        valid = scrape.rows
+        if save_plan is not None:
+            if not plan:
+                _save_plan(save_plan, gym_name, plan, scrape.strategy if found else None, valid)
+            elif valid < plan.get('rows', 0) * RELEARN_YIELD or not found:
+                logger.info("%s: extraction plan %s found %d valid rows, learning it again", gym_name, plan, valid)
+                save_plan(gym_name, None)
+
+    except requests.exceptions.RequestException as e:
+        report('error', f"Request error: {e}")
+        scrape.error('request')
+        if scrape.status is None:
+            throttle.observe(url)  # no response at all
+    except Exception as e:
+        report('error', f"Scraping error: {e}")
+        scrape.error('scrape')
+    finally:
+        if started is not None:
+            scrape.total = time.perf_counter() - started - paused
+        scrape.parse = stats.get('parse', 0.0)
+        scrape.extract = stats.get('extract', 0.0)
+        scrape.fetch = max(0.0, scrape.total - scrape.parse - scrape.extract)
+        scrape.error('element', stats.get('element_errors', 0))
+        (metrics or get_metrics()).record(scrape)
+
+
+# Function to scrape one configured gym entry, collecting messages instead of showing them.
+# Newly learned extraction plans go to `save_plan(gym_name, plan)`, e.g. GymStore.save_plan.
+def scrape_gym(gym, throttle=None, cache=None, save_plan=None):
+    messages = []
+
+    def report(level, message):
+        messages.append((level, message))
+
+    args = (gym['url'], gym['class_selector'], gym['instructor_selector'], gym['time_selector'],
+            gym['availability_selector'])
+    if gym.get('streaming'):
+        classes = list(scrape_gym_data_streaming(*args, report=report, throttle=throttle, gym_name=gym['name'],
+                                                 rate_limit=gym.get('rate_limit'), plan=gym.get('extraction_plan'),
+                                                 save_plan=save_plan))
+    else:
+        classes = scrape_gym_data(*args, report=report, throttle=throttle, cache=cache,
+                                  parser=gym.get('parser'), parse_only=gym.get('parse_only'), gym_name=gym['name'],
+                                  rate_limit=gym.get('rate_limit'), plan=gym.get('extraction_plan'),
+                                  save_plan=save_plan)
+    return classes, messages
+
+
+# Function to scrape many gyms at the same time.
+# Yields (gym, classes, messages) for each gym as soon as it finishes, so callers
+# can show progress; the order is completion order, not the order of `gyms`.
+def scrape_gyms(gyms, max_workers=DEFAULT_MAX_WORKERS, throttle=None, cache=None, save_plan=None):
+    gyms = list(gyms)
+    if not gyms:
+        return
+    throttle = throttle or default_throttle
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(gyms)))) as pool:
+        futures = {pool.submit(scrape_gym, gym, throttle, cache, save_plan): gym for gym in gyms}
+        for future in as_completed(futures):
+            gym = futures[future]
+            try:
+                classes, messages = future.result()
+            except Exception as e:
+                classes, messages = [], [('error', f"Scraping error: {e}")]
+            yield gym, classes, messages
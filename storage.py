@@ -0,0 +1,612 @@
+# SQLite storage for gym configurations and scraped schedules.
+# Replaces rewriting the whole gym_data.json on every change: each scrape is appended as
+# one transaction, and lookups such as "last schedule for gym X" are indexed queries.
+# An existing gym_data.json is imported once, the first time the database is opened.
+# Every appended schedule is also written to the columnar history (history.py) that the
+# Historical Data tab reads from.
+#
+# Scrapes are stored as changes (see changes.py): a gym's first scrape of each day keeps its
+# full class list, later ones only the classes that were added, removed or changed
+# availability, or a bare "unchanged" row. The latest classes of every gym are kept in
+# current_classes, which is what new scrapes are compared against, together with their
+# parsed availability (spots and status, see availability.py). The same transaction bumps the
+# hourly and daily rollups the Historical Data charts read (see rollups.py).
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import availability
+import changes
+import history
+import records
+import rollups
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'gym_data.sqlite'
+LEGACY_JSON_PATH = 'gym_data.json'
+
+# Selectors new gyms start with (the Add Gym form, bulk imports): general selectors that try
+# several common layouts
+DEFAULT_SELECTORS = {
+    "class_selector": ".class-item, tr, .schedule-row",
+    "instructor_selector": ".class-name, td:first-child, h3",
+    "time_selector": ".instructor, td:nth-child(2), .trainer",
+    "availability_selector": ".time, td:nth-child(3), .schedule-time"
+}
+
+# Default data with pre-configured gyms
+DEFAULT_GYMS = [
+    {
+        "name": "LA Fitness",
+        "url": "https://www.lafitness.com/Pages/ClassSchedulePrintView.aspx",
+        "class_selector": "tr",
+        "instructor_selector": "td:nth-child(1)",
+        "time_selector": "td:nth-child(2)",
+        "availability_selector": "td:nth-child(3)"
+    },
+    {
+        "name": "Planet Fitness",
+        "url": "https://www.planetfitness.com/gyms/manhattan-ny/offers/group-fitness-classes",
+        "class_selector": ".schedule-item",
+        "instructor_selector": ".class-title",
+        "time_selector": ".instructor-name",
+        "availability_selector": ".class-time"
+    },
+    {
+        "name": "24 Hour Fitness",
+        "url": "https://www.24hourfitness.com/classes/",
+        "class_selector": ".class-schedule-item",
+        "instructor_selector": ".class-name",
+        "time_selector": ".instructor",
+        "availability_selector": ".class-time"
+    },
+    {
+        "name": "Gold's Gym",
+        "url": "https://www.goldsgym.com/classes/",
+        "class_selector": ".schedule-class",
+        "instructor_selector": ".class-title",
+        "time_selector": ".instructor",
+        "availability_selector": ".time"
+    },
+    {
+        "name": "Anytime Fitness",
+        "url": "https://www.anytimefitness.com/find-gym/",
+        "class_selector": ".schedule-entry",
+        "instructor_selector": ".class-title",
+        "time_selector": ".instructor-name",
+        "availability_selector": ".start-time"
+    },
+    {
+        "name": "Equinox",
+        "url": "https://www.equinox.com/groupfitness",
+        "class_selector": ".class-item",
+        "instructor_selector": ".class-name",
+        "time_selector": ".instructor",
+        "availability_selector": ".time-block"
+    },
+    {
+        "name": "Crunch Fitness",
+        "url": "https://www.crunch.com/classes",
+        "class_selector": ".class-schedule-item",
+        "instructor_selector": ".class-title",
+        "time_selector": ".instructor",
+        "availability_selector": ".time"
+    },
+    {
+        "name": "YMCA",
+        "url": "https://ymca.net/find-your-y",
+        "class_selector": ".schedule-item",
+        "instructor_selector": ".class-name",
+        "time_selector": ".teacher-name",
+        "availability_selector": ".time-slot"
+    }
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS gyms (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    gym_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'snapshot',
+    class_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS schedules_gym_time ON schedules (gym_name, timestamp);
+CREATE INDEX IF NOT EXISTS schedules_time ON schedules (timestamp);
+CREATE TABLE IF NOT EXISTS classes (
+    schedule_id INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    instructor TEXT,
+    time TEXT,
+    availability TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (schedule_id, position)
+);
+CREATE TABLE IF NOT EXISTS class_changes (
+    schedule_id INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+    class_key TEXT NOT NULL,
+    change TEXT NOT NULL,
+    name TEXT,
+    instructor TEXT,
+    time TEXT,
+    availability TEXT,
+    previous_availability TEXT
+);
+CREATE INDEX IF NOT EXISTS class_changes_schedule ON class_changes (schedule_id);
+CREATE TABLE IF NOT EXISTS current_classes (
+    gym_name TEXT NOT NULL,
+    class_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    instructor TEXT,
+    time TEXT,
+    availability TEXT,
+    spots INTEGER,
+    status TEXT,
+    PRIMARY KEY (gym_name, class_key)
+);
+"""
+
+CLASS_FIELDS = ('name', 'instructor', 'time', 'availability', 'timestamp')
+CURRENT_FIELDS = ('name', 'instructor', 'time', 'availability', 'spots', 'status')
+EVENT_FIELDS = ('class_key', 'change', 'name', 'instructor', 'time', 'availability', 'previous_availability')
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class GymStore:
+    def __init__(self, path=DEFAULT_DB_PATH, legacy_json=LEGACY_JSON_PATH, history_dir=history.DEFAULT_HISTORY_DIR):
+        self.path = path
+        self.history_dir = history_dir
+        with self._connect() as db:
+            missing_rollups = self._migrate(db)
+            initialized = db.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+            if not initialized:
+                if legacy_json and os.path.exists(legacy_json):
+                    self._import_json(db, legacy_json)
+                else:
+                    db.executemany("INSERT OR IGNORE INTO gyms (name, config) VALUES (?, ?)",
+                                   [(gym['name'], json.dumps(gym)) for gym in DEFAULT_GYMS])
+                db.execute("INSERT INTO meta (key, value) VALUES ('initialized', ?)", (_now(),))
+            history_format = db.execute("SELECT value FROM meta WHERE key = 'history_format'").fetchone()
+        if not initialized and legacy_json and os.path.exists(legacy_json):
+            # Keep the old file around, but make sure it is never imported twice
+            os.replace(legacy_json, legacy_json + '.migrated')
+        if missing_rollups:
+            self.rebuild_rollups()
+        if history_dir and (not os.path.isdir(history_dir) or history_format != (str(history.FORMAT_VERSION),)):
+            self.export_history()
+        elif history_dir:
+            self.repair_history()
+
+    # Every connection runs its statements in one transaction per `with` block,
+    # so a crash mid-write leaves the previous state intact
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        return db
+
+    # Creates missing tables, and brings databases from before change tracking up to date:
+    # their schedules are all full snapshots, and the latest one of each gym becomes its
+    # current classes. Returns True if existing schedules still need their rollups built.
+    def _migrate(self, db):
+        had_rollups = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollups'").fetchone()
+        columns = [row[1] for row in db.execute("PRAGMA table_info(schedules)")]
+        if columns and 'kind' not in columns:
+            db.execute("ALTER TABLE schedules ADD COLUMN kind TEXT NOT NULL DEFAULT 'snapshot'")
+            db.execute("ALTER TABLE schedules ADD COLUMN class_count INTEGER")
+        current_columns = [row[1] for row in db.execute("PRAGMA table_info(current_classes)")]
+        if current_columns and 'status' not in current_columns:
+            db.execute("ALTER TABLE current_classes ADD COLUMN spots INTEGER")
+            db.execute("ALTER TABLE current_classes ADD COLUMN status TEXT")
+            for (gym_name,) in db.execute("SELECT DISTINCT gym_name FROM current_classes").fetchall():
+                self._set_current(db, gym_name, self._current(db, gym_name))
+        db.executescript(SCHEMA + rollups.SCHEMA)
+        if columns and 'kind' not in columns:
+            db.execute("UPDATE schedules SET class_count = "
+                       "(SELECT COUNT(*) FROM classes WHERE classes.schedule_id = schedules.id)")
+            latest = db.execute(
+                "SELECT gym_name, MAX(id) FROM schedules s WHERE timestamp = "
+                "(SELECT MAX(timestamp) FROM schedules WHERE gym_name = s.gym_name) GROUP BY gym_name"
+            ).fetchall()
+            for gym_name, schedule_id in latest:
+                self._set_current(db, gym_name, changes.keyed(self._classes(db, schedule_id)))
+        return bool(columns) and not had_rollups
+
+    # One-time import of the old single-file JSON format
+    def _import_json(self, db, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for gym in data.get('gyms', []):
+            db.execute("INSERT OR REPLACE INTO gyms (name, config) VALUES (?, ?)", (gym['name'], json.dumps(gym)))
+        for schedule in data.get('schedules', []):
+            self._insert_schedule(db, schedule['gym_name'], schedule.get('classes', []), schedule.get('timestamp') or _now())
+
+    # Stores one scrape as changes against the gym's current classes.
+    # Returns the schedule id and the rows for the columnar history.
+    def _insert_schedule(self, db, gym_name, classes, timestamp):
+        previous = db.execute(
+            "SELECT timestamp FROM schedules WHERE gym_name = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+            (gym_name,)
+        ).fetchone()
+        state = self._current(db, gym_name) if previous else {}
+        kind, current, events = changes.compare(state, previous and previous[0], classes, timestamp)
+
+        cursor = db.execute("INSERT INTO schedules (gym_name, timestamp, kind, class_count) VALUES (?, ?, ?, ?)",
+                            (gym_name, timestamp, kind, len(current)))
+        schedule_id = cursor.lastrowid
+        db.executemany(
+            "INSERT INTO class_changes (schedule_id, class_key, change, name, instructor, time, availability, "
+            "previous_availability) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(schedule_id,) + tuple(event[field] for field in EVENT_FIELDS) for event in events]
+        )
+        if kind == changes.SNAPSHOT:
+            db.executemany(
+                "INSERT INTO classes (schedule_id, position, name, instructor, time, availability, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(schedule_id, position) + tuple(cls[field] for field in changes.FIELDS) + (timestamp,)
+                 for position, cls in enumerate(current.values())]
+            )
+            self._set_current(db, gym_name, current)
+        elif kind == changes.DELTA:
+            self._update_current(db, gym_name, events)
+        rollups.add_scrape(db, gym_name, timestamp)
+        return schedule_id, changes.history_events(kind, current, events)
+
+    def _current(self, db, gym_name):
+        rows = db.execute(
+            "SELECT class_key, name, instructor, time, availability FROM current_classes "
+            "WHERE gym_name = ? ORDER BY position",
+            (gym_name,)
+        )
+        return {row[0]: dict(zip(changes.FIELDS, row[1:])) for row in rows}
+
+    def _set_current(self, db, gym_name, state):
+        db.execute("DELETE FROM current_classes WHERE gym_name = ?", (gym_name,))
+        db.executemany(
+            "INSERT INTO current_classes (gym_name, class_key, position, name, instructor, time, availability, "
+            "spots, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(gym_name, key, position) + tuple(cls[field] for field in CURRENT_FIELDS)
+             for position, (key, cls) in enumerate(zip(state, availability.annotate(state.values())))]
+        )
+
+    def _update_current(self, db, gym_name, events):
+        position = db.execute("SELECT COALESCE(MAX(position), -1) FROM current_classes WHERE gym_name = ?",
+                              (gym_name,)).fetchone()[0]
+        for event in availability.annotate(events):
+            if event['change'] == changes.REMOVED:
+                db.execute("DELETE FROM current_classes WHERE gym_name = ? AND class_key = ?",
+                           (gym_name, event['class_key']))
+            elif event['change'] == changes.CHANGED:
+                db.execute("UPDATE current_classes SET availability = ?, spots = ?, status = ? "
+                           "WHERE gym_name = ? AND class_key = ?",
+                           (event['availability'], event['spots'], event['status'], gym_name, event['class_key']))
+            else:
+                position += 1
+                db.execute(
+                    "INSERT INTO current_classes (gym_name, class_key, position, name, instructor, time, availability, "
+                    "spots, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (gym_name, event['class_key'], position) + tuple(event[field] for field in CURRENT_FIELDS)
+                )
+
+    def _events(self, db, schedule_id):
+        rows = db.execute(
+            "SELECT class_key, change, name, instructor, time, availability, previous_availability "
+            "FROM class_changes WHERE schedule_id = ? ORDER BY rowid",
+            (schedule_id,)
+        )
+        return [dict(zip(EVENT_FIELDS, row)) for row in rows]
+
+    def _classes(self, db, schedule_id):
+        rows = db.execute(
+            "SELECT name, instructor, time, availability, timestamp FROM classes WHERE schedule_id = ? ORDER BY position",
+            (schedule_id,)
+        ).fetchall()
+        return [dict(zip(CLASS_FIELDS, row)) for row in rows]
+
+    # --- Versions ---
+    # Every write bumps a store-wide counter. 'version:config' and 'version:gym:<name>' in meta
+    # hold the counter value of the last change to the gym list and to one gym's data, so
+    # callers that cache what they read (the Streamlit app) can key entries on them. The
+    # counters live in the database, so writes from other processes (the worker) count too.
+
+    def _bump(self, db, *gym_names, config=False, every_gym=False):
+        row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        version = int(row[0]) + 1 if row else 1
+        keys = ['version'] + [f'version:gym:{name}' for name in gym_names] + (['version:config'] if config else [])
+        db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(key, version) for key in keys])
+        if every_gym:
+            db.execute("UPDATE meta SET value = ? WHERE key LIKE 'version:gym:%'", (version,))
+        return version
+
+    # Function to get the version of one gym's data, or of the whole store when no gym is given
+    def version(self, gym_name=None):
+        key = f'version:gym:{gym_name}' if gym_name else 'version'
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    # Function to get the version of the gym list (gyms added, changed or deleted)
+    def config_version(self):
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'version:config'").fetchone()
+        return int(row[0]) if row else 0
+
+    # --- Gyms ---
+
+    def list_gyms(self):
+        with self._connect() as db:
+            return [json.loads(config) for (config,) in db.execute("SELECT config FROM gyms ORDER BY rowid")]
+
+    def get_gym(self, name):
+        with self._connect() as db:
+            row = db.execute("SELECT config FROM gyms WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Function to add a gym, or update it if one with the same name exists.
+    # Returns True if the gym was new.
+    def save_gym(self, gym):
+        with self._connect() as db:
+            exists = db.execute("SELECT 1 FROM gyms WHERE name = ?", (gym['name'],)).fetchone()
+            db.execute(
+                "INSERT INTO gyms (name, config) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET config = excluded.config",
+                (gym['name'], json.dumps(gym))
+            )
+            self._bump(db, gym['name'], config=True)
+        return not exists
+
+    # Function to add or update many gyms in one transaction; returns how many were new
+    def save_gyms(self, gyms):
+        gyms = list(gyms)
+        if not gyms:
+            return 0
+        with self._connect() as db:
+            existing = {name for (name,) in db.execute("SELECT name FROM gyms")}
+            db.executemany(
+                "INSERT INTO gyms (name, config) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET config = excluded.config",
+                [(gym['name'], json.dumps(gym)) for gym in gyms]
+            )
+            self._bump(db, *{gym['name'] for gym in gyms}, config=True)
+        return len({gym['name'] for gym in gyms} - existing)
+
+    # Function to store a gym's extraction plan (see scraper.py) in its config; None drops it
+    def save_plan(self, name, plan):
+        with self._connect() as db:
+            if plan is None:
+                updated = db.execute("UPDATE gyms SET config = json_remove(config, '$.extraction_plan') WHERE name = ?",
+                                     (name,))
+            else:
+                updated = db.execute(
+                    "UPDATE gyms SET config = json_set(config, '$.extraction_plan', json(?)) WHERE name = ?",
+                    (json.dumps(plan), name)
+                )
+            if updated.rowcount:
+                self._bump(db, config=True)
+
+    # Function to delete a gym together with its schedules
+    def delete_gym(self, name):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM gyms WHERE name = ?", (name,))
+            db.execute("DELETE FROM schedules WHERE gym_name = ?", (name,))
+            db.execute("DELETE FROM current_classes WHERE gym_name = ?", (name,))
+            db.execute("DELETE FROM rollups WHERE gym_name = ?", (name,))
+            db.execute("DELETE FROM meta WHERE key = ?", (f'history:gym:{name}',))
+            self._bump(db, name, config=True)
+        if self.history_dir:
+            history.delete(name, self.history_dir)
+
+    # --- Schedules ---
+
+    # Function to append one scrape of a gym; returns the new schedule id.
+    # Only what changed since the gym's previous scrape is stored. Class records fetched no
+    # later than the gym's last stored scrape (a page-cache hit, see scraper.scrape_gym_data)
+    # are not a new observation: nothing is stored and None is returned.
+    def append_schedule(self, gym_name, classes, timestamp=None):
+        with self._connect() as db:
+            # Take the write lock before reading the previous scrape: the delta is computed
+            # from it, and another writer (the worker, another app session) must not change
+            # it in between. The scrape time is taken under the lock too, so a writer that
+            # waited for it never stores a scrape dated before the one it was diffed against.
+            db.execute("BEGIN IMMEDIATE")
+            if timestamp is None and self._already_stored(db, gym_name, classes):
+                return None
+            timestamp = timestamp or _now()
+            previous_id = db.execute("SELECT MAX(id) FROM schedules WHERE gym_name = ?", (gym_name,)).fetchone()[0]
+            schedule_id, events = self._insert_schedule(db, gym_name, classes, timestamp)
+            self._bump(db, gym_name)
+        if self.history_dir:
+            try:
+                history.append_events(gym_name, schedule_id, timestamp, events, self.history_dir)
+            except Exception:
+                # The scrape is stored; repair_history rewrites this gym's history on the next start
+                logger.exception("Could not write the history of %s; it will be rebuilt", gym_name)
+            else:
+                self._history_written(gym_name, schedule_id, previous_id)
+                self._compact_history(gym_name, timestamp)
+        return schedule_id
+
+    def _already_stored(self, db, gym_name, classes):
+        fetched = [getattr(cls, 'scraped_at', None) for cls in classes]
+        if not fetched or None in fetched:
+            return False
+        row = db.execute("SELECT MAX(timestamp) FROM schedules WHERE gym_name = ?", (gym_name,)).fetchone()
+        return row[0] is not None and max(fetched) <= records.parse_timestamp(row[0])
+
+    # Function to merge the day's history files of a gym once there are COMPACT_FILES of them,
+    # so a live tracker's partitions do not fill up with one small file per scrape
+    def _compact_history(self, gym_name, timestamp):
+        try:
+            history.compact(gym_name, self.history_dir, day=timestamp[:10], min_files=history.COMPACT_FILES)
+        except Exception:
+            # The day's files stay as they are and are merged after a later scrape
+            logger.exception("Could not compact the history of %s", gym_name)
+
+    # --- Columnar history bookkeeping ---
+    # 'history:gym:<name>' in meta holds the id of the gym's last schedule whose events are in
+    # the Parquet history. It only moves forward from the id it held before this schedule, so a
+    # write that failed (or never happened, after a crash) leaves it behind the schedules and the
+    # gym's history is rewritten by repair_history.
+
+    def _history_written(self, gym_name, schedule_id, previous_id):
+        key = f'history:gym:{gym_name}'
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if (int(row[0]) if row else None) == previous_id:
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, schedule_id))
+
+    # Function to rewrite the history of every gym whose Parquet files miss schedules, and to
+    # remove the history of gyms that no longer have any; returns the gyms rewritten
+    def repair_history(self):
+        with self._connect() as db:
+            latest = dict(db.execute("SELECT gym_name, MAX(id) FROM schedules GROUP BY gym_name").fetchall())
+            written = {key[len('history:gym:'):]: int(value) for key, value in db.execute(
+                "SELECT key, value FROM meta WHERE key LIKE 'history:gym:%'").fetchall()}
+        stale = sorted(name for name, schedule_id in latest.items() if written.get(name) != schedule_id)
+        for name in stale:
+            logger.warning("History of %s is out of date, rewriting it", name)
+            self.export_history(name)
+        for name in set(history.gym_names(self.history_dir)) - set(latest):
+            history.delete(name, self.history_dir)
+        return stale
+
+    # Function to get the most recent schedule of a gym as
+    # {'gym_name', 'timestamp', 'classes'}, or None if it was never scraped.
+    # Classes come with their parsed availability as 'spots' and 'status'.
+    def last_schedule(self, gym_name):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT timestamp FROM schedules WHERE gym_name = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+                (gym_name,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = db.execute(
+                "SELECT name, instructor, time, availability, spots, status FROM current_classes "
+                "WHERE gym_name = ? ORDER BY position",
+                (gym_name,)
+            )
+            classes = [dict(zip(CURRENT_FIELDS, cls), timestamp=row[0]) for cls in rows]
+            return {'gym_name': gym_name, 'timestamp': row[0], 'classes': classes}
+
+    # Function to get {gym name: timestamp of its latest scrape} for every scraped gym
+    def last_scrape_times(self):
+        with self._connect() as db:
+            return dict(db.execute("SELECT gym_name, MAX(timestamp) FROM schedules GROUP BY gym_name"))
+
+    # Names of gyms that have at least one stored schedule
+    def gyms_with_history(self):
+        with self._connect() as db:
+            return [name for (name,) in db.execute("SELECT DISTINCT gym_name FROM schedules ORDER BY gym_name")]
+
+    # Function to rebuild the full schedules of a gym, oldest first, as
+    # {'gym_name', 'timestamp', 'classes'} with records.ClassRecord classes. With `start` ('YYYY-MM-DD ...'), replay begins
+    # at the last snapshot before it instead of at the gym's first scrape.
+    def snapshots(self, gym_name, start=None, end=None):
+        with self._connect() as db:
+            first = None
+            if start:
+                first = db.execute(
+                    "SELECT timestamp FROM schedules WHERE gym_name = ? AND kind = ? AND timestamp <= ? "
+                    "ORDER BY timestamp DESC, id DESC LIMIT 1",
+                    (gym_name, changes.SNAPSHOT, start)
+                ).fetchone()
+            schedules = db.execute(
+                "SELECT id, timestamp, kind FROM schedules WHERE gym_name = ? AND timestamp >= ? "
+                "ORDER BY timestamp, id",
+                (gym_name, first[0] if first else '')
+            ).fetchall()
+            state = {}
+            for schedule_id, timestamp, kind in schedules:
+                if end and timestamp > end:
+                    break
+                if kind == changes.SNAPSHOT:
+                    state = changes.keyed(self._classes(db, schedule_id))
+                elif kind == changes.DELTA:
+                    changes.apply(state, self._events(db, schedule_id))
+                if start and timestamp < start:
+                    continue
+                classes = records.from_dicts(state.values(), records.parse_timestamp(timestamp))
+                yield {'gym_name': gym_name, 'timestamp': timestamp, 'classes': classes}
+
+    # Function to get the rollups of a gym per 'class' or 'instructor' over a date range,
+    # summed over the range or, with by_bucket=True, per 'hour' or 'day' bucket (see rollups.query)
+    def rollup(self, gym_name, dimension='class', start=None, end=None, bucket_size=rollups.DAY, by_bucket=False):
+        with self._connect() as db:
+            return rollups.query(db, gym_name, dimension, start, end, bucket_size, by_bucket)
+
+    # Function to recompute the rollups of one gym, or of every gym, from the stored schedules
+    def rebuild_rollups(self, gym_name=None):
+        for name in ([gym_name] if gym_name else self.gyms_with_history()):
+            with self._connect() as db:
+                # Folded scrape by scrape: a gym's history is never held in memory at once
+                rollups.rebuild(db, name, self.snapshots(name))
+                self._bump(db, name)
+
+    # Function to delete all gym configurations and historical data
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM classes")
+            db.execute("DELETE FROM class_changes")
+            db.execute("DELETE FROM current_classes")
+            db.execute("DELETE FROM rollups")
+            self._bump(db, config=True, every_gym=True)
+            db.execute("DELETE FROM schedules")
+            db.execute("DELETE FROM gyms")
+            db.execute("DELETE FROM meta WHERE key LIKE 'history:gym:%'")
+        if self.history_dir:
+            history.delete(root=self.history_dir)
+
+    # Function to (re)write the columnar history of one gym, or of every gym, from the schedules
+    # in the database, e.g. after migrating from gym_data.json, when the history directory was
+    # removed or when writing a scrape's history failed
+    def export_history(self, gym_name=None):
+        history.delete(gym_name, root=self.history_dir)
+        os.makedirs(self.history_dir, exist_ok=True)
+        with self._connect() as db:
+            for name in ([gym_name] if gym_name else self.gyms_with_history()):
+                events, schedule_ids, timestamps = [], [], []
+                for schedule_id, timestamp, kind in db.execute(
+                        "SELECT id, timestamp, kind FROM schedules WHERE gym_name = ? ORDER BY timestamp, id",
+                        (name,)).fetchall():
+                    current = changes.keyed(self._classes(db, schedule_id)) if kind == changes.SNAPSHOT else None
+                    scrape = changes.history_events(kind, current, self._events(db, schedule_id))
+                    events.extend(scrape)
+                    schedule_ids.extend([schedule_id] * len(scrape))
+                    timestamps.extend([timestamp] * len(scrape))
+                history.write_table(history.events_table(events, schedule_ids, timestamps), name, self.history_dir)
+                last = db.execute("SELECT MAX(id) FROM schedules WHERE gym_name = ?", (name,)).fetchone()[0]
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f'history:gym:{name}', last))
+            if gym_name is None:
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('history_format', ?)",
+                           (str(history.FORMAT_VERSION),))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the process-wide store, creating (and migrating) it on first use
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = GymStore(os.environ.get('GYM_DB', DEFAULT_DB_PATH),
+                              history_dir=os.environ.get('GYM_HISTORY_DIR', history.DEFAULT_HISTORY_DIR))
+        return _store
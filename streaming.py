@@ -0,0 +1,214 @@
+# Incremental extraction for very large schedule pages.
+# The page is fed to lxml's pull parser chunk by chunk as it downloads, and a class record
+# is produced as soon as its row or card element closes. Elements outside any row or card
+# are freed as soon as they close, so memory stays roughly flat however big the page is.
+#
+# With an extraction plan (see parsing.parse_schedule) only the plan's strategy is matched, and
+# its records are produced as soon as they are read. Without one, the records of every strategy
+# are held back and the strategy is chosen the way parsing.py learns a plan
+# (parsing.choose_strategy): when the page ends, or as soon as one strategy has LEARN_ROWS
+# records, from the rows read so far. The rest of the page then streams like with a plan, so
+# at most LEARN_ROWS records per strategy are ever held. A page with fewer rows learns the same
+# plan as a normal scrape.
+# Either way, rows that fail parsing.valid_row (header rows, misaligned selectors) are dropped.
+import re
+import time
+
+from cssselect import GenericTranslator
+from lxml import etree
+
+from parsing import (AVAILABILITY_WORDS, CARD_AVAILABILITY_SELECTOR, CARD_INSTRUCTOR_SELECTOR,
+                     CARD_NAME_SELECTOR, CARD_SELECTOR, CARD_TIME_SELECTOR, STRATEGIES, choose_strategy,
+                     valid_row)
+
+_translator = GenericTranslator()
+
+LEARN_ROWS = 500   # records a strategy may hold back before the plan is chosen from them
+
+# Selectors whose matches depend on earlier siblings; with these, closed siblings are only
+# emptied, not removed, so counting them stays correct
+_SIBLING_DEPENDENT = re.compile(r':(nth|first|last|only)-|[+~]')
+
+
+def _matcher(selector):
+    return etree.XPath(_translator.css_to_xpath(selector, prefix='self::'))
+
+
+def _finder(selector):
+    return etree.XPath(_translator.css_to_xpath(selector, prefix='descendant::'))
+
+
+def _text(element):
+    return ''.join(element.itertext())
+
+
+def _first_text(finder, element):
+    found = finder(element)
+    return _text(found[0]).strip() if found else "Unknown"
+
+
+# Every selector the streaming extractor needs, compiled to XPath once per gym
+class StreamingSelectors:
+    def __init__(self, class_selector, name_selector, instructor_selector, time_selector, strategy=None):
+        self.strategy = strategy
+        self.container = _matcher(class_selector)
+        self.name = _finder(name_selector)
+        self.instructor = _finder(instructor_selector)
+        self.time = _finder(time_selector)
+        self.availability_tags = etree.XPath('descendant::span | descendant::div | descendant::p')
+        self.table_row = etree.XPath('self::tr[ancestor::table]')
+        self.cells = etree.XPath('descendant::td')
+        self.card = _matcher(CARD_SELECTOR)
+        self.card_name = _finder(CARD_NAME_SELECTOR)
+        self.card_instructor = _finder(CARD_INSTRUCTOR_SELECTOR)
+        self.card_time = _finder(CARD_TIME_SELECTOR)
+        self.card_availability = _finder(CARD_AVAILABILITY_SELECTOR)
+        self.remove_siblings = not _SIBLING_DEPENDENT.search(class_selector)
+
+    # Which kinds of record an element would produce, decided when it opens; while a plan is
+    # learned, a table row the gym's selectors also match is a candidate for both
+    def kinds(self, element):
+        strategy = self.strategy
+        kinds = []
+        if strategy in (None, 'primary') and self.container(element):
+            kinds.append('primary')
+        if strategy in (None, 'table') and self.table_row(element):
+            kinds.append('table')
+        if strategy in (None, 'cards') and self.card(element):
+            kinds.append('cards')
+        return kinds
+
+    def record(self, kind, element):
+        if kind == 'primary':
+            availability_text = "Unknown"
+            for tag in self.availability_tags(element):
+                text = _text(tag)
+                lowered = text.lower()
+                if any(word in lowered for word in AVAILABILITY_WORDS):
+                    availability_text = text.strip()
+                    break
+            return {
+                'name': _first_text(self.name, element),
+                'instructor': _first_text(self.instructor, element),
+                'time': _first_text(self.time, element),
+                'availability': availability_text,
+            }
+        if kind == 'table':
+            cells = self.cells(element)
+            if len(cells) < 4:
+                return None
+            return {
+                'name': _text(cells[0]).strip(),
+                'instructor': _text(cells[1]).strip(),
+                'time': _text(cells[2]).strip(),
+                'availability': _text(cells[3]).strip(),
+            }
+        name = self.card_name(element)
+        time_found = self.card_time(element)
+        if not name or not time_found:
+            return None
+        return {
+            'name': _text(name[0]).strip(),
+            'instructor': _first_text(self.card_instructor, element),
+            'time': _text(time_found[0]).strip(),
+            'availability': _first_text(self.card_availability, element),
+        }
+
+
+def _release(element, remove_siblings):
+    element.clear(keep_tail=True)
+    if remove_siblings:
+        parent = element.getparent()
+        while parent is not None and element.getprevious() is not None:
+            del parent[0]
+
+
+# Function to extract class records from an iterable of HTML byte chunks.
+# Yields (record, strategy) pairs, strategy being 'primary', 'table' or 'cards': straight away
+# with a plan, once the strategy has been chosen without one.
+# With a `stats` dict, time spent feeding the parser ('parse') and matching and building
+# records ('extract') is added to it, leaving out the download and whatever the consumer
+# does between records, and so is the number of elements that failed ('element_errors');
+# 'learned' is counted when the strategy was chosen without a plan.
+# `plan` is the gym's extraction plan; its yield is checked by the caller once the page is done.
+def stream_schedule(chunks, class_selector, instructor_selector, time_selector, availability_selector,
+                    encoding=None, report=None, stats=None, plan=None):
+    strategy = plan.get('strategy') if plan else None
+    selectors = StreamingSelectors(class_selector, instructor_selector, time_selector, availability_selector,
+                                   strategy if strategy in STRATEGIES else None)
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    # For every open element: (its own kinds, whether it or an ancestor produces a record)
+    open_elements = []
+    candidates = {kind: [] for kind in STRATEGIES}
+    state = {'table_rows': 0}
+    stats = stats if stats is not None else {}
+    for key in ('parse', 'extract'):
+        stats.setdefault(key, 0.0)
+    stats.setdefault('element_errors', 0)
+
+    # Chooses the strategy from the records held back; returns the chosen strategy's valid ones
+    def choose():
+        classes, chosen = choose_strategy((kind, candidates[kind]) for kind in STRATEGIES)
+        selectors.strategy = chosen
+        stats['learned'] = stats.get('learned', 0) + 1
+        for kind in STRATEGIES:
+            candidates[kind] = []
+        return [(record, chosen) for record in classes if valid_row(record)]
+
+    def handle_events():
+        started = time.perf_counter()
+        for event, element in parser.read_events():
+            if event == 'start':
+                kinds = selectors.kinds(element)
+                inside = bool(open_elements and open_elements[-1][1])
+                open_elements.append((kinds, inside or bool(kinds)))
+                continue
+
+            kinds, _ = open_elements.pop()
+            for kind in kinds:
+                if selectors.strategy and kind != selectors.strategy:
+                    continue  # opened before the strategy was chosen
+                record = None
+                try:
+                    if kind == 'table':
+                        state['table_rows'] += 1
+                        # Skip header row
+                        if state['table_rows'] > 1:
+                            record = selectors.record(kind, element)
+                    else:
+                        record = selectors.record(kind, element)
+                except Exception as e:
+                    stats['element_errors'] += 1
+                    if report and kind == 'primary':
+                        report('warning', f"Error parsing class element: {e}")
+                if record is None:
+                    continue
+                if not selectors.strategy:
+                    candidates[kind].append(record)
+                    ready = choose() if len(candidates[kind]) >= LEARN_ROWS else []
+                else:
+                    ready = [(record, kind)] if valid_row(record) else []
+                stats['extract'] += time.perf_counter() - started
+                yield from ready
+                started = time.perf_counter()
+            # Nothing above this element needs its content any more
+            if not (open_elements and open_elements[-1][1]):
+                _release(element, selectors.remove_siblings)
+        stats['extract'] += time.perf_counter() - started
+
+    def feed(data=None):
+        started = time.perf_counter()
+        if data is None:
+            parser.close()
+        else:
+            parser.feed(data)
+        stats['parse'] += time.perf_counter() - started
+
+    for chunk in chunks:
+        feed(chunk)
+        yield from handle_events()
+    feed()
+    yield from handle_events()
+
+    if not selectors.strategy:
+        yield from choose()
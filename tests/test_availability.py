@@ -0,0 +1,78 @@
+import math
+import re
+
+import pandas as pd
+import pytest
+
+import availability
+
+UNITS = r'(?:spots?|spaces?|seats?|places?|openings?)'
+
+
+# Row-by-row statement of the rules parse_availability applies to whole columns
+def reference(text):
+    if text is None or isinstance(text, float) and math.isnan(text):
+        return None, availability.UNKNOWN
+    text = text.lower()
+    spots = None
+    ratio = re.search(r'(\d+)\s*(?:/|\bof\b)\s*(\d+)', text)
+    before = re.search(rf'(\d+)\s*{UNITS}', text)
+    after = re.search(rf'{UNITS}\s*(?:left|available|remaining|open)?\s*:?\s*(\d+)', text)
+    if ratio:
+        count, capacity = int(ratio.group(1)), int(ratio.group(2))
+        spots = count if re.search(rf'left|available|remaining|open|{UNITS}', text) else max(capacity - count, 0)
+    elif before or after:
+        spots = int((before or after).group(1))
+    if re.search(r'wait\s*-?\s*list|waiting', text):
+        return spots, availability.WAITLIST
+    if re.search(rf'\bfull\b|sold\s*out|fully\s*booked|booked\s*out|capacity\s*reached|no\s+{UNITS}'
+                 r'|not\s+available|unavailable', text) or spots == 0:
+        return spots, availability.FULL
+    if re.search(rf'available|\bopen|{UNITS}', text) or (spots or 0) > 0:
+        return spots, availability.OPEN
+    return spots, availability.UNKNOWN
+
+
+CASES = [
+    ("Full", None, availability.FULL),
+    ("Class Full", None, availability.FULL),
+    ("Sold out", None, availability.FULL),
+    ("Waitlist", None, availability.WAITLIST),
+    ("Full - join waitlist", None, availability.WAITLIST),
+    ("5 spots left", 5, availability.OPEN),
+    ("1 space available", 1, availability.OPEN),
+    ("Spots left: 3", 3, availability.OPEN),
+    ("0 spots left", 0, availability.FULL),
+    ("No spots", None, availability.FULL),
+    ("8/10", 2, availability.OPEN),
+    ("10/10", 0, availability.FULL),
+    ("12 / 10", 0, availability.FULL),
+    ("3/10 spots left", 3, availability.OPEN),
+    ("2 of 12 available", 2, availability.OPEN),
+    ("Available", None, availability.OPEN),
+    ("Unknown", None, availability.UNKNOWN),
+    ("Ask at the front desk", None, availability.UNKNOWN),
+    ("", None, availability.UNKNOWN),
+    (None, None, availability.UNKNOWN),
+    (float('nan'), None, availability.UNKNOWN),
+]
+
+
+@pytest.mark.parametrize('text, spots, status', CASES)
+def test_parse_availability_matches_reference(text, spots, status):
+    assert reference(text) == (spots, status)
+    parsed = availability.parse_availability([text])
+    assert (None if pd.isna(parsed['spots'][0]) else int(parsed['spots'][0]), parsed['status'][0]) == (spots, status)
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_parse_availability_column_matches_reference(categorical):
+    texts = [text for text, _, _ in CASES] * 3
+    column = pd.Series(texts, index=range(100, 100 + len(texts)), dtype=object)
+    if categorical:
+        column = column.astype('category')
+    parsed = availability.parse_availability(column)
+    assert list(parsed.index) == list(column.index)
+    assert str(parsed['spots'].dtype) == 'Int32' and parsed['status'].dtype == availability.STATUS_DTYPE
+    assert [(None if pd.isna(spots) else int(spots), status) for spots, status in
+            zip(parsed['spots'], parsed['status'])] == [reference(text) for text in texts]
@@ -0,0 +1,31 @@
+import cli
+import response_cache
+import scraper
+import storage
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from stub_server import MockGymServer
+
+
+def test_dry_run_scrape_changes_nothing(tmp_path, monkeypatch):
+    store = storage.GymStore(str(tmp_path / 'gyms.sqlite'), legacy_json=None, history_dir=str(tmp_path / 'history'))
+    cache = ResponseCache(str(tmp_path / 'http_cache.sqlite'))
+    monkeypatch.setattr(storage, '_store', store)
+    monkeypatch.setattr(response_cache, '_cache', cache)
+    monkeypatch.setattr(scraper, 'default_throttle', RateLimiter(None, robots=False))
+
+    with MockGymServer() as server:
+        store.clear()
+        store.save_gyms(server.gym_entries())
+        gyms, cache_stats = store.list_gyms(), cache.stats()
+
+        assert cli.main(['scrape', '--dry-run']) == 0
+        assert store.list_gyms() == gyms
+        assert cache.stats() == cache_stats
+        assert store.last_scrape_times() == {}
+
+        # A real scrape stores all three
+        assert cli.main(['scrape']) == 0
+        assert all(gym.get('extraction_plan') for gym in store.list_gyms())
+        assert cache.stats()['entries'] == len(gyms)
+        assert set(store.last_scrape_times()) == {gym['name'] for gym in gyms}
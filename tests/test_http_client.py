@@ -0,0 +1,34 @@
+import cli
+import http_client
+
+
+def test_env_settings_reads_gym_http_variables():
+    environ = {'GYM_HTTP_TIMEOUT': '5', 'GYM_HTTP_MAX_RETRIES': '1', 'GYM_HTTP_POOL_MAXSIZE': '', 'PATH': '/bin'}
+    assert http_client.env_settings(environ) == {'timeout': 5.0, 'max_retries': 1}
+
+
+def test_client_is_created_from_the_environment(monkeypatch):
+    monkeypatch.setattr(http_client, '_client', None)
+    monkeypatch.setenv('GYM_HTTP_PER_HOST_LIMIT', '6')
+    monkeypatch.setenv('GYM_HTTP_TIMEOUT', '2.5')
+    client = http_client.get_client()
+    assert (client.per_host_limit, client.timeout) == (6, 2.5)
+    assert client.max_retries == http_client.DEFAULT_MAX_RETRIES
+
+    # Settings given in code win; the others keep their environment value
+    client = http_client.configure_client(timeout=20)
+    assert http_client.get_client() is client
+    assert (client.per_host_limit, client.timeout) == (6, 20)
+
+
+def test_command_line_options_configure_the_client(monkeypatch):
+    monkeypatch.setattr(http_client, '_client', None)
+    monkeypatch.setenv('GYM_HTTP_MAX_RETRIES', '5')
+    parser = cli.argparse.ArgumentParser()
+    cli.add_http_arguments(parser)
+
+    cli.configure_http(parser.parse_args([]))
+    assert http_client._client is None
+    cli.configure_http(parser.parse_args(['--http-timeout', '3', '--http-per-host-limit', '1']))
+    client = http_client.get_client()
+    assert (client.timeout, client.per_host_limit, client.max_retries) == (3.0, 1, 5)
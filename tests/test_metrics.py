@@ -0,0 +1,32 @@
+import os
+
+import metrics
+from metrics import MetricsRegistry, ScrapeMetrics
+
+
+def scrape(number):
+    return ScrapeMetrics(gym='LA Fitness', url=f'http://gym.example/{number}', rows=number)
+
+
+def test_log_is_rotated_past_its_size_limit(tmp_path):
+    path = str(tmp_path / 'scrape_metrics.jsonl')
+    line_size = len(metrics.json.dumps(scrape(100).as_dict())) + 1
+    registry = MetricsRegistry(path, log_max_bytes=10 * line_size)
+    for number in range(100, 135):
+        registry.record(scrape(number))
+    assert os.path.getsize(path) <= 10 * line_size
+    assert os.path.getsize(path + '.1') <= 10 * line_size
+    assert not os.path.exists(path + '.2')
+
+    # A fresh registry (another process) still sees the latest scrapes, across the rotation
+    recent = MetricsRegistry(path).recent(limit=15)
+    assert [record['rows'] for record in recent] == list(range(120, 135))
+
+
+def test_log_without_a_limit_is_not_rotated(tmp_path):
+    path = str(tmp_path / 'scrape_metrics.jsonl')
+    registry = MetricsRegistry(path, log_max_bytes=0)
+    for number in range(20):
+        registry.record(scrape(number))
+    assert not os.path.exists(path + '.1')
+    assert len(registry.recent()) == 20
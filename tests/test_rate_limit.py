@@ -0,0 +1,141 @@
+import pytest
+
+import rate_limit
+from rate_limit import HostBucket, RateLimiter
+
+URL = 'http://gym.example/schedule'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeClient:
+    def __init__(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.requests = 0
+        self.session = self
+        self.headers = {'User-Agent': 'gym-tracker'}
+
+    def get(self, url, timeout=None):
+        self.requests += 1
+        if self.error:
+            raise self.error
+        return self.response
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'sleep', clock.sleep)
+    return clock
+
+
+def bucket(rate=1.0, burst=1, min_rate=0.05, max_rate=2.0, robots_rate=None):
+    return HostBucket('gym.example', rate, burst, min_rate, max_rate, robots_rate)
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_throttled_response_halves_the_rate(status):
+    host = bucket()
+    host.observe(0.0, status=status, latency=0.1)
+    assert host.rate == pytest.approx(1.0 * rate_limit.THROTTLED_DECREASE)
+    assert host.slowdowns == 1
+
+
+def test_retried_throttle_and_retry_after_pause_the_host():
+    host = bucket()
+    now = host.updated
+    host.observe(now, status=200, throttled=1, retry_after=30)
+    assert host.rate == pytest.approx(0.5)
+    assert host.reserve(now) == pytest.approx(30)
+
+
+def test_failures_and_latency_spikes_slow_down():
+    host = bucket()
+    host.observe(0.0, status=None)
+    assert host.rate == pytest.approx(rate_limit.SLOW_DECREASE)
+    host.observe(0.0, status=200, latency=0.2)
+    rate = host.rate
+    host.observe(0.0, status=200, latency=5.0)
+    assert host.rate == pytest.approx(rate * rate_limit.SLOW_DECREASE)
+
+
+def test_rate_never_drops_below_min_rate():
+    host = bucket(min_rate=0.2)
+    for _ in range(20):
+        host.observe(0.0, status=429)
+    assert host.rate == pytest.approx(0.2)
+
+
+def test_healthy_responses_recover_additively_up_to_max_rate():
+    host = bucket(rate=0.5, max_rate=0.8)
+    host.observe(0.0, status=200, latency=0.1)
+    assert host.rate == pytest.approx(0.5 + rate_limit.INCREASE)
+    for _ in range(100):
+        host.observe(0.0, status=200, latency=0.1)
+    assert host.rate == pytest.approx(0.8)
+
+
+def test_tokens_pace_requests(clock):
+    limiter = RateLimiter(rate=0.5, robots=False)
+    limiter.wait(URL)
+    limiter.wait(URL)
+    limiter.wait(URL)
+    assert clock.slept == [pytest.approx(2.0), pytest.approx(2.0)]
+
+
+def test_robots_rate_reads_crawl_delay_and_request_rate():
+    robots = "User-agent: *\nCrawl-delay: 4\n"
+    assert rate_limit.robots_rate(URL, FakeClient(FakeResponse(200, robots))) == pytest.approx(0.25)
+    robots = "User-agent: *\nRequest-rate: 1/10\nCrawl-delay: 4\n"
+    assert rate_limit.robots_rate(URL, FakeClient(FakeResponse(200, robots))) == pytest.approx(0.1)
+    assert rate_limit.robots_rate(URL, FakeClient(FakeResponse(404))) is None
+
+
+def test_crawl_delay_caps_the_rate(clock, monkeypatch):
+    client = FakeClient(FakeResponse(200, "User-agent: *\nCrawl-delay: 5\n"))
+    monkeypatch.setattr(rate_limit, 'get_client', lambda: client)
+    limiter = RateLimiter(rate=1.0)
+    limiter.wait(URL)
+    for _ in range(50):
+        limiter.observe(URL, status=200, latency=0.1)
+    limiter.wait(URL)
+    [stats] = limiter.stats()
+    assert stats['robots_rate'] == pytest.approx(0.2)
+    assert stats['rate'] == pytest.approx(0.2)
+    assert clock.slept == [pytest.approx(5.0)]
+
+
+def test_robots_fetch_failure_is_cached_and_does_not_limit(clock, monkeypatch):
+    client = FakeClient(error=ConnectionError("connection refused"))
+    monkeypatch.setattr(rate_limit, 'get_client', lambda: client)
+    limiter = RateLimiter(rate=1.0, max_rate=2.0)
+    for _ in range(3):
+        limiter.wait(URL)
+    assert client.requests == 1
+    [stats] = limiter.stats()
+    assert stats['robots_rate'] is None
+    assert stats['max_rate'] == pytest.approx(2.0)
+
+    # Fetched again once the cached answer expires
+    clock.now += rate_limit.ROBOTS_TTL + 1
+    limiter.wait(URL)
+    assert client.requests == 2
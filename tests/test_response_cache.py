@@ -0,0 +1,84 @@
+import pytest
+import requests
+
+import response_cache
+import scraper
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from storage import DEFAULT_GYMS
+from stub_server import MockGymServer
+
+GYM = DEFAULT_GYMS[0]
+
+
+def scrape(gym, cache):
+    classes, messages = scraper.scrape_gym(gym, throttle=RateLimiter(None, robots=False), cache=cache)
+    assert not messages
+    return [(cls.name, cls.instructor, cls.time, cls.availability) for cls in classes]
+
+
+@pytest.mark.parametrize('validator', ['etag', 'last-modified'])
+def test_stale_page_is_revalidated_then_refreshed(validator, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=0)
+    with MockGymServer(gyms=[GYM], rows=20, validators=[validator]) as server:
+        gym = server.gym_entries()[0]
+        first = scrape(gym, cache)
+        entry = cache.get(gym['url'])
+        assert (entry.etag is not None) == (validator == 'etag')
+        assert (entry.last_modified is not None) == (validator == 'last-modified')
+
+        # Unchanged page: 304, the stored classes are reused and the entry is fresh again
+        assert scrape(gym, cache) == first
+        assert server.not_modified == 1
+        assert cache.get(gym['url']).stored_at > entry.stored_at
+
+        # Changed page: a full response replaces the entry
+        server.rows = 30
+        changed = scrape(gym, cache)
+        assert len(changed) == 30 and server.not_modified == 1
+        assert cache.get(gym['url']).validators() != entry.validators()
+    stats = cache.stats()
+    assert (stats['hits'], stats['revalidated'], stats['misses'], stats['stores'], stats['entries']) == (0, 1, 2, 2, 1)
+
+
+def test_fresh_entry_is_served_without_a_request_until_the_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=60)
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    with MockGymServer(gyms=[GYM], rows=20, validators=['etag']) as server:
+        gym = server.gym_entries()[0]
+        first = scrape(gym, cache)
+        now[0] += 59
+        assert scrape(gym, cache) == first
+        assert server.requests == 1
+        now[0] += 2
+        assert scrape(gym, cache) == first
+        assert server.requests == 2 and server.not_modified == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['revalidated'], stats['misses']) == (1, 1, 1)
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    with MockGymServer(gyms=DEFAULT_GYMS[:3], rows=20) as server:
+        gyms = server.gym_entries()
+        sizes = [len(requests.get(gym['url']).content) for gym in gyms]
+        # Room for the first and the last page, not for all three
+        cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=0, max_bytes=sizes[0] + sizes[2] + sizes[1] // 2)
+        for gym in gyms[:2]:
+            scrape(gym, cache)
+            now[0] += 1
+        # Reading the first page makes the second one the least recently used
+        cache.get(gyms[0]['url'])
+        now[0] += 1
+        scrape(gyms[2], cache)
+    assert cache.get(gyms[1]['url']) is None
+    assert cache.get(gyms[0]['url']) is not None and cache.get(gyms[2]['url']) is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_page_larger_than_the_cache_is_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_bytes=10)
+    cache.put('http://gym.example/', b'x' * 11)
+    assert cache.get('http://gym.example/') is None
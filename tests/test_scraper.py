@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import fixtures
+import scraper
+import storage
+import streaming
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from storage import DEFAULT_GYMS
+from stub_server import MockGymServer
+
+
+def scrape(gym, tmp_path, streaming):
+    plans = {}
+    classes, messages = scraper.scrape_gym(dict(gym, streaming=streaming), throttle=RateLimiter(None, robots=False),
+                                           cache=ResponseCache(str(tmp_path / f'cache-{streaming}.sqlite')),
+                                           save_plan=plans.__setitem__)
+    assert not [message for level, message in messages if level == 'error']
+    return plans.get(gym['name']), [(cls.name, cls.instructor, cls.time, cls.availability) for cls in classes]
+
+
+@pytest.mark.parametrize('gym_name', [gym['name'] for gym in DEFAULT_GYMS])
+def test_streamed_scrape_learns_the_same_plan(gym_name, tmp_path):
+    with MockGymServer(gyms=[gym for gym in DEFAULT_GYMS if gym['name'] == gym_name]) as server:
+        gym = server.gym_entries()[0]
+        plan, rows = scrape(gym, tmp_path, streaming=False)
+        assert plan and rows
+        assert scrape(gym, tmp_path, streaming=True) == (plan, rows)
+        # With the plan learned, the streamed scrape runs only its strategy and keeps it
+        assert scrape(dict(gym, extraction_plan=plan), tmp_path, streaming=True) == (None, rows)
+
+
+def test_cache_hit_is_not_stored_as_a_new_scrape(tmp_path):
+    store = storage.GymStore(str(tmp_path / 'gyms.sqlite'), legacy_json=None, history_dir=str(tmp_path / 'history'))
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    with MockGymServer(gyms=DEFAULT_GYMS[:1]) as server:
+        gym = server.gym_entries()[0]
+        classes, _ = scraper.scrape_gym(gym, throttle=RateLimiter(None, robots=False), cache=cache)
+        assert store.append_schedule(gym['name'], classes) is not None
+        time.sleep(2.5)
+        cached, _ = scraper.scrape_gym(gym, throttle=RateLimiter(None, robots=False), cache=cache)
+    assert cache.stats()['hits'] == 1
+    # Dated when the page was fetched, not now
+    assert cached[0].scraped_at - classes[0].scraped_at <= 1
+    assert store.append_schedule(gym['name'], cached) is None
+    assert len(list(store.snapshots(gym['name']))) == 1
+
+
+@pytest.mark.parametrize('gym_name', [gym['name'] for gym in DEFAULT_GYMS])
+def test_streamed_scrape_of_a_large_page_learns_the_same_plan(gym_name, tmp_path):
+    rows = streaming.LEARN_ROWS * 4
+    with MockGymServer(gyms=[gym for gym in DEFAULT_GYMS if gym['name'] == gym_name], rows=rows) as server:
+        gym = server.gym_entries()[0]
+        plan, classes = scrape(gym, tmp_path, streaming=False)
+        assert plan['rows'] == len(classes) == rows
+        assert scrape(gym, tmp_path, streaming=True) == (plan, classes)
+
+
+def test_streamed_rows_come_before_the_page_ends():
+    gym = DEFAULT_GYMS[0]
+    html = fixtures.gym_page(gym, rows=streaming.LEARN_ROWS * 4).encode('utf-8')
+    chunks = [html[i:i + 4096] for i in range(0, len(html), 4096)]
+    read = []
+
+    def download():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    records = streaming.stream_schedule(download(), gym['class_selector'], gym['instructor_selector'],
+                                        gym['time_selector'], gym['availability_selector'])
+    next(records)
+    assert len(read) < len(chunks) / 2
+    assert sum(1 for _ in records) == streaming.LEARN_ROWS * 4 - 1
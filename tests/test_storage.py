@@ -0,0 +1,193 @@
+import itertools
+import os
+import threading
+import time
+
+import pyarrow.parquet as pq
+
+import changes
+import history
+import rollups
+import storage
+
+
+def classes(spots):
+    return [{'name': 'Yoga', 'instructor': 'Ann', 'time': '9:00 AM', 'availability': f'{spots} spots left'},
+            {'name': 'Spin', 'instructor': 'Bob', 'time': '6:00 PM', 'availability': 'Full'}]
+
+
+def open_store(tmp_path):
+    return storage.GymStore(str(tmp_path / 'gyms.sqlite'), legacy_json=None, history_dir=str(tmp_path / 'history'))
+
+
+def test_failed_history_write_is_repaired_on_open(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    store.append_schedule('LA Fitness', classes(5), '2026-01-01 09:00:00')
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(history, 'append_events', fail)
+    store.append_schedule('LA Fitness', classes(3), '2026-01-01 10:00:00')
+    monkeypatch.undo()
+    # The failed scrape is missing from the history, and later writes do not hide that
+    store.append_schedule('LA Fitness', classes(1), '2026-01-01 11:00:00')
+    assert history.load_history('LA Fitness', root=store.history_dir)['timestamp'].nunique() == 2
+
+    assert open_store(tmp_path).repair_history() == []  # reopening already rewrote it
+    frame = history.load_history('LA Fitness', root=store.history_dir)
+    assert sorted(frame['timestamp'].astype(str).unique()) == [
+        '2026-01-01 09:00:00', '2026-01-01 10:00:00', '2026-01-01 11:00:00']
+    assert list(frame[frame['timestamp'].astype(str) == '2026-01-01 10:00:00']['availability']) == \
+        ['3 spots left', 'Full']
+
+
+def test_history_of_deleted_gym_is_removed_on_open(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    store.append_schedule('LA Fitness', classes(5), '2026-01-01 09:00:00')
+    monkeypatch.setattr(history, 'delete', lambda *args, **kwargs: None)
+    store.delete_gym('LA Fitness')
+    monkeypatch.undo()
+    assert history.gym_names(store.history_dir) == ['LA Fitness']
+
+    open_store(tmp_path)
+    assert history.gym_names(store.history_dir) == []
+
+
+def test_history_partitions_are_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, 'COMPACT_FILES', 4)
+    store = open_store(tmp_path)
+    for minute in range(10):
+        store.append_schedule('LA Fitness', classes(minute), f'2026-01-01 09:{minute:02d}:00')
+    directory = os.path.join(history._gym_dir(store.history_dir, 'LA Fitness'), 'date=2026-01-01')
+    assert len(os.listdir(directory)) < 4
+    frame = history.load_history('LA Fitness', root=store.history_dir)
+    assert len(frame) == 20
+    assert list(frame[frame['name'] == 'Yoga']['availability']) == [f'{minute} spots left' for minute in range(10)]
+
+
+def test_history_read_during_compaction_has_no_duplicates(tmp_path):
+    store = open_store(tmp_path)
+    for minute in range(3):
+        store.append_schedule('LA Fitness', classes(minute), f'2026-01-01 09:{minute:02d}:00')
+    expected = history.load_history('LA Fitness', root=store.history_dir)
+    directory = os.path.join(history._gym_dir(store.history_dir, 'LA Fitness'), 'date=2026-01-01')
+    # What a reader sees between writing the merged file and removing the originals
+    merged = history._read_files(history._partition_files(directory), history.SCHEMA.names)
+    pq.write_table(merged, os.path.join(directory, 'part-merged.parquet'))
+    assert history.load_history('LA Fitness', root=store.history_dir).equals(expected)
+    assert history.compact('LA Fitness', store.history_dir) == 1
+    assert history.load_history('LA Fitness', root=store.history_dir).equals(expected)
+
+
+def test_concurrent_scrapes_are_stored_in_time_order(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    clock = itertools.count()
+
+    def now():
+        second = next(clock)
+        time.sleep(0.01)  # let another writer take the lock first
+        return f'2026-01-01 09:{second // 60:02d}:{second % 60:02d}'
+
+    monkeypatch.setattr(storage, '_now', now)
+
+    def scrape(spots):
+        for _ in range(5):
+            store.append_schedule('LA Fitness', classes(spots))
+
+    threads = [threading.Thread(target=scrape, args=(spots,)) for spots in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with store._connect() as db:
+        stamps = [stamp for (stamp,) in db.execute("SELECT timestamp FROM schedules ORDER BY id")]
+    assert stamps == sorted(stamps)
+
+
+def cls(name, availability, instructor='Ann', time='9:00 AM'):
+    return {'name': name, 'instructor': instructor, 'time': time, 'availability': availability}
+
+
+# Scrapes of one gym over two days: (timestamp, classes, kind it is stored as)
+SCRAPES = [
+    ('2026-01-01 09:00:00', [cls('Yoga', '5 spots left'), cls('Spin', 'Full'), cls('Spin', 'Full')], changes.SNAPSHOT),
+    ('2026-01-01 10:00:00', [cls('Yoga', '5 spots left'), cls('Spin', 'Full'), cls('Spin', 'Full')], changes.UNCHANGED),
+    ('2026-01-01 11:00:00', [cls('Spin', 'Waitlist'), cls('Yoga', '2 spots left'), cls('Spin', 'Full'),
+                             cls('Pilates', '8/10', 'Bob')], changes.DELTA),
+    ('2026-01-01 12:00:00', [cls('Yoga', 'Full'), cls('Pilates', '8/10', 'Bob')], changes.DELTA),
+    ('2026-01-01 13:00:00', [], changes.DELTA),
+    ('2026-01-01 14:00:00', [cls('Yoga', 'Full')], changes.DELTA),
+    ('2026-01-02 09:00:00', [cls('Yoga', 'Full')], changes.SNAPSHOT),
+    ('2026-01-02 10:00:00', [cls('Yoga', '1 spot left', time='10:00 AM')], changes.DELTA),
+]
+
+
+def rows(classes):
+    return sorted((c['name'], c['instructor'], c['time'], c['availability']) for c in classes)
+
+
+def test_compare_and_apply_replay_each_scrape():
+    state, previous_timestamp = {}, None
+    for timestamp, classes, expected_kind in SCRAPES:
+        kind, current, events = changes.compare(dict(state), previous_timestamp, classes, timestamp)
+        assert kind == expected_kind
+        assert current == changes.keyed(classes)
+        if kind == changes.SNAPSHOT:
+            state = dict(current)
+        elif kind == changes.UNCHANGED:
+            assert events == [] and changes.history_events(kind, current, events) == [{'change': changes.UNCHANGED}]
+        else:
+            assert {event['change'] for event in events} <= set(changes.CHANGE_KINDS)
+            changes.apply(state, changes.history_events(kind, current, events))
+        assert state == current
+        previous_timestamp = timestamp
+
+
+def test_stored_scrapes_replay_exactly(tmp_path):
+    store = open_store(tmp_path)
+    for timestamp, classes, _ in SCRAPES:
+        store.append_schedule('LA Fitness', classes, timestamp)
+
+    with store._connect() as db:
+        kinds = [kind for (kind,) in db.execute("SELECT kind FROM schedules ORDER BY id")]
+    assert kinds == [kind for _, _, kind in SCRAPES]
+    snapshots = list(store.snapshots('LA Fitness'))
+    assert [s['timestamp'] for s in snapshots] == [timestamp for timestamp, _, _ in SCRAPES]
+    for snapshot, (timestamp, classes, _) in zip(snapshots, SCRAPES):
+        assert rows(snapshot['classes']) == rows(classes)
+        assert all(c.timestamp == timestamp for c in snapshot['classes'])
+    assert rows(store.last_schedule('LA Fitness')['classes']) == rows(SCRAPES[-1][1])
+
+    # A range starting mid-day is rebuilt from that day's snapshot
+    middle = list(store.snapshots('LA Fitness', '2026-01-01 11:00:00', '2026-01-01 12:00:00'))
+    assert [rows(s['classes']) for s in middle] == [rows(SCRAPES[2][1]), rows(SCRAPES[3][1])]
+
+    # The columnar history replays to the same classes
+    frame = history.load_history('LA Fitness', root=store.history_dir)
+    for timestamp, classes, _ in SCRAPES:
+        scrape = frame[frame['timestamp'].astype(str) == timestamp]
+        assert rows(scrape.to_dict('records')) == rows(classes)
+
+
+def test_rebuilt_rollups_match_the_stored_ones(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    for timestamp, classes, _ in SCRAPES:
+        store.append_schedule('LA Fitness', classes, timestamp)
+
+    def table():
+        with store._connect() as db:
+            return sorted(db.execute("SELECT * FROM rollups WHERE gym_name = ?", ('LA Fitness',)).fetchall())
+
+    stored = table()
+    rebuild = rollups.rebuild
+    folded = []
+
+    def fold(db, gym_name, snapshots):
+        folded.append(not isinstance(snapshots, list))
+        rebuild(db, gym_name, snapshots)
+
+    monkeypatch.setattr(rollups, 'rebuild', fold)
+    store.rebuild_rollups('LA Fitness')
+    assert folded == [True]
+    assert table() == stored
@@ -0,0 +1,188 @@
+# Headless scrape worker: scrapes every configured gym on its own interval and writes the
+# results into the shared store, so the Streamlit app only has to read them.
+#
+#   python -m worker                  # run until Ctrl+C / SIGTERM
+#   python -m worker --once           # scrape every gym that is due, then exit
+#   python -m worker --metrics-port 9100   # also serve Prometheus metrics at :9100/metrics
+#   python -m worker --parse-workers 4     # parse pages in 4 processes (see parse_pool.py)
+#   python -m worker --http-timeout 20     # HTTP settings, also GYM_HTTP_* (see http_client.py)
+#
+# Gyms are kept in a priority queue ordered by when they are next due. A gym's interval is
+# its 'scrape_interval' (seconds) in the gym entry, or --interval. Each next run is jittered
+# so gyms do not drift into lockstep, and at most --concurrency scrapes run at a time.
+# The gym list is re-read from the store every minute, so gyms added or deleted in the app
+# are picked up without a restart.
+import argparse
+import heapq
+import logging
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+import parse_pool
+from cli import configure_http, add_http_arguments
+import scraper
+from storage import get_store
+
+logger = logging.getLogger('worker')
+
+DEFAULT_INTERVAL = 60 * 60      # seconds between two scrapes of the same gym
+DEFAULT_JITTER = 0.1            # +/- fraction of the interval
+DEFAULT_CONCURRENCY = 4         # scrapes running at the same time
+CONFIG_REFRESH = 60             # seconds between two reads of the gym list
+
+
+class ScrapeScheduler:
+    def __init__(self, store, concurrency=DEFAULT_CONCURRENCY, interval=DEFAULT_INTERVAL,
+                 jitter=DEFAULT_JITTER, throttle=None):
+        self.store = store
+        self.concurrency = concurrency
+        self.interval = interval
+        self.jitter = jitter
+        self.throttle = throttle
+        self.gyms = {}
+        self._queue = []            # (due time, sequence, gym name)
+        self._scheduled = set()     # gyms that are queued or running
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._budget = threading.BoundedSemaphore(concurrency)
+        self._wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.once = False
+
+    def _gym_interval(self, gym):
+        return float(gym.get('scrape_interval') or self.interval)
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, due, name):
+        self._sequence += 1
+        heapq.heappush(self._queue, (due, self._sequence, name))
+        self._scheduled.add(name)
+
+    # Function to re-read the gym list; new gyms are due right after their last stored scrape
+    # plus one interval (or now, spread by the jitter, if they were never scraped)
+    def refresh(self):
+        gyms = {gym['name']: gym for gym in self.store.list_gyms()}
+        last_scrapes = self.store.last_scrape_times()
+        now = time.time()
+        with self._lock:
+            self.gyms = gyms
+            for name, gym in gyms.items():
+                if name in self._scheduled:
+                    continue
+                interval = self._gym_interval(gym)
+                last = last_scrapes.get(name)
+                if last:
+                    due = datetime.strptime(last, '%Y-%m-%d %H:%M:%S').timestamp() + self._jittered(interval)
+                elif self.once:
+                    due = now
+                else:
+                    due = now + random.uniform(0, interval * self.jitter)
+                self._push(max(now, due), name)
+
+    def _run(self, gym):
+        try:
+            started = time.perf_counter()
+            classes, messages = scraper.scrape_gym(gym, throttle=self.throttle, save_plan=self.store.save_plan)
+            for level, message in messages:
+                logger.log(logging.ERROR if level == 'error' else logging.WARNING, "%s: %s", gym['name'], message)
+            if classes:
+                self.store.append_schedule(gym['name'], classes)
+            logger.info("%s: %d classes in %.1fs", gym['name'], len(classes), time.perf_counter() - started)
+        except Exception:
+            logger.exception("%s: scrape failed", gym['name'])
+        finally:
+            with self._lock:
+                self._scheduled.discard(gym['name'])
+                if gym['name'] in self.gyms:
+                    self._push(time.time() + self._jittered(self._gym_interval(self.gyms[gym['name']])), gym['name'])
+            self._budget.release()
+            self._wake.set()
+
+    # Function to take the next due gym off the queue, or return how long to wait for one
+    def _next_due(self):
+        with self._lock:
+            while self._queue:
+                due, _, name = self._queue[0]
+                if name not in self.gyms:
+                    # Deleted since it was queued
+                    heapq.heappop(self._queue)
+                    self._scheduled.discard(name)
+                    continue
+                wait = due - time.time()
+                if wait > 0:
+                    return None, wait
+                heapq.heappop(self._queue)
+                return self.gyms[name], 0
+        return None, CONFIG_REFRESH
+
+    # Function to scrape gyms as they come due until stop() is called.
+    # With once=True every gym that is due now is scraped and the loop then exits.
+    def run(self, once=False):
+        self.once = once
+        next_refresh = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='scrape') as pool:
+            while not self.stop_event.is_set():
+                if time.time() >= next_refresh:
+                    self.refresh()
+                    next_refresh = time.time() + CONFIG_REFRESH
+                if not self._budget.acquire(timeout=1):
+                    continue
+                gym, wait = self._next_due()
+                if gym is None:
+                    self._budget.release()
+                    if once:
+                        break
+                    self._wake.clear()
+                    self._wake.wait(min(wait, max(0, next_refresh - time.time())))
+                    continue
+                pool.submit(self._run, gym)
+                if once:
+                    # Only gyms already due count in --once mode: do not requeue them
+                    with self._lock:
+                        self.gyms.pop(gym['name'], None)
+
+    def stop(self):
+        self.stop_event.set()
+        self._wake.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m worker', description="Scrape every configured gym periodically.")
+    parser.add_argument('--once', action='store_true', help="scrape every gym that is due now, then exit")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="scrapes running at the same time")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between scrapes of a gym without its own 'scrape_interval'")
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help="+/- fraction of the interval")
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--parse-workers', type=int,
+                        help="parse pages in this many worker processes (default: GYM_PARSE_WORKERS, or in the "
+                             "scrape threads)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve scrape metrics in the Prometheus text format at http://localhost:PORT/metrics")
+    add_http_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.parse_workers is not None:
+        parse_pool.configure_parse_pool(workers=args.parse_workers)
+    configure_http(args)
+    if args.metrics_port:
+        metrics.serve(metrics.get_metrics(), args.metrics_port)
+        logger.info("Serving metrics on port %d", args.metrics_port)
+    scheduler = ScrapeScheduler(get_store(), concurrency=args.concurrency, interval=args.interval, jitter=args.jitter)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: scheduler.stop())
+    logger.info("Worker started (concurrency %d)", args.concurrency)
+    scheduler.run(once=args.once)
+    logger.info("Worker stopped")
+
+
+if __name__ == '__main__':
+    main()